@@ -6,23 +6,21 @@ _________________________________________
 import numpy as np
 import math as mt
 import matplotlib.pyplot as plt
-import pandas as pd
-from scipy.optimize import curve_fit
 import sys
 
 #Importo modulo con funzioni
 sys.path.append("")
 import func as f
+import fit_spettro as fs
+import spettri
 
-#Carico file con dati
-data = pd.read_csv("observed_starX.csv", sep=",")
-lam = data["lambda (nm)"].array
-n_photons = data["photons"].array
+#Carico file con dati (copia binaria riutilizzata finché il .csv non cambia) e costruisco l'istogramma
+n_bins = 99
+n, bins = spettri.istogramma("observed_starX.csv", n_bins)
 
 #Visualizzo distribuzione
-n_bins = 99
 plt.figure(figsize=(8,6))
-n,bins, p = plt.hist(lam,bins=n_bins, weights=n_photons, color="limegreen") 
+plt.stairs(n, bins, fill=True, color="limegreen")
 plt.title("Istogramma distribuzione fotoni in funzione lunghezza d'onda")
 plt.ylabel("Numero fotoni")
 plt.xlabel("Lunghezza d'onda (nm)")
@@ -32,23 +30,20 @@ plt.show()
 
 bincenters = (bins[:-1] + bins[1:])/2
 mask = np.nonzero(n)
-par, pcov = curve_fit(f.n_photons_fit, xdata=bincenters[mask], ydata=n[mask], sigma=np.sqrt(n[mask]), 
-                    p0=[45,3.309509356824346e-30,8001], absolute_sigma=True)
+
+#Fit con modello precalcolato e Jacobiano analitico (stesso fit usato da Fit_catalogo.py)
+fit = fs.fitta(bincenters, n, fs.P0)
+par, pcov, chi2_rid = fit["par"], fit["pcov"], fit["chi2_rid"]
+print("Fit convergente in {:} valutazioni della funzione".format(fit["nfev"]))
 
 y_fit = f.n_photons_fit(bincenters,par[0],par[1],par[2])
 scarto = n[mask]-y_fit[mask]
 
-#Chiqudro
-chi2 = np.sum( (scarto)**2 /n[mask] ) 
-#Chi quadro ridotto
-ndof = len(n[mask])-len(par)
-chi2_rid = chi2/ndof
-
 # Grafico fit e studio quantitativo bontà adattamento
 fig, ax = plt.subplots(2,1, figsize=(9,6), gridspec_kw={'height_ratios': [3, 1]}, sharex=True)
 fig.subplots_adjust(hspace=0)
 ax[0].set_title('Fit considerando scattering di Rayleigh')
-ax[0].hist(lam,bins=n_bins, weights=n_photons,color="limegreen", label="Dati" )
+ax[0].stairs(n, bins, fill=True, color="limegreen", label="Dati")
 ax[0].plot(bincenters, y_fit, color="blue", label="Fit")
 ax[0].set_ylabel('Numero fotoni')
 ax[0].text(bincenters[91],400,'$\chi^2_r$: {:.1f}'.format(chi2_rid), color="black", fontsize=11)
@@ -0,0 +1,54 @@
+"""
+File per avviare il servizio locale di simulazione
+__________________________________________________
+"""
+import os
+import sys
+import asyncio
+import argparse
+
+#Importo moduli
+sys.path.append(" ")
+import normalizzazione
+import servizio
+
+
+"""
+Gestione delle azioni con argparse
+__________________________________
+"""
+def parse_arguments():
+
+    parser = argparse.ArgumentParser(description='Servizio locale HTTP/JSON di simulazione (vedi servizio.py)',
+                                     usage      ='[--host HOST] [--porta P] [--workers W] [--finestra S] [--cache FILE]')
+    parser.add_argument('--host', default='127.0.0.1', help='Indirizzo su cui ascoltare')
+    parser.add_argument('--porta', type=int, default=8765, help='Porta su cui ascoltare')
+    parser.add_argument('--workers', type=int, default=1, help='Numero di processi che eseguono le simulazioni')
+    parser.add_argument('--finestra', type=float, default=servizio.FINESTRA, help='Tempo (s) in cui le richieste per la stessa stella sono unite')
+    parser.add_argument('--cache', default=None, help='File in cui conservare tra più esecuzioni le costanti di normalizzazione')
+    return  parser.parse_args()
+
+
+def main():
+
+    args = parse_arguments()
+
+    #Cache su disco delle costanti di normalizzazione, ereditata dai processi del pool
+    if args.cache is not None:
+        os.environ["MCF_CACHE_NORM"] = args.cache
+        normalizzazione.cache.file = args.cache
+        if os.path.exists(args.cache):
+            normalizzazione.cache.carica(args.cache)
+
+    s = servizio.Servizio(workers=args.workers, finestra=args.finestra)
+    try:
+        asyncio.run(s.avvia(args.host, args.porta))
+    except KeyboardInterrupt:
+        print("Servizio interrotto")
+    finally:
+        s.chiudi()
+
+
+if __name__ == "__main__":
+
+    main()
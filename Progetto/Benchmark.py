@@ -0,0 +1,316 @@
+"""
+File con i benchmark delle fasi di simulazione e analisi
+________________________________________________________
+
+Ogni caso è eseguito più volte (si salvano tempo minimo e mediano) e una volta con tracemalloc per il
+picco di memoria. I risultati sono salvati in un file .json; con --confronta si confrontano con quelli
+di un'esecuzione precedente (ad esempio di un altro commit) e si segnalano i casi più lenti della soglia.
+Si verifica anche che l'errore delle funzioni in float32 sia entro func.BUDGET_FLOAT32 e che i tre metodi di
+campionamento superino i test del chi quadro e di Kolmogorov-Smirnov (codice di uscita 1 altrimenti).
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+import subprocess
+import warnings
+import numpy as np
+
+#Importo moduli
+sys.path.append(" ")
+import func as f
+import starclass
+import fit_spettro as fs
+
+
+"""
+Gestione delle azioni con argparse
+__________________________________
+"""
+def parse_arguments():
+
+    parser = argparse.ArgumentParser(description='Benchmark delle fasi di simulazione e analisi',
+                                     usage      ='[--rapido] [--ripetizioni R] [--out FILE] [--confronta FILE] [--soglia S]')
+    parser.add_argument('--rapido', action='store_true', help='Usa valori di N più piccoli')
+    parser.add_argument('--ripetizioni', type=int, default=5, help='Numero di ripetizioni di ogni caso')
+    parser.add_argument('--out', default='benchmark.json', help='File .json in cui salvare i risultati')
+    parser.add_argument('--confronta', default=None, help='File .json di un benchmark precedente con cui confrontare i tempi')
+    parser.add_argument('--soglia', type=float, default=0.3, help='Rallentamento relativo oltre il quale un caso è segnalato')
+    return  parser.parse_args()
+
+
+def misura(funzione, ripetizioni, durata_min=0.02):
+
+    """
+    Funzione che esegue funzione() ripetizioni volte e poi una volta con tracemalloc. I casi più brevi
+    di durata_min sono ripetuti più volte per ogni misura, così che il tempo non sia dominato dal rumore
+
+    Output:
+    - tempo minimo e tempo mediano di una chiamata (s)
+    - picco di memoria allocata (MB)
+    - valore restituito dall'ultima esecuzione
+    """
+    inizio = time.perf_counter()
+    uscita = funzione()
+    numero = max(1, int(durata_min/max(time.perf_counter()-inizio, 1e-9)))
+    tempi = []
+    for _ in range(ripetizioni):
+        inizio = time.perf_counter()
+        for _ in range(numero):
+            uscita = funzione()
+        tempi.append((time.perf_counter()-inizio)/numero)
+    tracemalloc.start()
+    funzione()
+    picco = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(tempi), float(np.median(tempi)), picco/2**20, uscita
+
+
+def casi(rapido):
+
+    """
+    Funzione che restituisce la lista dei casi: (nome, parametri, funzione, quantità elaborate, unità)
+    Ogni funzione crea il proprio generatore con seme fisso, così che ogni ripetizione faccia lo stesso lavoro
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    lista_N = [10**4, 10**5] if rapido else [10**4, 10**5, 10**6]
+    lista_T = [3000, 5750, 28000]
+    lista_angoli = [1, 10, 100]
+    sx, dx = 380, 790
+
+    elenco = []
+    for N in lista_N:
+        lam = np.random.default_rng(0).uniform(sx, dx, N)
+        for T in lista_T:
+            elenco.append(("func.D", {"N": N, "T": T}, lambda lam=lam, T=T: f.D(lam, T), N, "valori/s"))
+        for n_ang in lista_angoli:
+            angoli = np.linspace(0, 90, n_ang)
+            elenco.append(("func.prob_obs", {"N": N, "angoli": n_ang},
+                           lambda lam=lam, angoli=angoli: f.prob_obs(lam[np.newaxis,:], angoli[:,np.newaxis]), N*n_ang, "valori/s"))
+
+    for N in lista_N:
+        for T in lista_T:
+            stella = starclass.star("T{:}".format(T), T)
+            elenco.append(("star.no_absorption", {"N": N, "T": T},
+                           lambda stella=stella, N=N: stella.no_absorption(N, sx, dx, rng=np.random.default_rng(0)), N, "fotoni/s"))
+
+    sole = starclass.star("Sole", 5750)
+    sole32 = starclass.star("Sole", 5750, dtype=np.float32)
+    for N in lista_N:
+        fotoni = sole.no_absorption(N, sx, dx, rng=np.random.default_rng(0))[0]
+        elenco.append(("star.R_scattering", {"N": N, "angoli": 1},
+                       lambda fotoni=fotoni: sole.R_scattering(fotoni, 45, rng=np.random.default_rng(0)), N, "fotoni/s"))
+        for n_ang in lista_angoli[1:]:
+            angoli = np.linspace(0, 90, n_ang)
+            elenco.append(("star.R_scattering_multi", {"N": N, "angoli": n_ang},
+                           lambda fotoni=fotoni, angoli=angoli: sole.R_scattering_multi(fotoni, angoli, rng=np.random.default_rng(0)),
+                           N*n_ang, "fotoni/s"))
+            elenco.append(("star.R_scattering_multi", {"N": N, "angoli": n_ang, "dtype": "float32"},
+                           lambda fotoni=fotoni.astype(np.float32), angoli=angoli:
+                           sole32.R_scattering_multi(fotoni, angoli, rng=np.random.default_rng(0)), N*n_ang, "fotoni/s"))
+
+    def flusso(N, angoli):
+        sole.flusso_integrato(N, angoli, rng=np.random.default_rng(0))
+        plt.close("all")
+
+    for N in lista_N:
+        for n_ang in lista_angoli[1:]:
+            angoli = np.linspace(0, 90, n_ang)
+            elenco.append(("star.flusso_integrato", {"N": N, "angoli": n_ang},
+                           lambda N=N, angoli=angoli: flusso(N, angoli), N, "fotoni/s"))
+
+    return elenco
+
+
+def casi_fit():
+
+    """
+    Funzione che restituisce i casi del fit di n_photons_fit sullo spettro della stella X:
+    (nome, parametri, funzione che restituisce il numero di valutazioni)
+    """
+    from scipy.optimize import curve_fit
+
+    bincenters, n = fs.istogramma_csv("observed_starX.csv")
+    mask = np.nonzero(n)
+
+    def differenze_finite():
+        ris = curve_fit(f.n_photons_fit, bincenters[mask], n[mask], sigma=np.sqrt(n[mask]), p0=fs.P0,
+                        absolute_sigma=True, full_output=True)
+        return ris[2]["nfev"]
+
+    return [("curve_fit n_photons_fit", {"jacobiano": "differenze finite", "p0": "stella X"}, differenze_finite),
+            ("curve_fit n_photons_fit", {"jacobiano": "analitico", "p0": "stella X"},
+             lambda: fs.fitta(bincenters, n, fs.P0)["nfev"]),
+            ("curve_fit n_photons_fit", {"jacobiano": "analitico", "p0": "banca di template"},
+             lambda: fs.fitta(bincenters, n)["nfev"])]
+
+
+def precisione():
+
+    """
+    Funzione che confronta D, D_norm, prob_obs e n_photons_fit in float32 con i valori in float64, nel visibile
+    e tra 1 nm e 10 µm per T tra 1000 e 100000 K (solo valori sopra 1e-30, quelli più piccoli sono trascurabili)
+
+    Output:
+    Dizionario intervallo -> funzione -> errore relativo massimo
+    """
+    import normalizzazione
+
+    T = np.geomspace(1000, 100000, 41)[:,np.newaxis]
+    angoli = np.linspace(0, 90, 46)[:,np.newaxis]
+    errori = {}
+    for intervallo, lam in (("visibile", np.linspace(380, 790, 2001)), ("esteso", np.geomspace(1, 10000, 4001))):
+        lam32 = lam.astype(np.float32)
+        coppie = {"D": (f.D(lam, T), f.D(lam32, T)),
+                  "prob_obs": (f.prob_obs(lam, angoli), f.prob_obs(lam32, angoli)),
+                  "n_photons_fit": (f.n_photons_fit(lam, angoli, 3.3e-30, 8001), f.n_photons_fit(lam32, angoli, 3.3e-30, 8001))}
+        k_norm = normalizzazione.costanti(5750, 380, 790)[0]
+        coppie["D_norm"] = (f.D_norm(lam, 5750, k_norm), f.D_norm(lam32, 5750, k_norm))
+        errori[intervallo] = {}
+        for nome, (v64, v32) in coppie.items():
+            rilevanti = v64 > 1e-30
+            errori[intervallo][nome] = float(np.max(np.abs(v32[rilevanti]/v64[rilevanti]-1)))
+    return errori
+
+
+#Soglie della verifica statistica dei campionatori: p-value minimo del test di Kolmogorov-Smirnov e
+#intervallo accettato del chi quadro ridotto (con circa 100 bin, fuori da [0.5, 1.5] ha probabilità < 1e-3)
+SOGLIA_KS = 1e-3
+CHI2_RIDOTTO = (0.5, 1.5)
+
+
+def campionamento(N):
+
+    """
+    Funzione che verifica (campionatori.verifica) i tre metodi di campionamento per le stelle di Simulazione.py,
+    con N fotoni e un seme fisso diverso per ogni caso (con lo stesso seme inverse_cdf trasformerebbe le stesse
+    uniformi per tutte le stelle e darebbe sempre lo stesso p-value)
+
+    Output:
+    Lista di (stella, metodo, chi quadro ridotto, p-value, esito)
+    """
+    import campionatori
+
+    stelle = [("Sole", 5.75*10**3), ("Betelgeuse", 3*10**3), ("Bellatrix", 22*10**3), ("Alfa Crucis", 28*10**3)]
+    esiti = []
+    for i, (nome, T) in enumerate(stelle):
+        stella = starclass.star(nome, T)
+        for j, metodo in enumerate(campionatori.METODI):
+            fotoni = stella.no_absorption(N, 380, 790, rng=np.random.default_rng([i, j]), metodo=metodo)[0]
+            chi2_red, p_value = campionatori.verifica(fotoni, T, 380, 790)
+            esito = p_value >= SOGLIA_KS and CHI2_RIDOTTO[0] <= chi2_red <= CHI2_RIDOTTO[1]
+            esiti.append((nome, metodo, float(chi2_red), float(p_value), bool(esito)))
+    return esiti
+
+
+def chiave(voce):
+
+    return voce["nome"]+" "+json.dumps(voce["parametri"], sort_keys=True)
+
+
+def commit():
+
+    """
+    Funzione che restituisce il commit corrente del repository, se disponibile
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def confronta(risultati, file, soglia):
+
+    """
+    Funzione che confronta i tempi minimi con quelli di un benchmark precedente
+
+    Output:
+    Lista dei casi rallentati oltre la soglia: (chiave, tempo precedente, tempo attuale)
+    """
+    with open(file) as fin:
+        precedenti = {chiave(v): v for v in json.load(fin)["risultati"]}
+    rallentati = []
+    for voce in risultati:
+        vecchia = precedenti.get(chiave(voce))
+        if vecchia is not None and voce["tempo_min"] > (1+soglia)*vecchia["tempo_min"]:
+            rallentati.append((chiave(voce), vecchia["tempo_min"], voce["tempo_min"]))
+    return rallentati
+
+
+def main():
+
+    args = parse_arguments()
+    warnings.simplefilter("ignore", UserWarning) #plt.show con il backend Agg
+
+    risultati = []
+    print("{:<28} {:<40} {:>12} {:>14} {:>10}".format("Caso", "Parametri", "tempo (s)", "throughput", "memoria"))
+    for nome, parametri, funzione, quantita, unita in casi(args.rapido):
+        t_min, t_med, picco, _ = misura(funzione, args.ripetizioni)
+        risultati.append({"nome": nome, "parametri": parametri, "tempo_min": t_min, "tempo_mediano": t_med,
+                          "throughput": quantita/t_min, "unita": unita, "picco_memoria_MB": picco})
+        print("{:<28} {:<40} {:>12.4g} {:>14.4g} {:>8.1f}MB".format(nome, json.dumps(parametri), t_min, quantita/t_min, picco))
+
+    for nome, parametri, funzione in casi_fit():
+        t_min, t_med, picco, nfev = misura(funzione, args.ripetizioni)
+        risultati.append({"nome": nome, "parametri": parametri, "tempo_min": t_min, "tempo_mediano": t_med,
+                          "valutazioni": int(nfev), "picco_memoria_MB": picco})
+        print("{:<28} {:<40} {:>12.4g} {:>10} nfev {:>8.1f}MB".format(nome, json.dumps(parametri), t_min, nfev, picco))
+
+    #Errore delle funzioni in float32 rispetto al budget dichiarato in func
+    errori = precisione()
+    fuori_budget = []
+    for intervallo, valori in errori.items():
+        for nome, errore in valori.items():
+            print("float32 {:<14} {:<10} errore relativo {:.2e} (budget {:.0e})".format(nome, intervallo, errore, f.BUDGET_FLOAT32[intervallo]))
+            if errore > f.BUDGET_FLOAT32[intervallo]:
+                fuori_budget.append((nome, intervallo))
+
+    #Verifica statistica dei campionatori (metodo="auto" sceglie tra hitmiss e alias)
+    verifiche = campionamento(10**5 if args.rapido else 4*10**5)
+    for nome, metodo, chi2_red, p_value, esito in verifiche:
+        print("campionamento {:<12} {:<12} chi2_rid {:.3f} p-value KS {:.3g} {:}".format(nome, metodo, chi2_red, p_value, "ok" if esito else "FALLITA"))
+
+    uscita = {"versione": 1,
+              "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "commit": commit(),
+              "python": platform.python_version(),
+              "numpy": np.__version__,
+              "macchina": platform.platform(),
+              "processori": os.cpu_count(),
+              "ripetizioni": args.ripetizioni,
+              "risultati": risultati,
+              "errori_float32": errori,
+              "campionamento": [{"stella": v[0], "metodo": v[1], "chi2_rid": v[2], "p_value": v[3], "esito": v[4]} for v in verifiche]}
+    with open(args.out, "w") as fout:
+        json.dump(uscita, fout, indent=2)
+    print("Risultati salvati in: {:}".format(args.out))
+
+    #Si stampano tutti i problemi (rallentamenti, errori float32, verifiche fallite) e si termina una sola volta
+    rallentati = []
+    if args.confronta is not None:
+        rallentati = confronta(risultati, args.confronta, args.soglia)
+        for nome, prima, ora in rallentati:
+            print("Rallentato: {:} da {:.4g} s a {:.4g} s".format(nome, prima, ora))
+        if not rallentati:
+            print("Nessun caso più lento del {:.0f}% rispetto a {:}".format(100*args.soglia, args.confronta))
+
+    for nome, intervallo in fuori_budget:
+        print("Errore float32 oltre il budget: {:} ({:})".format(nome, intervallo))
+
+    falliti = [v for v in verifiche if not v[4]]
+    for nome, metodo, chi2_red, p_value, _ in falliti:
+        print("Verifica del campionamento fallita: {:} con {:} (chi2_rid {:.3f}, p-value {:.3g})".format(nome, metodo, chi2_red, p_value))
+
+    if rallentati or fuori_budget or falliti:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,82 @@
+"""
+File con il client del servizio locale di simulazione
+_____________________________________________________
+"""
+import sys
+import json
+import time
+import argparse
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+
+"""
+Gestione delle azioni con argparse
+__________________________________
+"""
+def parse_arguments():
+
+    parser = argparse.ArgumentParser(description='Client del servizio avviato con Avvia_servizio.py',
+                                     usage      ='[--url URL] [--stella NOME | --T T] [--N N] [--angoli A ...] [--seed S] [--bins B] [--ripeti R] [--stato]')
+    parser.add_argument('--url', default='http://127.0.0.1:8765', help='Indirizzo del servizio')
+    parser.add_argument('--stella', default='Sole', help='Stella di Simulazione.py (Sole, Betelgeuse, Bellatrix, Alfa Crucis)')
+    parser.add_argument('--T', type=float, default=None, help='Temperatura della stella (al posto di --stella)')
+    parser.add_argument('--N', type=int, default=50000, help='Numero di fotoni emessi')
+    parser.add_argument('--angoli', type=float, nargs='+', default=[0, 90], help='Angoli rispetto allo Zenit')
+    parser.add_argument('--seed', type=int, default=None, help='Seme della simulazione')
+    parser.add_argument('--bins', type=int, default=None, help='Se indicato richiede anche gli istogrammi con questo numero di bin')
+    parser.add_argument('--ripeti', type=int, default=1, help='Invia R richieste contemporanee (con semi seed, seed+1, ...)')
+    parser.add_argument('--stato', action='store_true', help='Stampa solo lo stato del servizio')
+    return  parser.parse_args()
+
+
+def invia(url, percorso, dati=None, timeout=600):
+
+    """
+    Funzione che invia una richiesta al servizio (GET se dati è None, altrimenti POST con dati in JSON)
+
+    Output:
+    Risposta del servizio (RuntimeError con il messaggio del servizio in caso di errore)
+    """
+    corpo = None if dati is None else json.dumps(dati).encode()
+    richiesta = urllib.request.Request(url.rstrip("/")+percorso, data=corpo, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(richiesta, timeout=timeout) as risposta:
+            return json.load(risposta)
+    except urllib.error.HTTPError as errore:
+        raise RuntimeError(json.load(errore).get("errore", str(errore))) from None
+
+
+def main():
+
+    args = parse_arguments()
+    if args.stato:
+        print(json.dumps(invia(args.url, "/stato"), indent=1))
+        return
+
+    richieste = []
+    for i in range(args.ripeti):
+        r = {"N": args.N, "angoli": args.angoli, "n_bins": args.bins,
+             "seed": None if args.seed is None else args.seed+i}
+        r.update({"stella": args.stella} if args.T is None else {"T": args.T})
+        richieste.append(r)
+
+    inizio = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(args.ripeti) as pool:
+            risposte = list(pool.map(lambda r: invia(args.url, "/simula", r), richieste))
+    except (RuntimeError, urllib.error.URLError) as errore:
+        sys.exit("Errore: {:}".format(errore))
+    durata = time.perf_counter()-inizio
+
+    for risposta in risposte:
+        print("{:} (T = {:g} K, N = {:}, seed = {:})".format(risposta["nome"], risposta["T"], risposta["N"], risposta["seed"]))
+        for angolo, n, frazione in zip(risposta["angoli"], risposta["osservati"], risposta["frazioni"]):
+            print("  angolo {:6.2f}: {:>10} fotoni osservati (frazione {:.4f})".format(angolo, n, frazione))
+    print("{:} richieste in {:.3f} s".format(len(risposte), durata))
+
+
+if __name__ == "__main__":
+
+    main()
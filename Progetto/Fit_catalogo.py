@@ -0,0 +1,82 @@
+"""
+File per il fit di un catalogo di spettri osservati
+___________________________________________________
+"""
+import os
+import sys
+import glob
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+#Importo moduli
+sys.path.append(" ")
+import fit_spettro as fs
+
+
+"""
+Gestione delle azioni con argparse
+__________________________________
+"""
+def parse_arguments():
+
+    parser = argparse.ArgumentParser(description='Fit di tutti gli spettri (.csv come observed_starX.csv) di un catalogo',
+                                     usage      ='sorgente [sorgente ...] [--workers W] [--out FILE]')
+    parser.add_argument('sorgenti', nargs='+', help='Cartelle (si usano tutti i .csv contenuti) o pattern glob dei file')
+    parser.add_argument('--workers', type=int, default=1, help='Numero di processi')
+    parser.add_argument('--out', default='risultati_fit.csv', help='File .csv con la tabella dei risultati')
+    parser.add_argument('--bins', type=int, default=99, help='Numero di bin degli istogrammi')
+    parser.add_argument('--p0', type=float, nargs=3, default=None, metavar=('ANGLE', 'K', 'T'),
+                        help='Punto di partenza del fit (di default il template migliore di una banca precalcolata)')
+    parser.add_argument('--cache', default=None,
+                        help='Cartella in cui salvare le copie binarie dei .csv (di default accanto ai .csv)')
+    parser.add_argument('--banca', default=None, help='File .npz in cui salvare e da cui rileggere la banca di template')
+    return  parser.parse_args()
+
+
+def trova_file(sorgenti):
+
+    """
+    Funzione che restituisce la lista ordinata e senza ripetizioni dei file .csv indicati da cartelle o pattern
+    """
+    trovati = []
+    for sorgente in sorgenti:
+        if os.path.isdir(sorgente):
+            trovati += glob.glob(os.path.join(sorgente, "*.csv"))
+        else:
+            trovati += glob.glob(sorgente)
+    return sorted(set(trovati))
+
+
+"""
+Fit del catalogo
+________________
+"""
+def main():
+
+    import pandas as pd
+
+    args = parse_arguments()
+    files = trova_file(args.sorgenti)
+    if not files:
+        raise SystemExit("Nessun file .csv trovato")
+
+    p0 = None if args.p0 is None else list(args.p0)
+    n = len(files)
+    if args.cache is not None:
+        os.makedirs(args.cache, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        righe = list(pool.map(fs.fitta_file, files, [p0]*n, [args.bins]*n, [args.banca]*n, [args.cache]*n, chunksize=4))
+
+    tabella = pd.DataFrame(righe)
+    tabella.to_csv(args.out, index=False)
+
+    falliti = tabella[tabella["stato"] != "ok"]
+    print("Fit eseguiti: {:}, riusciti: {:}, falliti: {:}".format(len(tabella), len(tabella)-len(falliti), len(falliti)))
+    for _, riga in falliti.iterrows():
+        print(" - {:}: {:}".format(riga["file"], riga["messaggio"]))
+    print("Risultati salvati in: {:}".format(args.out))
+
+
+if __name__ == "__main__":
+
+    main()
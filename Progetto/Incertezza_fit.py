@@ -0,0 +1,64 @@
+"""
+File per stimare con pseudo-esperimenti le incertezze del fit di uno spettro osservato
+_____________________________________________________________________________________
+"""
+import os
+import sys
+import json
+import argparse
+
+#Importo moduli
+sys.path.append(" ")
+import fit_spettro as fs
+import bootstrap
+
+
+"""
+Gestione delle azioni con argparse
+__________________________________
+"""
+def parse_arguments():
+
+    parser = argparse.ArgumentParser(description='Intervalli di confidenza e pull dei parametri del fit con pseudo-esperimenti',
+                                     usage      ='[file] [--toys N] [--workers W] [--seed S] [--out CARTELLA]')
+    parser.add_argument('file', nargs='?', default='observed_starX.csv', help='Spettro osservato (.csv)')
+    parser.add_argument('--toys', type=int, default=1000, help='Numero di pseudo-esperimenti')
+    parser.add_argument('--workers', type=int, default=1, help='Numero di processi')
+    parser.add_argument('--seed', type=int, default=None, help='Seme degli pseudo-esperimenti')
+    parser.add_argument('--bins', type=int, default=99, help='Numero di bin dell\'istogramma')
+    parser.add_argument('--out', default=None, help='Cartella in cui salvare riassunto (.json) e grafico dei pull invece di mostrarlo')
+    return  parser.parse_args()
+
+
+def main():
+
+    args = parse_arguments()
+    bincenters, n = fs.istogramma_csv(args.file, args.bins)
+    ris = bootstrap.pseudo_esperimenti(bincenters, n, n_toys=args.toys, workers=args.workers, seed=args.seed)
+    tabella = bootstrap.riassunto(ris)
+
+    print("Pseudo-esperimenti: {:}, fit riusciti: {:}, seme: {:}".format(args.toys, ris["riusciti"], ris["seme"]))
+    for nome, voce in tabella.items():
+        print("--------------------------------------------------------------------------------------------")
+        print("{:}: {:.6g} +- {:.3g} (fit), dev. std. pseudo-esperimenti: {:.3g}".format(nome, voce["nominale"],
+                                                                                         voce["errore_fit"], voce["dev_std"]))
+        for livello, (basso, alto) in voce["intervalli"].items():
+            print("   intervallo al {:.1f}%: [{:.6g}, {:.6g}]".format(100*float(livello), basso, alto))
+        print("   pull: media {:.3f}, dev. std. {:.3f}".format(voce["pull_media"], voce["pull_dev_std"]))
+
+    if args.out is not None:
+        import matplotlib
+        matplotlib.use("Agg")
+        os.makedirs(args.out, exist_ok=True)
+        base = os.path.join(args.out, os.path.splitext(os.path.basename(args.file))[0])
+        with open(base+"_incertezze.json", "w") as fout:
+            json.dump({"file": args.file, "toys": args.toys, "riusciti": ris["riusciti"], "seme": ris["seme"],
+                       "parametri": tabella}, fout, indent=2)
+        bootstrap.disegna_pull(ris, base+"_pull.png")
+    else:
+        bootstrap.disegna_pull(ris)
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,88 @@
+"""
+File per simulare il flusso osservato delle stelle lungo la loro traiettoria durante una notte
+_____________________________________________________________________________________________
+"""
+import os
+import sys
+import json
+import argparse
+import numpy as np
+
+#Importo moduli
+sys.path.append(" ")
+import starclass
+import serie_temporale as st
+
+
+#Stelle di Simulazione.py e loro declinazione (gradi)
+STELLE = {"Sole": (5.75*10**3, 0.0), "Betelgeuse": (3*10**3, 7.4), "Bellatrix": (22*10**3, 6.35), "Alfa Crucis": (28*10**3, -63.1)}
+
+
+"""
+Gestione delle azioni con argparse
+__________________________________
+"""
+def parse_arguments():
+
+    parser = argparse.ArgumentParser(description='Flusso osservato istante per istante lungo la traiettoria delle stelle',
+                                     usage      ='[--stelle NOME ...] [--N N] [--traiettoria FILE | --latitudine L --ore H --passi P] [--out CARTELLA]')
+    parser.add_argument('--stelle', nargs='+', default=list(STELLE), choices=list(STELLE), help='Stelle da simulare')
+    parser.add_argument('--N', type=int, default=10**6, help='Numero di fotoni emessi per stella')
+    parser.add_argument('--traiettoria', default=None, help='File .csv con colonne tempo e angolo rispetto allo Zenit, usato per tutte le stelle')
+    parser.add_argument('--latitudine', type=float, default=45.0, help='Latitudine dell\'osservatore (gradi), se non si indica --traiettoria')
+    parser.add_argument('--ore', type=float, default=12.0, help='Durata dell\'osservazione centrata sul passaggio al meridiano (ore)')
+    parser.add_argument('--passi', type=int, default=2000, help='Numero di istanti della traiettoria')
+    parser.add_argument('--bins', type=int, default=100, help='Numero di bin degli spettri')
+    parser.add_argument('--seed', type=int, default=None, help='Seme per rendere la simulazione riproducibile')
+    parser.add_argument('--out', default='serie_temporale', help='Cartella in cui salvare i risultati')
+    parser.add_argument('--figure', action='store_true', help='Salva anche il grafico dei fotoni osservati in funzione del tempo')
+    return  parser.parse_args()
+
+
+def main():
+
+    args = parse_arguments()
+
+    #La traiettoria letta da file è la stessa per tutte le stelle
+    if args.traiettoria is not None:
+        try:
+            tempi, angoli = st.leggi_traiettoria(args.traiettoria)
+        except (OSError, ValueError) as errore:
+            raise SystemExit("Traiettoria non valida: {:}".format(errore))
+
+    os.makedirs(args.out, exist_ok=True)
+    semi = np.random.SeedSequence(args.seed).spawn(len(args.stelle))
+    print("Seme della simulazione: {:}".format(semi[0].entropy))
+
+    for nome, seme in zip(args.stelle, semi):
+        T, declinazione = STELLE[nome]
+        if args.traiettoria is None:
+            tempi, angoli = st.traiettoria(args.latitudine, declinazione, args.ore, args.passi)
+
+        serie = st.SerieTemporale(starclass.star(nome, T), args.N, n_bins=args.bins, rng=np.random.default_rng(seme))
+        base = os.path.join(args.out, nome.replace(" ", "_"))
+        conteggi = serie.esegui(tempi, angoli, file=base)
+        with open(base+"_serie.json", "w") as fout:
+            json.dump({"stella": nome, "T": T, "N": args.N, "k_norm": serie.k_norm, "bordi": serie.ist.bordi.tolist(),
+                       "emessi": serie.ist.conteggi.tolist(), "istanti": len(tempi)}, fout, indent=1)
+        print("{:}: {:} istanti, massimo {:} fotoni osservati su {:} (angolo minimo {:.2f} gradi)".format(
+              nome, len(tempi), conteggi.max(), args.N, angoli.min()))
+
+        if args.figure:
+            import matplotlib
+            matplotlib.use("Agg")
+            import matplotlib.pyplot as plt
+            plt.figure(figsize=(10,6))
+            plt.plot(tempi, conteggi, color="mediumseagreen")
+            plt.title("Stella: {:}. \nFotoni osservati lungo la traiettoria".format(nome), fontsize=11)
+            plt.xlabel("Tempo")
+            plt.ylabel("Fotoni osservati")
+            plt.savefig(base+"_serie.png")
+            plt.close()
+
+    print("Risultati salvati in: {:}".format(args.out))
+
+
+if __name__ == "__main__":
+
+    main()
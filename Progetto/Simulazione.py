@@ -3,18 +3,21 @@ File con simulazioni Monte Carlo
 _________________________________________
 """
 import numpy as np
-import math as mt
-import matplotlib.pyplot  as plt
-from scipy import integrate
-from scipy import optimize
-import matplotlib.colors
 import sys
+import os
+import json
 import argparse
 
 #Importo modulo con funzioni
 sys.path.append(" ")
 import func as f
 import starclass
+import parallelo
+import risultati as rs
+import normalizzazione
+import quasi_montecarlo as qmc
+import adattivo
+import telemetria
 
 """
 Gestione delle azioni con argparse
@@ -29,6 +32,26 @@ def parse_arguments():
     parser.add_argument('-bellatrix', '--opzione3', action='store_true',  help='Simulazione con Bellatrix')
     parser.add_argument('-alfacrucis', '--opzione4', action='store_true',  help='Simulazione con Alfa Crucis')
     parser.add_argument('-tutte', '--opzione5', action='store_true',  help='Simulazione con tutte le Stelle')
+    parser.add_argument('--workers', type=int, default=None, help='Esegue le simulazioni in parallelo con questo numero di processi')
+    parser.add_argument('--seed', type=int, default=None, help='Seme per rendere la simulazione riproducibile')
+    parser.add_argument('--headless', action='store_true', help='Non mostra i grafici, salva i risultati su disco')
+    parser.add_argument('--out', default=None, help='Cartella in cui salvare i risultati (implica --headless)')
+    parser.add_argument('--cache', default=None, help='File in cui conservare tra più esecuzioni le costanti di normalizzazione')
+    parser.add_argument('--N', type=int, default=50000, help='Numero di fotoni emessi per stella (in modalità --streaming anche molto grande, la memoria non dipende da N)')
+    parser.add_argument('--streaming', action='store_true', help='Simula a blocchi accumulando istogrammi (memoria costante al crescere di N)')
+    parser.add_argument('--pesato', action='store_true', help='In modalità --streaming o --adattivo usa lo scattering pesato (fotoni con peso pari alla probabilità di osservazione)')
+    parser.add_argument('--qmc', action='store_true', help='In modalità --streaming usa sequenze di Sobol (Quasi Monte Carlo) al posto di numeri pseudo-casuali')
+    parser.add_argument('--repliche', type=int, default=8, help='Numero di repliche Quasi Monte Carlo per stimare gli errori')
+    parser.add_argument('--convergenza', action='store_true', help='Stampa il confronto della convergenza di Monte Carlo e Quasi Monte Carlo')
+    parser.add_argument('--shard', default="0/1", help='In modalità --streaming simula solo lo shard K di M (formato K/M) e lo salva in --out (di default risultati_simulazione)')
+    parser.add_argument('--adattivo', action='store_true', help='Simula a lotti crescenti finché non sono raggiunte le tolleranze')
+    parser.add_argument('--tolleranza', type=float, default=0.01, help='In modalità --adattivo errore relativo massimo sul flusso integrato di ogni angolo')
+    parser.add_argument('--tolleranza-bin', type=float, default=None, help='In modalità --adattivo errore relativo massimo di ogni bin degli istogrammi')
+    parser.add_argument('--n-max', type=int, default=10**8, help='In modalità --adattivo numero massimo di fotoni per stella')
+    parser.add_argument('--float32', action='store_true', help='Fotoni e probabilità di osservazione in float32 (metà memoria, errore in func.BUDGET_FLOAT32)')
+    parser.add_argument('--profilo', default=None, help='Misura tempo e fotoni di ogni fase e salva le misure in questo file .json (formato Chrome trace)')
+    parser.add_argument('--profilo-memoria', action='store_true', help='Con --profilo misura anche il picco di memoria di ogni fase (più lento)')
+    parser.add_argument('--figure', action='store_true', help='In modalità headless salva anche i grafici come .png')
     return  parser.parse_args()
 
 
@@ -36,26 +59,215 @@ def parse_arguments():
 Simulazione eventi per le Stelle in analisi
 ____________________________________________
 """
-def main():
+def mostra_risultati(ris):
+
+    """
+    Funzione che rappresenta i risultati di una stella calcolati da parallelo.simula
+    """
+
+    item=ris["stella"]
+    print("--------------------------------------------------------------------------------------------")
+    print("Simulazione distribuzione senza assorbimento -  {:} ".format(item.name))
+    print("Efficienza del campionamento: {:.3f}".format(ris["efficienza"]))
+    item.no_abs_graph(ris["fotoni"],ris["k_norm"])
+    print("--------------------------------------------------------------------------------------------")
+    print("Simulazione distribuzione con scattering Rayleigh allo zenit -  {:} ".format(item.name))
+    item.R_scattering_graph(ris["fotoni"],ris["zenit"],0,ris["k_norm"])
+    print("--------------------------------------------------------------------------------------------")
+    print("Simulazione distribuzione con scattering Rayleigh all'orizzonte -  {:} ".format(item.name))
+    item.R_scattering_graph(ris["fotoni"],ris["orizzonte"],90,ris["k_norm"])
+    print("--------------------------------------------------------------------------------------------")
+    print("Confronto simulazione diverse distribuzioni -  {:} ".format(item.name))
+    item.compare_graph(*ris["confronto"])
+    print("--------------------------------------------------------------------------------------------")
+    print("Studio andamento numero fotoni totali osservati al variare angolo  -  {:} ".format(item.name))
+    item.flusso_graph(ris["angoli"],ris["integrali"])
+
+
+def streaming(item,N,angles,estremo_sx,estremo_dx,seme,shard=(0,1),cartella=None,pesato=False,repliche=None):
+
+    """
+    Funzione che simula una stella a blocchi (parallelo.simula_istogrammi) e ne rappresenta i risultati
+    a partire dagli istogrammi. Se cartella non è None il risultato è salvato in formato unibile
+    (risultati.salva_istogrammi) e i grafici come .png nella cartella invece di essere mostrati.
+    Se repliche non è None la simulazione è Quasi Monte Carlo (quasi_montecarlo.pipeline) con quel numero di repliche
+    """
+
+    #Le prime due righe sono Zenit e orizzonte, le altre gli angoli del flusso integrato
+    tutti=np.concatenate(([0,90],angles))
+    errori=None
+    if repliche is not None:
+        ist_emessi,ist_osservati,k_norm,errori=qmc.pipeline(item,N,estremo_sx,estremo_dx,tutti,seme=seme,repliche=repliche)
+        n_emessi=N
+    else:
+        ist_emessi,ist_osservati,k_norm,n_emessi=parallelo.simula_istogrammi(item,N,tutti,estremo_sx,estremo_dx,seme,
+                                                                             shard=shard[0],n_shard=shard[1],pesato=pesato)
+    ris=rs.crea_istogrammi(item,ist_emessi,ist_osservati,tutti,k_norm,n_emessi,seme.entropy,shard,errori_totali=errori,
+                           chunk=None if repliche is not None else parallelo.CHUNK)
+
+    print("--------------------------------------------------------------------------------------------")
+    print("Simulazione a blocchi di {:} fotoni (shard {:} di {:}) -  {:} ".format(n_emessi,shard[0],shard[1],item.name))
+    rappresenta(item,ris,shard,cartella)
+
+
+def rappresenta(item,ris,shard=(0,1),cartella=None):
+
+    """
+    Funzione che salva (se cartella non è None) e disegna i risultati a istogrammi di una stella
+    """
+    if cartella is not None:
+        nome=item.name.lower().replace(" ","_")
+        if shard[1]>1:
+            nome+="_shard{:}di{:}".format(shard[0],shard[1])
+        rs.salva_istogrammi(ris,os.path.join(cartella,nome+"_istogrammi.npz"))
+        if shard[1]>1:
+            print("Shard salvato in: {:}".format(os.path.join(cartella,nome+"_istogrammi.npz")))
+    if shard[1]==1:
+        rs.disegna_istogrammi(ris,cartella)
+
+
+def adattiva(item,angles,estremo_sx,estremo_dx,seme,tolleranza_flusso,tolleranza_bin,N_max,cartella=None,pesato=False):
+
+    """
+    Funzione che simula una stella con adattivo.simula, fermandosi quando le tolleranze sono raggiunte,
+    stampa quanti fotoni sono serviti e ne rappresenta i risultati come in modalità --streaming
+
+    Output:
+    Storia della simulazione (vedi adattivo.simula)
+    """
+
+    tutti=np.concatenate(([0,90],angles))
+    ist_emessi,ist_osservati,k_norm,n_emessi,storia=adattivo.simula(item,estremo_sx,estremo_dx,tutti,seme,
+                                                                    tolleranza_flusso=tolleranza_flusso,
+                                                                    tolleranza_bin=tolleranza_bin,N_max=N_max,pesato=pesato)
+    print("--------------------------------------------------------------------------------------------")
+    adattivo.stampa_storia(item.name,storia)
+    ris=rs.crea_istogrammi(item,ist_emessi,ist_osservati,tutti,k_norm,n_emessi,seme.entropy,chunk=parallelo.CHUNK)
+    rappresenta(item,ris,cartella=cartella)
+    return storia
+
+
+def esegui(args):
 
     #Creo le stelle
-    sole=starclass.star("Sole",5.75*10**3)
-    betelgeuse=starclass.star("Betelgeuse",3*10**3)
-    bellatrix=starclass.star("Bellatrix",22*10**3)
-    alfa_crucis=starclass.star("Alfa Crucis",28*10**3)
+    dtype=np.float32 if args.float32 else np.float64
+    sole=starclass.star("Sole",5.75*10**3,dtype)
+    betelgeuse=starclass.star("Betelgeuse",3*10**3,dtype)
+    bellatrix=starclass.star("Bellatrix",22*10**3,dtype)
+    alfa_crucis=starclass.star("Alfa Crucis",28*10**3,dtype)
     stelle=[sole,betelgeuse,bellatrix,alfa_crucis]
 
     #Indago solo nel visibile
     estremo_sx=380 #nm
     estremo_dx=790 #nm
     
-    N=50000 
+    N=args.N
+    if N<1:
+        raise SystemExit("--N deve essere un intero positivo")
 
     #Angoli con cui studiare andamento numero fotoni totali
     angles=np.linspace(0,90,100)
     N1=10000
 
-    args = parse_arguments()
+    headless = args.headless or args.out is not None
+
+    #Lo scattering pesato è implementato solo nelle modalità che accumulano istogrammi
+    if args.pesato and (args.convergenza or not (args.streaming or args.adattivo)):
+        raise SystemExit("L'opzione --pesato si può usare solo con --streaming o --adattivo")
+
+    #Cache su disco delle costanti di normalizzazione, condivisa anche con i processi del pool
+    if args.cache is not None:
+        os.environ["MCF_CACHE_NORM"] = args.cache
+        normalizzazione.cache.file = args.cache
+        if os.path.exists(args.cache):
+            normalizzazione.cache.carica(args.cache)
+
+    scelte=[args.opzione1,args.opzione2,args.opzione3,args.opzione4]
+
+    #Confronto della convergenza di Monte Carlo e Quasi Monte Carlo
+    if args.convergenza:
+
+        selezionate=stelle if args.opzione5 or not any(scelte) else [item for item,scelta in zip(stelle,scelte) if scelta]
+        report=qmc.convergenza(selezionate,[2**k for k in range(10,19,2)],estremo_sx,estremo_dx,seed=args.seed)
+        qmc.stampa_convergenza(report)
+        if args.out is not None:
+            os.makedirs(args.out,exist_ok=True)
+            with open(os.path.join(args.out,"convergenza.json"),"w") as file:
+                json.dump(report,file,indent=2)
+        return
+
+    #Modalità adattiva: il numero di fotoni di ogni stella dipende dalla precisione richiesta
+    if args.adattivo:
+
+        selezionate=stelle if args.opzione5 else [item for item,scelta in zip(stelle,scelte) if scelta]
+        semi=np.random.SeedSequence(args.seed).spawn(len(stelle))
+        cartella=None
+        if headless:
+            import matplotlib
+            matplotlib.use("Agg")
+            cartella=args.out if args.out is not None else "risultati_simulazione"
+            os.makedirs(cartella,exist_ok=True)
+        necessari={}
+        for item in selezionate:
+            storia=adattiva(item,angles,estremo_sx,estremo_dx,semi[stelle.index(item)],args.tolleranza,
+                            args.tolleranza_bin,args.n_max,cartella=cartella,pesato=args.pesato)
+            necessari[item.name]={"N":storia[-1]["N"],"raggiunta":storia[-1]["raggiunta"],"storia":storia}
+        print("--------------------------------------------------------------------------------------------")
+        for nome,voce in necessari.items():
+            print("Fotoni necessari - {:}: {:}{:}".format(nome,voce["N"],"" if voce["raggiunta"] else " (tolleranza non raggiunta)"))
+        if cartella is not None:
+            with open(os.path.join(cartella,"adattivo.json"),"w") as file:
+                json.dump({"tolleranza_flusso":args.tolleranza,"tolleranza_bin":args.tolleranza_bin,"N_max":args.n_max,
+                           "stelle":necessari},file,indent=2)
+        return
+
+    #Modalità a blocchi: nessun fotone è tenuto in memoria, solo gli istogrammi
+    if args.streaming:
+
+        selezionate=stelle if args.opzione5 else [item for item,scelta in zip(stelle,scelte) if scelta]
+        #Ogni stella ha il proprio seme, figlio di quello della simulazione
+        semi=np.random.SeedSequence(args.seed).spawn(len(stelle))
+        try:
+            shard=tuple(int(x) for x in args.shard.split("/"))
+        except ValueError:
+            shard=()
+        if len(shard)!=2 or not 0<=shard[0]<shard[1]:
+            raise SystemExit("--shard deve avere il formato K/M con 0 <= K < M (ad esempio 0/4)")
+        if shard[1]>1 and args.seed is None:
+            raise SystemExit("Per dividere la simulazione in shard bisogna specificare --seed")
+        if args.qmc and (shard[1]>1 or args.pesato):
+            raise SystemExit("La modalità --qmc non si può usare con --shard o --pesato")
+        cartella=None
+        #Uno shard non viene disegnato ma solo salvato, per essere unito agli altri con Unisci_risultati.py
+        if headless or shard[1]>1:
+            import matplotlib
+            matplotlib.use("Agg")
+            cartella=args.out if args.out is not None else "risultati_simulazione"
+            os.makedirs(cartella,exist_ok=True)
+        for item in selezionate:
+            streaming(item,N,angles,estremo_sx,estremo_dx,semi[stelle.index(item)],shard=shard,cartella=cartella,
+                      pesato=args.pesato,repliche=args.repliche if args.qmc else None)
+        return
+
+    #Modalità parallela e riproducibile: calcolo tutto su un pool di processi, poi rappresento
+    if args.workers is not None or args.seed is not None or headless:
+
+        selezionate=stelle if args.opzione5 else [item for item,scelta in zip(stelle,scelte) if scelta]
+        workers=args.workers if args.workers is not None else 1
+        risultati,seme=parallelo.simula(selezionate,N,N1,angles,estremo_sx,estremo_dx,workers=workers,seed=args.seed)
+        print("Seme della simulazione: {:}".format(seme))
+
+        if headless:
+            cartella=args.out if args.out is not None else "risultati_simulazione"
+            parametri={"N":N, "N1":N1, "estremo_sx":estremo_sx, "estremo_dx":estremo_dx}
+            scritti=rs.salva(risultati,seme,cartella,parametri)
+            print("Risultati salvati in: {:}".format(cartella))
+            if args.figure:
+                rs.disegna_tutti(scritti,workers=workers)
+        else:
+            for ris in risultati:
+                mostra_risultati(ris)
+        return
 
     if args.opzione1 == True:
 
@@ -63,6 +275,7 @@ def main():
             sim1=sole.no_absorption(N,estremo_sx,estremo_dx)
             photons=sim1[0]
             k_norm=sim1[1]
+            print("Efficienza del campionamento: {:.3f}".format(sim1[2]))
             sole.no_abs_graph(photons,k_norm)
             
             #Simulazione scattering Rayleigh allo Zenit
@@ -85,6 +298,7 @@ def main():
             sim1=betelgeuse.no_absorption(N,estremo_sx,estremo_dx)
             photons=sim1[0]
             k_norm=sim1[1]
+            print("Efficienza del campionamento: {:.3f}".format(sim1[2]))
             betelgeuse.no_abs_graph(photons,k_norm)
             
             #Simulazione scattering Rayleigh allo Zenit
@@ -106,6 +320,7 @@ def main():
             sim1=bellatrix.no_absorption(N,estremo_sx,estremo_dx)
             photons=sim1[0]
             k_norm=sim1[1]
+            print("Efficienza del campionamento: {:.3f}".format(sim1[2]))
             bellatrix.no_abs_graph(photons,k_norm)
             
             #Simulazione scattering Rayleigh allo Zenit
@@ -127,6 +342,7 @@ def main():
             sim1=alfa_crucis.no_absorption(N,estremo_sx,estremo_dx)
             photons=sim1[0]
             k_norm=sim1[1]
+            print("Efficienza del campionamento: {:.3f}".format(sim1[2]))
             alfa_crucis.no_abs_graph(photons,k_norm)
             
             #Simulazione scattering Rayleigh allo Zenit
@@ -151,6 +367,7 @@ def main():
             sim1=item.no_absorption(N,estremo_sx,estremo_dx)
             photons=sim1[0]
             k_norm=sim1[1]
+            print("Efficienza del campionamento: {:.3f}".format(sim1[2]))
             item.no_abs_graph(photons,k_norm)
             print("--------------------------------------------------------------------------------------------")
             print("Simulazione distribuzione con scattering Rayleigh allo zenit -  {:} ".format(item.name))
@@ -168,6 +385,26 @@ def main():
             item.flusso_integrato(N1,angles)
         
 
+def main():
+
+    args = parse_arguments()
+
+    if args.profilo is None:
+        esegui(args)
+        return
+
+    #Telemetria delle fasi: solo quelle del processo principale (non dei processi del pool)
+    telemetria.abilita(memoria=args.profilo_memoria)
+    try:
+        with telemetria.fase("Simulazione"):
+            esegui(args)
+    finally:
+        telemetria.disabilita()
+        telemetria.stampa_riassunto()
+        telemetria.salva(args.profilo)
+        print("Profilo salvato in: {:}".format(args.profilo))
+
+
 if __name__ == "__main__":
 
     main()
\ No newline at end of file
@@ -0,0 +1,57 @@
+"""
+File per unire i risultati a istogrammi di simulazioni divise tra più macchine
+_______________________________________________________________________________
+"""
+import os
+import sys
+import argparse
+
+#Importo moduli
+sys.path.append(" ")
+import risultati as rs
+
+
+"""
+Gestione delle azioni con argparse
+__________________________________
+"""
+def parse_arguments():
+
+    parser = argparse.ArgumentParser(description='Unione dei risultati salvati da "Simulazione.py --streaming --out"',
+                                     usage      ='file [file ...] [--out CARTELLA]')
+    parser.add_argument('file', nargs='+', help='File _istogrammi.npz da unire (anche di stelle diverse)')
+    parser.add_argument('--out', default=None, help='Cartella in cui salvare risultati uniti e grafici invece di mostrarli')
+    return  parser.parse_args()
+
+
+"""
+Unione dei risultati, stella per stella
+_______________________________________
+"""
+def main():
+
+    args = parse_arguments()
+
+    #Raggruppo i file per stella, mantenendo l'ordine in cui sono dati
+    per_stella = {}
+    for file in args.file:
+        ris = rs.carica_istogrammi(file)
+        per_stella.setdefault(ris["stella"], []).append(ris)
+
+    if args.out is not None:
+        import matplotlib
+        matplotlib.use("Agg")
+        os.makedirs(args.out, exist_ok=True)
+
+    for nome, lista in per_stella.items():
+        unito = rs.unisci_istogrammi(lista)
+        print("--------------------------------------------------------------------------------------------")
+        print("{:}: uniti {:} risultati, {:} fotoni emessi in totale".format(nome, len(lista), unito["N"]))
+        if args.out is not None:
+            rs.salva_istogrammi(unito, os.path.join(args.out, nome.lower().replace(" ", "_")+"_istogrammi.npz"))
+        rs.disegna_istogrammi(unito, args.out)
+
+
+if __name__ == "__main__":
+
+    main()
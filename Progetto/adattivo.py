@@ -0,0 +1,133 @@
+"""
+Modulo per simulare una stella con un numero di fotoni scelto in base alla precisione richiesta
+______________________________________________________________________________________________
+
+I fotoni sono simulati a lotti di dimensione crescente (parallelo.simula_istogrammi, ogni lotto con il
+proprio seme figlio di quello della stella) e accumulati negli istogrammi. Dopo ogni lotto si aggiornano
+le stime e i loro errori statistici:
+- errore relativo sul numero totale di fotoni osservati (flusso integrato) per ogni angolo
+- errore relativo di ogni bin degli istogrammi mostrati (emessi, Zenit e orizzonte)
+- chi quadro ridotto degli istogrammi rispetto ai valori attesi
+
+La simulazione si ferma quando gli errori sono sotto le tolleranze richieste o si raggiunge N_max.
+Poiché gli errori scalano come 1/sqrt(N), il lotto successivo è scelto per raggiungere la tolleranza
+prevista (con un margine del 2%), ma al più raddoppia i fotoni simulati fino a quel momento.
+"""
+
+import numpy as np
+import sys
+
+#Importo moduli con funzioni
+sys.path.append(" ")
+import istogrammi
+import parallelo
+
+
+def errori_relativi(ist):
+
+    """
+    Funzione che restituisce l'errore relativo sqrt(varianza)/conteggi di ogni bin (inf per i bin vuoti)
+    """
+    conteggi = np.asarray(ist.conteggi, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(conteggi > 0, np.sqrt(ist.varianza())/conteggi, np.inf)
+
+
+def errori_flusso(ist_osservati):
+
+    """
+    Funzione che restituisce, per ogni riga (angolo), l'errore relativo sul numero totale di fotoni osservati
+    """
+    totali = np.sum(ist_osservati.conteggi, axis=1, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(totali > 0, np.sqrt(np.sum(ist_osservati.varianza(), axis=1))/totali, np.inf)
+
+
+def simula(stella, estremo_sx, estremo_dx, angles, seme, tolleranza_flusso=0.01, tolleranza_bin=None,
+           N0=10000, N_max=10**8, n_bins=100, pesato=False):
+
+    """
+    Funzione che simula la stella a lotti finché le tolleranze richieste non sono raggiunte
+
+    Input:
+    stella = oggetto starclass.star
+    estremo_sx, estremo_dx = intervallo di lunghezze d'onda
+    angles = angoli delle righe dell'istogramma dei fotoni osservati; le righe con angolo 0 e 90 sono
+             quelle dei grafici a Zenit e orizzonte, le altre quelle del flusso integrato
+    seme = SeedSequence (o intero) della stella
+    tolleranza_flusso = errore relativo massimo sul flusso integrato di ogni angolo (None per non usarla)
+    tolleranza_bin = errore relativo massimo di ogni bin degli istogrammi emessi, Zenit e orizzonte (None per non usarla)
+    N0 = fotoni del primo lotto
+    N_max = numero massimo di fotoni
+    n_bins = numero di bin degli istogrammi
+    pesato = se True lo scattering è pesato
+
+    Output:
+    - istogramma dei fotoni emessi
+    - istogramma a righe dei fotoni osservati
+    - costante di normalizzazione
+    - numero di fotoni emessi
+    - storia: lista di dizionari con, dopo ogni lotto, N, errori massimi, chi quadro ridotti e se le tolleranze sono raggiunte
+    """
+
+    if not isinstance(seme, np.random.SeedSequence):
+        seme = np.random.SeedSequence(seme)
+    angles = np.asarray(angles, dtype=np.float64)
+    grafici = [i for i, a in enumerate(angles) if a in (0, 90)]
+    flusso = [i for i in range(len(angles)) if i not in grafici]
+
+    ist_emessi = None
+    N = 0
+    lotto = N0
+    storia = []
+    while True:
+        e, o, k_norm, n = parallelo.simula_istogrammi(stella, lotto, angles, estremo_sx, estremo_dx, seme.spawn(1)[0],
+                                                      n_bins=n_bins, pesato=pesato)
+        if ist_emessi is None:
+            ist_emessi, ist_osservati = e, o
+        else:
+            ist_emessi.unisci(e)
+            ist_osservati.unisci(o)
+        N += n
+
+        #Stime correnti e loro errori
+        err_flusso = np.max(errori_flusso(ist_osservati)[flusso]) if flusso else 0.0
+        err_bin = max([np.max(errori_relativi(ist_emessi))] +
+                      [np.max(errori_relativi(ist_osservati.riga(i))) for i in grafici])
+        chi2 = {"emessi": istogrammi.chi2_ridotto(ist_emessi.conteggi, istogrammi.attesi(ist_emessi, stella.T, k_norm, N),
+                                                  varianza=ist_emessi.varianza())}
+        for i in grafici:
+            riga = ist_osservati.riga(i)
+            chi2[str(int(angles[i]))] = istogrammi.chi2_ridotto(riga.conteggi, istogrammi.attesi(riga, stella.T, k_norm, N, angles[i]),
+                                                                varianza=riga.varianza())
+
+        #Rapporto (errore/tolleranza) più sfavorevole: la tolleranza è raggiunta se <= 1
+        rapporti = []
+        if tolleranza_flusso is not None:
+            rapporti.append(err_flusso/tolleranza_flusso)
+        if tolleranza_bin is not None:
+            rapporti.append(err_bin/tolleranza_bin)
+        rapporto = max(rapporti) if rapporti else 0.0
+        storia.append({"N": N, "errore_flusso": float(err_flusso), "errore_bin": float(err_bin),
+                       "chi2_rid": chi2, "raggiunta": bool(rapporto <= 1)})
+        if rapporto <= 1 or N >= N_max:
+            break
+
+        #Fotoni previsti per la tolleranza (errore ~ 1/sqrt(N)), al più raddoppiando quelli già simulati
+        previsti = 1.02*N*rapporto**2 if np.isfinite(rapporto) else 2*N
+        lotto = int(min(max(previsti-N, N0//10, 1), N, N_max-N))
+
+    return ist_emessi, ist_osservati, k_norm, N, storia
+
+
+def stampa_storia(nome, storia):
+
+    """
+    Funzione che stampa l'andamento delle stime lotto dopo lotto e il numero di fotoni necessari
+    """
+    print("{:<12} {:>11} {:>15} {:>15} {:>30}".format("Stella", "N", "err. flusso", "err. bin", "chi2_r (emessi, 0, 90)"))
+    for passo in storia:
+        chi2 = ", ".join("{:.2f}".format(v) for v in passo["chi2_rid"].values())
+        print("{:<12} {:>11} {:>15.3e} {:>15.3e} {:>30}".format(nome, passo["N"], passo["errore_flusso"], passo["errore_bin"], chi2))
+    esito = "raggiunta" if storia[-1]["raggiunta"] else "NON raggiunta (limite N_max)"
+    print("{:}: tolleranza {:} con {:} fotoni".format(nome, esito, storia[-1]["N"]))
@@ -0,0 +1,158 @@
+"""
+Modulo per stimare le incertezze del fit degli spettri osservati con pseudo-esperimenti
+______________________________________________________________________________________
+
+Dal fit nominale si ottiene il numero atteso di fotoni mu in ogni bin, compresi i bin vuoti esclusi
+dal fit. Ogni pseudo-esperimento è uno spettro con conteggi di Poisson di media mu, rifittato con lo
+stesso fit usato per i dati (fit_spettro.fitta) partendo dalla soluzione nominale.
+
+Dalla distribuzione dei parametri rifittati si ottengono intervalli di confidenza empirici; i pull
+(parametro rifittato - parametro nominale)/errore del fit dicono se gli errori sqrt(pcov) sono corretti
+(pull con media 0 e deviazione standard 1).
+
+Gli pseudo-esperimenti sono divisi in blocchi, ognuno con il proprio generatore ottenuto da
+SeedSequence: il risultato dipende solo dal seme e dalla dimensione dei blocchi, non dal numero di processi.
+"""
+
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import warnings
+import sys
+
+#Importo moduli con funzioni
+sys.path.append(" ")
+import func as f
+import fit_spettro as fs
+
+
+#Pseudo-esperimenti per blocco, fa parte della definizione del risultato
+BLOCCO = 250
+
+#Livelli degli intervalli di confidenza
+LIVELLI = (0.6827, 0.9545)
+
+
+def _blocco(bincenters, mu, par, n, seme):
+
+    """
+    Compito: genera n spettri di Poisson di media mu e li rifitta partendo da par
+
+    Output:
+    - parametri rifittati (n x 3), NaN per i fit non riusciti
+    - errori dei parametri (n x 3) dati da sqrt(pcov)
+    """
+    from scipy.optimize import OptimizeWarning
+
+    rng = np.random.default_rng(seme)
+    simulati = rng.poisson(mu, size=(n, len(mu))).astype(np.float64)
+    parametri = np.full((n, 3), np.nan)
+    errori = np.full((n, 3), np.nan)
+    for i, spettro in enumerate(simulati):
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("error", OptimizeWarning)
+                ris = fs.fitta(bincenters, spettro, p0=par)
+        except Exception:
+            continue
+        parametri[i] = ris["par"]
+        errori[i] = np.sqrt(np.diag(ris["pcov"]))
+    return parametri, errori
+
+
+def pseudo_esperimenti(bincenters, n, n_toys=1000, workers=1, seed=None, blocco=BLOCCO, p0=None):
+
+    """
+    Funzione che esegue il fit nominale dell'istogramma n e n_toys pseudo-esperimenti
+
+    Input:
+    bincenters, n = centri dei bin e numero di fotoni dell'istogramma osservato
+    n_toys = numero di pseudo-esperimenti
+    workers = numero di processi
+    seed = seme (intero o None)
+    blocco = pseudo-esperimenti per compito
+    p0 = punto di partenza del fit nominale (None per la banca di template)
+
+    Output:
+    Dizionario con:
+    - "nominale": risultato di fit_spettro.fitta sui dati
+    - "mu": numero atteso di fotoni per bin secondo il fit nominale
+    - "parametri", "errori": array (n_toys x 3) dei fit degli pseudo-esperimenti (NaN se non riusciti)
+    - "riusciti": numero di fit riusciti
+    - "seme": entropia del seme, per riprodurre il risultato
+    """
+    bincenters = np.asarray(bincenters, dtype=np.float64)
+    nominale = fs.fitta(bincenters, np.asarray(n, dtype=np.float64), p0)
+    par = nominale["par"]
+    mu = np.clip(f.n_photons_fit(bincenters, *par), 0, None)
+
+    ss = np.random.SeedSequence(seed)
+    dimensioni = [min(blocco, n_toys-i) for i in range(0, n_toys, blocco)]
+    compiti = [(bincenters, mu, par, d, s) for d, s in zip(dimensioni, ss.spawn(len(dimensioni)))]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            uscite = [fut.result() for fut in [pool.submit(_blocco, *c) for c in compiti]]
+    else:
+        uscite = [_blocco(*c) for c in compiti]
+
+    parametri = np.concatenate([u[0] for u in uscite])
+    errori = np.concatenate([u[1] for u in uscite])
+    return {"nominale": nominale,
+            "mu": mu,
+            "parametri": parametri,
+            "errori": errori,
+            "riusciti": int(np.count_nonzero(np.all(np.isfinite(parametri), axis=1))),
+            "seme": ss.entropy}
+
+
+def riassunto(ris, livelli=LIVELLI):
+
+    """
+    Funzione che riassume gli pseudo-esperimenti per ogni parametro (angle, k, T)
+
+    Output:
+    Dizionario con, per ogni parametro: valore ed errore del fit nominale, media e deviazione standard
+    dei valori rifittati, intervalli di confidenza empirici (percentili centrali) per ogni livello,
+    media e deviazione standard dei pull
+    """
+    validi = np.all(np.isfinite(ris["parametri"]), axis=1) & np.all(ris["errori"] > 0, axis=1)
+    parametri = ris["parametri"][validi]
+    errori = ris["errori"][validi]
+    par = ris["nominale"]["par"]
+    sigma = np.sqrt(np.diag(ris["nominale"]["pcov"]))
+    pull = (parametri-par)/errori
+
+    tabella = {}
+    for i, nome in enumerate(fs.NOMI):
+        tabella[nome] = {"nominale": float(par[i]),
+                         "errore_fit": float(sigma[i]),
+                         "media": float(np.mean(parametri[:,i])),
+                         "dev_std": float(np.std(parametri[:,i], ddof=1)),
+                         "intervalli": {str(l): [float(v) for v in np.quantile(parametri[:,i], [(1-l)/2, (1+l)/2])]
+                                        for l in livelli},
+                         "pull_media": float(np.mean(pull[:,i])),
+                         "pull_dev_std": float(np.std(pull[:,i], ddof=1))}
+    return tabella
+
+
+def disegna_pull(ris, salva=None):
+
+    """
+    Funzione che disegna gli istogrammi dei pull dei tre parametri, confrontati con una gaussiana standard
+    """
+    import matplotlib.pyplot as plt
+
+    validi = np.all(np.isfinite(ris["parametri"]), axis=1) & np.all(ris["errori"] > 0, axis=1)
+    pull = (ris["parametri"][validi]-ris["nominale"]["par"])/ris["errori"][validi]
+    x = np.linspace(-5, 5, 200)
+    fig, ax = plt.subplots(1, 3, figsize=(13,4))
+    for i, nome in enumerate(fs.NOMI):
+        ax[i].hist(pull[:,i], bins=50, range=(-5,5), density=True, color="limegreen", label="Pseudo-esperimenti")
+        ax[i].plot(x, np.exp(-x**2/2)/np.sqrt(2*np.pi), color="blue", label="Gaussiana standard")
+        ax[i].set_title("Pull di {:}".format(nome))
+        ax[i].set_xlabel("(valore - nominale)/errore")
+    ax[0].legend(frameon=False, fontsize=8)
+    if salva is not None:
+        plt.savefig(salva)
+        plt.close()
+    else:
+        plt.show()
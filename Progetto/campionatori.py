@@ -0,0 +1,188 @@
+"""
+Modulo con i metodi per generare fotoni dalla distribuzione di corpo nero D_norm
+________________________________________________________________________________
+
+- "hitmiss": Hit or Miss sotto un rettangolo alto quanto il massimo di D_norm
+- "inverse_cdf": inversione della cumulativa tabulata sulla griglia di Simpson (passo circa 0.1 nm),
+                 interpolata linearmente tra i punti della griglia
+- "alias": metodo alias di Walker sui bin della stessa griglia, con densità lineare (trapezio)
+           all'interno di ogni bin
+
+Tutti i metodi accettano come rng un numpy.random.Generator oppure il modulo np.random.
+"""
+
+import numpy as np
+from functools import lru_cache
+import sys
+
+#Importo moduli con funzioni
+sys.path.append(" ")
+import func as f
+import normalizzazione
+
+
+METODI = ("hitmiss", "inverse_cdf", "alias")
+
+#Efficienza dell'Hit or Miss sopra la quale è più veloce del metodo alias (misurata confrontando
+#i tempi dei tre metodi con 10^6 fotoni per le quattro stelle di Simulazione.py)
+SOGLIA_HITMISS = 0.4
+
+
+def hitmiss(rng, N, T, estremo_sx, estremo_dx, batch=10**6):
+
+    """
+    Funzione che genera esattamente N fotoni con il metodo dell'Hit or Miss, estraendo le coppie
+    (lambda, y) a blocchi di al più batch coppie
+
+    Output:
+    - array (float64) con gli N fotoni
+    - efficienza, ossia frazione di coppie estratte accettate
+    """
+    k_norm, lam_max, max_value_1 = normalizzazione.costanti(T, estremo_sx, estremo_dx)
+
+    fotoni = np.empty(N, dtype=np.float64)
+    #Efficienza attesa: area sotto D_norm (=1) diviso area del rettangolo
+    eff = 1/(max_value_1*(estremo_dx-estremo_sx))
+    n_acc = 0 #fotoni salvati
+    n_hit = 0 #coppie accettate (comprese quelle in eccesso nell'ultimo blocco)
+    n_tot = 0 #coppie estratte
+    while n_acc < N:
+
+        #Estraggo circa le coppie necessarie per completare, senza superare batch
+        size = min(batch, int(1.05*(N-n_acc)/eff)+1)
+        lam = rng.uniform(low=estremo_sx,high=estremo_dx,size=size)
+        y_value = rng.uniform(low=0, high=max_value_1, size=size)
+        accettati = lam[y_value <= f.D_norm(lam,T,k_norm)]
+
+        n_new = min(len(accettati), N-n_acc)
+        fotoni[n_acc:n_acc+n_new] = accettati[:n_new]
+        n_acc += n_new
+        n_hit += len(accettati)
+        n_tot += size
+        if n_hit > 0:
+            eff = n_hit/n_tot
+
+    return fotoni, n_hit/max(n_tot,1)
+
+
+def inverse_cdf(rng, N, T, estremo_sx, estremo_dx):
+
+    """
+    Funzione che genera N fotoni invertendo la cumulativa tabulata di D_norm
+
+    Output:
+    Array (float64) con gli N fotoni
+    """
+    x, cdf = normalizzazione.cdf(T, estremo_sx, estremo_dx)
+    return np.interp(rng.uniform(size=N), cdf, x)
+
+
+@lru_cache(maxsize=32)
+def tabella_alias(T, estremo_sx, estremo_dx):
+
+    """
+    Funzione che costruisce (algoritmo di Vose) le tabelle del metodo alias per i bin della griglia di Simpson
+
+    Output:
+    - griglia di lunghezze d'onda (bordi dei bin)
+    - probabilità di accettare il bin estratto
+    - bin alternativo (alias) di ogni bin
+    - valori di D_norm sui bordi della griglia, per la densità lineare nel bin
+    """
+    x, cdf = normalizzazione.cdf(T, estremo_sx, estremo_dx)
+    k_norm = normalizzazione.costanti(T, estremo_sx, estremo_dx)[0]
+    p = np.diff(cdf)
+    n = len(p)
+
+    scala = p*n/p.sum()
+    prob = np.ones(n)
+    alias = np.arange(n)
+    piccoli = list(np.flatnonzero(scala < 1))
+    grandi = list(np.flatnonzero(scala >= 1))
+    while piccoli and grandi:
+        s = piccoli.pop()
+        g = grandi.pop()
+        prob[s] = scala[s]
+        alias[s] = g
+        scala[g] = scala[g]+scala[s]-1
+        if scala[g] < 1:
+            piccoli.append(g)
+        else:
+            grandi.append(g)
+
+    return x, prob, alias, f.D_norm(x, T, k_norm)
+
+
+def alias(rng, N, T, estremo_sx, estremo_dx):
+
+    """
+    Funzione che genera N fotoni con il metodo alias di Walker: si estrae il bin della griglia e poi
+    la posizione nel bin secondo la densità lineare tra i valori di D_norm ai bordi del bin
+
+    Output:
+    Array (float64) con gli N fotoni
+    """
+    x, prob, alias_, d = tabella_alias(float(T), float(estremo_sx), float(estremo_dx))
+    n = len(prob)
+
+    u = rng.uniform(size=N)*n
+    i = np.minimum(u.astype(np.int64), n-1)
+    i = np.where(u-i < prob[i], i, alias_[i])
+
+    #Posizione t in [0,1] nel bin con densità proporzionale a a+(b-a)*t: inverto la cumulativa (quadratica)
+    a = d[i]
+    b = d[i+1]
+    v = rng.uniform(size=N)
+    diff = b-a
+    radice = np.sqrt(a*a+diff*(a+b)*v)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(np.abs(diff) > 1e-12*a, (radice-a)/diff, v)
+    return x[i]+t*(x[i+1]-x[i])
+
+
+def efficienza_hitmiss(T, estremo_sx, estremo_dx):
+
+    """
+    Funzione che restituisce l'efficienza attesa dell'Hit or Miss: area sotto D_norm (=1) diviso area del rettangolo
+    """
+    max_value_1 = normalizzazione.costanti(T, estremo_sx, estremo_dx)[2]
+    return 1/(max_value_1*(estremo_dx-estremo_sx))
+
+
+def scegli(T, estremo_sx, estremo_dx):
+
+    """
+    Funzione che sceglie il metodo più veloce per la stella e l'intervallo dati. La scelta dipende solo da
+    T e dall'intervallo (non da misure di tempo), così che la simulazione resti riproducibile:
+    l'Hit or Miss è usato se la sua efficienza è alta, altrimenti il metodo alias
+    """
+    if efficienza_hitmiss(T, estremo_sx, estremo_dx) >= SOGLIA_HITMISS:
+        return "hitmiss"
+    return "alias"
+
+
+def verifica(fotoni, T, estremo_sx, estremo_dx, n_bins=100, passo_ks=0.001):
+
+    """
+    Funzione che verifica statisticamente dei fotoni generati confrontandoli con D_norm
+
+    Il test di Kolmogorov-Smirnov usa una cumulativa di riferimento indipendente da quella tabulata in
+    normalizzazione.py (che inverse_cdf e alias usano per generare i fotoni): D è integrato con i trapezi
+    su una griglia con passo passo_ks nm, 100 volte più fine della griglia di Simpson, e normalizzato a 1.
+
+    Output:
+    - chi quadro ridotto dell'istogramma rispetto ai valori attesi
+    - p-value del test di Kolmogorov-Smirnov rispetto alla cumulativa di riferimento
+    """
+    from scipy import stats, integrate
+    import istogrammi
+
+    k_norm = normalizzazione.costanti(T, estremo_sx, estremo_dx)[0]
+    ist = istogrammi.Istogramma(estremo_sx, estremo_dx, n_bins)
+    ist.aggiungi(fotoni)
+    chi2_red = istogrammi.chi2_ridotto(ist.conteggi, istogrammi.attesi(ist, T, k_norm, len(fotoni)))
+
+    x = np.linspace(estremo_sx, estremo_dx, int(np.ceil((estremo_dx-estremo_sx)/passo_ks))+1)
+    cdf = integrate.cumulative_trapezoid(f.D(x, T), x, initial=0)
+    p_value = stats.kstest(fotoni, lambda lam: np.interp(lam, x, cdf/cdf[-1])).pvalue
+    return chi2_red, p_value
@@ -0,0 +1,160 @@
+"""
+Modulo con il catalogo di stelle, per simulare insieme molte stelle con temperature diverse
+__________________________________________________________________________________________
+
+Il catalogo tiene nomi e temperature come array (una struttura di array invece di una lista di oggetti
+starclass.star) e calcola normalizzazione, emissione, scattering e flusso integrato di tutte le stelle
+insieme con il broadcasting di numpy. Le stelle sono elaborate a gruppi di al più chunk_stelle e i fotoni
+a blocchi di al più chunk fotoni, così che la memoria usata sia limitata anche per migliaia di stelle.
+
+I risultati per stella sono array con una riga per stella (ad esempio conteggi stelle x angoli).
+"""
+
+import numpy as np
+import sys
+
+#Importo moduli con funzioni
+sys.path.append(" ")
+import func as f
+import normalizzazione
+
+
+def pesi_simpson(x, blocco=256):
+
+    """
+    Funzione che restituisce i pesi w tali che integrate.simpson(y, x=x) = sum(w*y), ottenuti integrando
+    (a blocchi di righe) i vettori della base canonica
+    """
+    from scipy import integrate
+    L = len(x)
+    return np.concatenate([integrate.simpson(np.eye(min(blocco, L-i), L, k=i), x=x, axis=1) for i in range(0, L, blocco)])
+
+
+class StarCatalog:
+
+    """
+    Catalogo di stelle
+
+    Input:
+    names = nomi delle stelle
+    T = temperature delle stelle
+    estremo_sx, estremo_dx = intervallo di lunghezze d'onda in cui si simulano i fotoni
+    chunk_stelle = numero massimo di stelle elaborate insieme
+    """
+
+    def __init__(self, names, T, estremo_sx=380, estremo_dx=790, chunk_stelle=256):
+        self.names = np.asarray(names, dtype=str)
+        self.T = np.asarray(T, dtype=np.float64)
+        if self.names.shape != self.T.shape or self.T.ndim != 1:
+            raise ValueError("names e T devono essere array con lo stesso numero di elementi")
+        self.estremo_sx = estremo_sx
+        self.estremo_dx = estremo_dx
+        self.chunk_stelle = chunk_stelle
+        self.x = normalizzazione.griglia(estremo_sx, estremo_dx)
+        self._k_norm = None
+
+    @classmethod
+    def da_stelle(cls, stelle, estremo_sx=380, estremo_dx=790, chunk_stelle=256):
+        """
+        Metodo che crea il catalogo da una lista di oggetti starclass.star
+        """
+        return cls([s.name for s in stelle], [s.T for s in stelle], estremo_sx, estremo_dx, chunk_stelle)
+
+    def __len__(self):
+        return len(self.T)
+
+    def stella(self, i):
+        """
+        Metodo che restituisce la stella i-esima come oggetto starclass.star
+        """
+        import starclass
+        return starclass.star(str(self.names[i]), float(self.T[i]))
+
+    def _gruppi(self):
+        return [slice(i, min(i+self.chunk_stelle, len(self))) for i in range(0, len(self), self.chunk_stelle)]
+
+    def _D(self, gruppo):
+        #Densità di corpo nero (stelle del gruppo x griglia)
+        return f.D(self.x[np.newaxis,:], self.T[gruppo][:,np.newaxis])
+
+    @property
+    def k_norm(self):
+        """
+        Costanti di normalizzazione di tutte le stelle (integrale di Simpson sulla stessa griglia di normalizzazione.py)
+        """
+        if self._k_norm is None:
+            from scipy import integrate
+            self._k_norm = np.concatenate([1/integrate.simpson(self._D(g), x=self.x, axis=1) for g in self._gruppi()])
+        return self._k_norm
+
+    def cdf(self, gruppo):
+        """
+        Metodo che restituisce la cumulativa di D_norm tabulata sulla griglia per le stelle del gruppo (slice)
+        """
+        from scipy import integrate
+        cdf = integrate.cumulative_simpson(self._D(gruppo), x=self.x, axis=1, initial=0)
+        return cdf/cdf[:,-1:]
+
+    def emissione(self, N, gruppo, rng):
+        """
+        Metodo che genera N fotoni per ogni stella del gruppo (slice) invertendo insieme le cumulative
+        di tutte le stelle: le cumulative sono traslate di un'unità per stella e messe in un unico array
+        ordinato, così che una sola ricerca (np.searchsorted) trovi l'intervallo della griglia di ogni fotone
+
+        Output:
+        Matrice (stelle del gruppo x N) delle lunghezze d'onda dei fotoni
+        """
+        cdf = self.cdf(gruppo)
+        S, L = cdf.shape
+        righe = np.arange(S)[:,np.newaxis]
+        u = rng.uniform(size=(S, N))
+        j = np.searchsorted((cdf+righe).ravel(), (u+righe).ravel(), side="right").reshape(S, N)-righe*L
+        j = np.clip(j, 1, L-1)
+        c0 = np.take_along_axis(cdf, j-1, axis=1)
+        c1 = np.take_along_axis(cdf, j, axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.where(c1 > c0, (u-c0)/(c1-c0), 0)
+        return self.x[j-1]+t*(self.x[j]-self.x[j-1])
+
+    def flusso_integrato(self, N, angles, rng=None, chunk=10**4, chunk_size=2**22):
+        """
+        Metodo che simula N fotoni per ogni stella e conta quanti sono osservati per ogni angolo
+        (come star.flusso_integrato, per tutte le stelle insieme)
+
+        Input:
+        N = numero di fotoni emessi per stella
+        angles = array di angoli rispetto allo Zenit
+        rng = numpy.random.Generator (o seme); se None un generatore con seme casuale
+        chunk = numero massimo di fotoni per stella generati insieme
+        chunk_size = numero massimo di elementi della matrice (angoli x stelle x fotoni) tenuti in memoria
+
+        Output:
+        Matrice (stelle x angoli) con il numero di fotoni osservati; come in R_scattering_multi l'estrazione
+        di ogni angolo è indipendente da quella degli altri angoli
+        """
+        rng = np.random.default_rng(rng)
+        angles = np.atleast_1d(np.asarray(angles, dtype=np.float64))
+        conteggi = np.zeros((len(self), len(angles)), dtype=np.int64)
+        for g in self._gruppi():
+            for inizio in range(0, N, chunk):
+                fotoni = self.emissione(min(chunk, N-inizio), g, rng)
+                #Blocchi di angoli, con una uniforme per ogni coppia (angolo, fotone)
+                passo = max(1, chunk_size//fotoni.size)
+                for a in range(0, len(angles), passo):
+                    prob = f.prob_obs(fotoni[np.newaxis], angles[a:a+passo,np.newaxis,np.newaxis])
+                    osservati = rng.uniform(size=prob.shape) < prob
+                    conteggi[g, a:a+passo] += np.count_nonzero(osservati, axis=2).T
+        return conteggi
+
+    def frazioni_attese(self, angles):
+        """
+        Metodo che calcola, per ogni stella e ogni angolo, la frazione attesa di fotoni osservati,
+        integrale di D_norm*prob_obs con i pesi di Simpson della griglia (un prodotto matrice per matrice)
+
+        Output:
+        Matrice (stelle x angoli)
+        """
+        angles = np.atleast_1d(np.asarray(angles, dtype=np.float64))
+        P = f.prob_obs(self.x[np.newaxis,:], angles[:,np.newaxis])
+        pesi = pesi_simpson(self.x)
+        return np.concatenate([(self._D(g)*self.k_norm[g][:,np.newaxis])@(P*pesi).T for g in self._gruppi()])
@@ -0,0 +1,104 @@
+"""
+Modulo con il fit degli spettri osservati, usato da Analisi_dati.py e da Fit_catalogo.py
+________________________________________________________________________________________
+"""
+
+import numpy as np
+import time
+import sys
+
+#Importo modulo con funzioni
+sys.path.append(" ")
+import func as f
+import template
+import spettri
+
+
+#Punto di partenza del fit trovato per la stella X
+P0 = [45, 3.309509356824346e-30, 8001]
+
+NOMI = ("angle", "k", "T")
+
+
+def istogramma_csv(file, n_bins=99, cartella=None):
+
+    """
+    Funzione che legge un file .csv con colonne "lambda (nm)" e "photons" e ne costruisce l'istogramma
+    con n_bins bin (come plt.hist con weights), usando la copia binaria del file (modulo spettri.py)
+    salvata accanto al .csv o nella cartella indicata
+
+    Output:
+    - centri dei bin
+    - numero di fotoni in ogni bin
+    """
+    n, bins = spettri.istogramma(file, n_bins, cartella)
+    return (bins[:-1]+bins[1:])/2, n
+
+
+def fitta(bincenters, n, p0=None, banca=None):
+
+    """
+    Funzione che esegue il fit di f.n_photons_fit sui bin non vuoti dell'istogramma, con errori di Poisson.
+    Se p0 è None il punto di partenza è il template migliore della banca (modulo template.py),
+    salvata nel file banca se indicato
+
+    Output:
+    Dizionario con parametri, matrice di covarianza, chi quadro ridotto, gradi di libertà,
+    numero di valutazioni della funzione, punto di partenza e tempo impiegato (compresa la ricerca del template)
+    """
+    from scipy.optimize import curve_fit
+
+    inizio = time.perf_counter()
+    if p0 is None:
+        p0 = template.banca(bincenters, banca).punto_iniziale(n)
+    mask = np.nonzero(n)
+    modello = f.modello_fit(bincenters[mask])
+    par, pcov, info, messaggio, ier = curve_fit(modello, xdata=bincenters[mask], ydata=n[mask], sigma=np.sqrt(n[mask]),
+                                                p0=p0, absolute_sigma=True, jac=modello.jac, full_output=True)
+    scarto = n[mask]-modello(bincenters[mask], *par)
+    ndof = len(n[mask])-len(par)
+    return {"par": par,
+            "pcov": pcov,
+            "chi2_rid": np.sum(scarto**2/n[mask])/ndof,
+            "ndof": ndof,
+            "nfev": info["nfev"],
+            "p0": p0,
+            "tempo": time.perf_counter()-inizio}
+
+
+def fitta_file(file, p0=None, n_bins=99, banca=None, cartella=None):
+
+    """
+    Funzione che esegue il fit di un file .csv. Gli errori (file illeggibile, fit non convergente,
+    covarianza non stimabile) non sono sollevati ma riportati nella riga dei risultati
+
+    Output:
+    Dizionario con una riga della tabella dei risultati
+    """
+    import warnings
+    from scipy.optimize import OptimizeWarning
+
+    riga = {"file": file, "stato": "ok", "messaggio": ""}
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", OptimizeWarning)
+            bincenters, n = istogramma_csv(file, n_bins, cartella)
+            ris = fitta(bincenters, n, p0, banca)
+    except Exception as errore:
+        riga["stato"] = "errore"
+        riga["messaggio"] = "{:}: {:}".format(type(errore).__name__, errore)
+        return riga
+
+    for i, nome in enumerate(NOMI):
+        riga[nome] = ris["par"][i]
+    for i, nome_i in enumerate(NOMI):
+        for j, nome_j in enumerate(NOMI[i:], start=i):
+            riga["cov_{:}_{:}".format(nome_i, nome_j)] = ris["pcov"][i][j]
+    if not np.all(np.isfinite(ris["pcov"])):
+        riga["stato"] = "errore"
+        riga["messaggio"] = "Covarianza non stimabile"
+    for i, nome in enumerate(NOMI):
+        riga[nome+"_0"] = ris["p0"][i]
+    for chiave in ("chi2_rid", "ndof", "nfev", "tempo"):
+        riga[chiave] = ris[chiave]
+    return riga
@@ -16,8 +16,62 @@ density = 2.504*(10**(25)) #molecole/m**3
 R_T = 6378*10**3 #m
 S_z = 8000 #m
 
+#Errore relativo massimo di D, D_norm, prob_obs e n_photons_fit in float32 rispetto a float64 (per valori
+#sopra 1e-30 e T tra 1000 e 100000 K), nel visibile (380-790 nm) e tra 1 nm e 10 µm; verificato da Benchmark.py
+BUDGET_FLOAT32 = {"visibile": 2e-5, "esteso": 1e-4}
 
-def D(lam,T):
+
+def _tipo(lam, dtype):
+
+    """
+    Funzione che restituisce il tipo in cui valutare le funzioni: dtype se indicato, altrimenti float32
+    se lam è un array float32 e float64 in tutti gli altri casi
+    """
+    if dtype is None:
+        dtype = np.float32 if np.asarray(lam).dtype == np.float32 else np.float64
+    return np.dtype(dtype)
+
+
+def _bose(x):
+
+    """
+    Funzione che scrive 1/(e^x-1) come segno*e^(-xp)/m con xp = max(x,0) e m = 1-e^(-|x|): i termini sono
+    finiti anche per x < 0, ossia lam < 0 (provate ad esempio da optimize.minimize in normalizzazione)
+    """
+    return np.maximum(x, 0), np.where(x > 0, 1.0, -1.0), -np.expm1(-np.abs(x))
+
+
+def _in_zero(lam_fromnano, valori, limite=0.0):
+
+    """
+    Funzione che sostituisce i valori in lam = 0, dove i termini dei kernel sono infiniti e il risultato
+    è 0/0, con il limite per lam -> 0+ (0 per D e per le funzioni che lo contengono, -inf per log_D)
+    """
+    if np.any(lam_fromnano == 0):
+        return np.where(lam_fromnano == 0, limite, valori)
+    return valori
+
+
+def log_D(lam,T,dtype=None):
+
+    """
+    Funzione che restituisce il logaritmo della densità di fotoni D(lam,T)
+
+    ln D = ln(2*c) - 4*ln(lam) - x - ln(1-e^(-x))     con x = alfa/lam
+
+    finito per ogni lam > 0 e T > 0, anche dove D è troppo piccolo per essere rappresentato
+    (ad esempio lam = 1 nm e T = 1000 K), e -inf per lam = 0. T può essere un array, combinato con lam
+    per broadcasting.
+    """
+    tipo = _tipo(lam, dtype)
+    lam_fromnano = np.asarray(lam, dtype=tipo)*tipo.type(1e-9)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = np.asarray(h*c/(k_b*np.asarray(T, dtype=np.float64)), dtype=tipo)/lam_fromnano
+        valori = tipo.type(mt.log(2*c)) - 4*np.log(lam_fromnano) - x - np.log(-np.expm1(-x))
+    return _in_zero(lam_fromnano, valori, -np.inf)
+
+
+def D(lam,T,dtype=None):
 
     """
     Funzione densità di fotoni per lunghezza d'onda e unità di superficie e tempo
@@ -34,20 +88,34 @@ def D(lam,T):
     input:
     lam = array di lunghezze d'onda espresse in nanometri
     T = temperatura della Stella di cui si sta studiando lo spettro
+    dtype = tipo del risultato (np.float64 o np.float32); se None è float32 solo se lam è un array float32
 
     output:
     Array dei valori della funzione nelle lunghezze d'onda in ingresso
 
+    Per evitare l'overflow di e^(alfa/lambda) (ad esempio a 10 nm o per stelle fredde) si usa la forma
+    equivalente 2*c*e^(-x)/((lamda^4)*(1-e^(-x))) con x = alfa/lambda e 1-e^(-x) = -expm1(-x);
+    in float32 il valore è calcolato come exp(log_D), così che nessun termine intermedio esca dall'intervallo
+    rappresentabile. In lam = 0 il valore è il limite per lam -> 0+, ossia 0.
     """
 
+    tipo = _tipo(lam, dtype)
+    if tipo == np.float32:
+        return np.exp(log_D(lam, T, tipo))
     #Lunghezza d'onda in entrata in nanometri, converto in metri
-    lam_fromnano = lam*10**(-9)
-    alfa = h*c/(k_b*T)
-    expon = (alfa/lam_fromnano)
-    den=np.power(lam_fromnano, 4)*(np.exp(expon)-1)
-    return 2*c/den
+    lam_fromnano = np.asarray(lam, dtype=np.float64)*10**(-9)
+    alfa = h*c/(k_b*np.asarray(T, dtype=np.float64))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        expon = (alfa/lam_fromnano)
+        xp, segno, m = _bose(expon)
+        den=np.power(lam_fromnano, 4)*m
+        valori = 2*c*segno*np.exp(-xp)/den
+        #Dove e^(-x) va in underflow ma D è ancora rappresentabile si somma il logaritmo del prefattore
+        if np.any(expon > 700):
+            valori = np.where(expon > 700, np.exp(np.log(2*c/den)-np.maximum(expon, 700)), valori)
+    return _in_zero(lam_fromnano, valori)
 
-def D_norm(lam,T,k_norm):
+def D_norm(lam,T,k_norm,dtype=None):
 
     """
     Funzione densità di fotoni per lunghezza d'onda e unità di superficie e tempo normalizzata per avere
@@ -58,7 +126,12 @@ def D_norm(lam,T,k_norm):
     con k_norm la costante di normalizzazione, ossia il reciproco dell'integrale della distribuzione 
     nell'interavallo di lunghezze d'onda considerate
 
+    In float32 è calcolata come exp(ln(k_norm) + log_D), poiché k_norm e D possono essere fuori
+    dall'intervallo del float32 anche quando il loro prodotto non lo è.
     """
+    tipo = _tipo(lam, dtype)
+    if tipo == np.float32:
+        return np.exp(log_D(lam, T, tipo)+tipo.type(mt.log(k_norm)))
     return D(lam,T)*k_norm
 
 def D_norm_opposite(lam,T,k_norm):
@@ -71,7 +144,7 @@ def D_norm_opposite(lam,T,k_norm):
     """
     return -D_norm(lam,T,k_norm)
 
-def prob_obs(lam,angle):
+def prob_obs(lam,angle,dtype=None):
 
     """
     Funzione che restituisce la probabilità di osservazione di un fotone ad una data lunghezza d'onda
@@ -79,7 +152,8 @@ def prob_obs(lam,angle):
 
     Input:
     lam: array di lunghezze d'onda
-    angle: angolo della stella rispetto allo Zenit
+    angle: angolo (o array di angoli, in gradi) della stella rispetto allo Zenit, combinato con lam
+           secondo le regole di broadcasting di numpy
 
     p_obs(lam,angle) = e^(-beta(lam)*S(angle))
 
@@ -91,35 +165,129 @@ def prob_obs(lam,angle):
     - S(angle) = ((R_T*cos(angle))^2+2*R_T*S_z+S_z^2)^0.5)-R_T*cos(angle)
         R_T: raggio della Terra
         S_z: spessore massa d'aria allo Zenit
+
+    dtype = tipo del risultato (np.float64 o np.float32); se None è float32 solo se lam è un array float32.
+    S(angle) è sempre calcolato in float64 (gli angoli sono pochi) e poi convertito.
     
     Output:
     Array con le probabilità
     """
     
-    lam_fromnano=np.array(lam)*10**(-9)
-    num=-8*mt.pi**3*(n_refr**2-1)**2
-    den=3*density*(lam_fromnano**4)
-    beta= num/den
-    angle_rad=angle*mt.pi/180
-    S= mt.sqrt((R_T*mt.cos(angle_rad))**2+2*R_T*S_z+S_z**2)-R_T*mt.cos(angle_rad)
-    return np.exp(beta*S)
+    tipo = _tipo(lam, dtype)
+    lam_fromnano=np.asarray(lam, dtype=tipo)*tipo.type(10**(-9))
+    num=tipo.type(-8*mt.pi**3*(n_refr**2-1)**2)
+    den=tipo.type(3*density)*(lam_fromnano**4)
+    #In lam = 0 beta è infinito e la probabilità è 0
+    with np.errstate(divide="ignore"):
+        beta= num/den
+    angle_rad=np.asarray(angle, dtype=np.float64)*mt.pi/180
+    S= np.sqrt((R_T*np.cos(angle_rad))**2+2*R_T*S_z+S_z**2)-R_T*np.cos(angle_rad)
+    return np.exp(beta*np.asarray(S, dtype=tipo))
 
 
-def n_photons_fit(lam,angle,k,T):
+def n_photons_fit(lam,angle,k,T,dtype=None):
 
     """
     Funzione uguale a N_obs a meno di un coefficiente moltiplicativo che tenga in conto che la distribuzione non è 
     normalizzata
     N_obs(lam,angle,T) = k * D(lam,T) * p_obs(lam,angle)
 
+    angle può essere un array, combinato con lam secondo le regole di broadcasting di numpy
+
+    Gli esponenziali di D e p_obs sono uniti, 2*c*e^(-x-beta*S)/((lam^4)*(1-e^(-x))) con x = alfa/lam, così
+    che il risultato sia finito anche dove e^(x) andrebbe in overflow (ad esempio sotto i 20 nm);
+    in float32 si usa log_D come in D.
     """
-    lam_fromnano=lam*10**(-9)
-    alfa=h*c/(k_b*T)
-    den=np.power(lam_fromnano, 4)*(np.exp(alfa/lam_fromnano)-1)
-    D_value=2*c/den
+    tipo = _tipo(lam, dtype)
+    lam_fromnano=np.asarray(lam, dtype=tipo)*tipo.type(10**(-9))
     
-    theta_xrad=angle*mt.pi/180
-    S_theta=mt.sqrt((R_T*mt.cos(theta_xrad))**2+2*R_T*S_z+S_z**2)-R_T*mt.cos(theta_xrad)
-    beta=8*np.pi**3*(n_refr**2-1)**2/(3*density*lam_fromnano**4)
+    theta_xrad=np.asarray(angle, dtype=np.float64)*mt.pi/180
+    S_theta=np.sqrt((R_T*np.cos(theta_xrad))**2+2*R_T*S_z+S_z**2)-R_T*np.cos(theta_xrad)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        beta=tipo.type(8*np.pi**3*(n_refr**2-1)**2/(3*density))/lam_fromnano**4
+        esponente=-beta*np.asarray(S_theta, dtype=tipo)
+
+        if tipo == np.float32:
+            return k*np.exp(log_D(lam, T, tipo)+esponente)
+        x=h*c/(k_b*T)/lam_fromnano
+        xp, segno, m = _bose(x)
+        den=np.power(lam_fromnano, 4)*m
+        valori=2*c*segno*np.exp(esponente-xp)/den
+        if np.any(esponente-xp < -700):
+            valori=np.where(esponente-xp < -700, segno*np.exp(np.log(2*c/den)+esponente-xp), valori)
+    return k*_in_zero(lam_fromnano, valori)
+
+class modello_fit:
+
+    """
+    Modello N_obs(lam,angle,k,T) di n_photons_fit precompilato per una griglia fissata di lunghezze d'onda.
+    I termini che dipendono solo da lam (conversione in metri, lam^4, coefficiente di Rayleigh beta)
+    sono calcolati una sola volta alla creazione; inoltre il modello fornisce lo Jacobiano analitico
+    rispetto a (angle, k, T), da passare a curve_fit con jac=modello.jac.
+
+    Uso:
+    modello = modello_fit(lam)
+    par, pcov = curve_fit(modello, lam, n, p0=..., jac=modello.jac)
+    """
+
+    def __init__(self, lam):
+        self.lam = np.asarray(lam, dtype=np.float64)
+        self._termini = self._calcola_termini(self.lam)
+
+    @staticmethod
+    def _calcola_termini(lam):
+        lam_fromnano = lam*10**(-9)
+        lam4 = np.power(lam_fromnano, 4)
+        with np.errstate(divide="ignore"):
+            beta = 8*np.pi**3*(n_refr**2-1)**2/(3*density*lam4)
+        return lam_fromnano, lam4, beta
+
+    def termini(self, lam):
+        """
+        Metodo che restituisce i termini dipendenti solo da lam: quelli precalcolati se lam è la griglia
+        del modello, altrimenti li calcola
+        """
+        if lam is self.lam or (np.shape(lam) == self.lam.shape and np.array_equal(lam, self.lam)):
+            return self._termini
+        return self._calcola_termini(np.asarray(lam, dtype=np.float64))
+
+    @staticmethod
+    def S(angle):
+        """
+        Metodo che restituisce lo spessore d'aria attraversato S(angle) e la sua derivata rispetto ad angle (in gradi)
+        """
+        theta = angle*mt.pi/180
+        radice = mt.sqrt((R_T*mt.cos(theta))**2+2*R_T*S_z+S_z**2)
+        S = radice-R_T*mt.cos(theta)
+        dS = R_T*mt.sin(theta)*(1-R_T*mt.cos(theta)/radice)*mt.pi/180
+        return S, dS
+
+    def __call__(self, lam, angle, k, T):
+        lam_fromnano, lam4, beta = self.termini(lam)
+        S_theta = self.S(angle)[0]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x = h*c/(k_b*T)/lam_fromnano
+            xp, segno, m = _bose(x)
+            valori = k*2*c*segno*np.exp(-xp-beta*S_theta)/(lam4*m)
+        return _in_zero(lam_fromnano, valori)
+
+    def jac(self, lam, angle, k, T):
+        """
+        Metodo che restituisce lo Jacobiano (len(lam) x 3) del modello rispetto a (angle, k, T)
 
-    return k*D_value*np.exp(-beta*S_theta)
\ No newline at end of file
+        dN/dangle = -N*beta*dS/dangle
+        dN/dk     = N/k
+        dN/dT     = N*x*e^x/(e^x-1)/T      con x = h*c/(k_B*T*lam)
+        """
+        lam_fromnano, lam4, beta = self.termini(lam)
+        S_theta, dS = self.S(angle)
+        J = np.empty((len(lam_fromnano), 3))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x = h*c/(k_b*T)/lam_fromnano
+            xp, segno, m = _bose(x)
+            D_P = 2*c*segno*np.exp(-xp-beta*S_theta)/(lam4*m)
+            N = k*D_P
+            J[:,0] = -N*beta*dS
+            J[:,1] = D_P
+            J[:,2] = N*np.abs(x)*np.exp(x-xp)/m/T
+        return _in_zero(lam_fromnano[:,np.newaxis], J)
@@ -0,0 +1,185 @@
+"""
+Modulo con gli istogrammi incrementali usati per analizzare le simulazioni a blocchi
+____________________________________________________________________________________
+
+Un istogramma ha bordi fissati al momento della creazione e viene riempito un blocco di fotoni
+alla volta, così che la memoria usata non dipenda dal numero totale di fotoni simulati.
+"""
+
+import numpy as np
+import sys
+
+#Importo modulo con funzioni
+sys.path.append(" ")
+import func as f
+
+
+class Istogramma:
+
+    """
+    Istogramma con n_bins bin uguali tra estremo_sx ed estremo_dx (l'ultimo bin include estremo_dx,
+    come in np.histogram). Se righe non è None i conteggi sono una matrice (righe x n_bins), ad esempio
+    un istogramma per ogni angolo.
+    Se pesato è True ogni valore contribuisce con un peso: i conteggi sono somme di pesi e si
+    accumula anche la somma dei pesi al quadrato, che stima la varianza di ogni bin.
+    """
+
+    def __init__(self, estremo_sx, estremo_dx, n_bins, righe=None, pesato=False):
+        self.bordi = np.linspace(estremo_sx, estremo_dx, n_bins+1)
+        self.centri = (self.bordi[:-1]+self.bordi[1:])/2
+        self.larghezza = (estremo_dx-estremo_sx)/n_bins
+        self.n_bins = n_bins
+        self.pesato = pesato
+        forma = n_bins if righe is None else (righe, n_bins)
+        self.conteggi = np.zeros(forma, dtype=np.float64 if pesato else np.int64)
+        self.pesi2 = np.zeros(forma, dtype=np.float64) if pesato else None
+        self.ingressi = 0 #numero di valori passati ad aggiungi (anche se fuori dai bordi)
+
+    def varianza(self):
+        """
+        Metodo che restituisce la varianza stimata di ogni bin: i conteggi stessi (Poisson) oppure,
+        se l'istogramma è pesato, la somma dei pesi al quadrato
+        """
+        return self.pesi2 if self.pesato else self.conteggi
+
+    def indici(self, valori):
+        """
+        Metodo che restituisce il bin di ogni valore (-1 o n_bins se fuori dai bordi)
+        """
+        idx = np.searchsorted(self.bordi, valori, side="right")-1
+        idx[valori == self.bordi[-1]] = self.n_bins-1
+        return idx
+
+    def aggiungi(self, valori, maschere=None, pesi=None):
+        """
+        Metodo che aggiunge un blocco di valori all'istogramma
+
+        Input:
+        valori = array dei valori del blocco
+        maschere = solo per istogrammi a righe: matrice booleana (righe x valori), il valore
+                   j-esimo è contato nella riga i-esima se maschere[i,j] è True
+        pesi = solo per istogrammi pesati: array dei pesi dei valori oppure, per istogrammi a righe,
+               matrice (righe x valori) con il peso del valore j-esimo nella riga i-esima
+        """
+        valori = np.asarray(valori)
+        idx = self.indici(valori)
+        dentro = (idx >= 0) & (idx < self.n_bins)
+        self.ingressi += len(valori)
+        if self.conteggi.ndim == 1:
+            if pesi is None:
+                self.conteggi += np.bincount(idx[dentro], minlength=self.n_bins).astype(self.conteggi.dtype)
+                if self.pesato:
+                    self.pesi2 += np.bincount(idx[dentro], minlength=self.n_bins)
+            else:
+                self.conteggi += np.bincount(idx[dentro], weights=pesi[dentro], minlength=self.n_bins)
+                self.pesi2 += np.bincount(idx[dentro], weights=pesi[dentro]**2, minlength=self.n_bins)
+        else:
+            righe = self.conteggi.shape[0]
+            selezione = dentro[np.newaxis,:] if maschere is None else maschere & dentro
+            selezione = np.broadcast_to(selezione, (righe, len(valori)))
+            piatti = (np.arange(righe)[:,np.newaxis]*self.n_bins + idx[np.newaxis,:])[selezione]
+            if pesi is None:
+                self.conteggi += np.bincount(piatti, minlength=righe*self.n_bins).reshape(righe, self.n_bins)
+            else:
+                w = pesi[selezione]
+                self.conteggi += np.bincount(piatti, weights=w, minlength=righe*self.n_bins).reshape(righe, self.n_bins)
+                self.pesi2 += np.bincount(piatti, weights=w**2, minlength=righe*self.n_bins).reshape(righe, self.n_bins)
+
+    def riga(self, i):
+        """
+        Metodo che restituisce, come istogramma semplice, la riga i-esima di un istogramma a righe
+        """
+        ist = Istogramma(self.bordi[0], self.bordi[-1], self.n_bins, pesato=self.pesato)
+        ist.conteggi = self.conteggi[i].copy()
+        if self.pesato:
+            ist.pesi2 = self.pesi2[i].copy()
+        ist.ingressi = self.ingressi
+        return ist
+
+    def unisci(self, altro):
+        """
+        Metodo che somma all'istogramma un altro istogramma con gli stessi bordi
+        """
+        if not np.array_equal(self.bordi, altro.bordi):
+            raise ValueError("Non si possono unire istogrammi con bordi diversi")
+        if self.pesato != altro.pesato:
+            raise ValueError("Non si possono unire istogrammi pesati e non pesati")
+        self.conteggi += altro.conteggi
+        if self.pesato:
+            self.pesi2 += altro.pesi2
+        self.ingressi += altro.ingressi
+
+
+def dai_dati(valori, n_bins):
+
+    """
+    Funzione che crea un istogramma con bordi tra il minimo e il massimo dei valori (come plt.hist) e lo riempie.
+    Come np.histogram, senza valori i bordi sono tra 0 e 1 e con valori tutti uguali tra valore-0.5 e valore+0.5;
+    n_bins è almeno 1 (ad esempio se è calcolato come radice del numero di valori)
+    """
+    n_bins = max(1, int(n_bins))
+    valori = np.asarray(valori)
+    if valori.size == 0:
+        sx, dx = 0.0, 1.0
+    else:
+        sx, dx = float(valori.min()), float(valori.max())
+        if sx == dx:
+            sx, dx = sx-0.5, dx+0.5
+    ist = Istogramma(sx, dx, n_bins)
+    ist.aggiungi(valori)
+    return ist
+
+
+def da_conteggi(bordi, conteggi, pesi2=None):
+
+    """
+    Funzione che ricostruisce un istogramma (semplice o a righe) dai bordi e dai conteggi, ad esempio letti da file.
+    Se pesi2 non è None l'istogramma è pesato e pesi2 sono le somme dei pesi al quadrato
+    """
+    conteggi = np.asarray(conteggi)
+    pesato = pesi2 is not None
+    ist = Istogramma(bordi[0], bordi[-1], len(bordi)-1, righe=None if conteggi.ndim == 1 else conteggi.shape[0], pesato=pesato)
+    ist.bordi = np.asarray(bordi, dtype=np.float64)
+    ist.centri = (ist.bordi[:-1]+ist.bordi[1:])/2
+    ist.conteggi = conteggi.astype(np.float64 if pesato else np.int64)
+    if pesato:
+        ist.pesi2 = np.asarray(pesi2, dtype=np.float64)
+    return ist
+
+
+def attesi(ist, T, k_norm, n_emessi, angle=None):
+
+    """
+    Funzione che calcola il numero di fotoni atteso in ogni bin dell'istogramma
+
+    Input:
+    ist = istogramma
+    T, k_norm = temperatura della stella e costante di normalizzazione
+    n_emessi = numero di fotoni emessi
+    angle = angolo rispetto allo Zenit; se None non si considera lo scattering di Rayleigh
+
+    Output:
+    Array con i conteggi attesi
+    """
+    n_exp = n_emessi*f.D_norm(ist.centri,T,k_norm)*ist.larghezza
+    if angle is not None:
+        n_exp = n_exp*f.prob_obs(ist.centri,angle)
+    return n_exp
+
+
+def chi2_ridotto(n, n_exp, soglia=4, varianza=None):
+
+    """
+    Funzione che calcola il chi quadro ridotto tra conteggi simulati e attesi,
+    considerando solo i bin con almeno soglia eventi. La varianza di ogni bin è n (Poisson)
+    se varianza è None, ad esempio per istogrammi pesati si passa la somma dei pesi al quadrato
+    """
+    if varianza is None:
+        varianza = n
+    mask = (n >= soglia) & (varianza > 0)
+    chi2 = np.sum( (n_exp[mask] - n[mask])**2 /varianza[mask] )
+    ndof = len(n[mask])-1
+    #Con meno di due bin utilizzabili (ad esempio nessun fotone osservato) il chi quadro ridotto non è definito
+    if ndof < 1:
+        return np.nan
+    return chi2/ndof
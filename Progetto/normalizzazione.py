@@ -0,0 +1,157 @@
+"""
+Modulo con la cache delle costanti di normalizzazione della distribuzione di corpo nero
+_______________________________________________________________________________________
+
+Per ogni terna (T, estremo_sx, estremo_dx) si calcolano una sola volta:
+- la costante di normalizzazione k_norm (integrale di Simpson su una griglia con passo di circa 0.1 nm)
+- la lunghezza d'onda e il valore del massimo di D_norm (usati come inviluppo dall'Hit or Miss)
+- opzionalmente la funzione cumulativa tabulata sulla stessa griglia
+
+Le voci sono tenute in una cache LRU e possono essere salvate su file, così che esecuzioni
+successive o più stelle non ricalcolino le stesse costanti. Il file di default può essere
+indicato con la variabile d'ambiente MCF_CACHE_NORM.
+"""
+
+import numpy as np
+from collections import OrderedDict
+import os
+import pickle
+import sys
+
+#Importo modulo con funzioni
+sys.path.append(" ")
+import func as f
+import telemetria
+
+
+def griglia(estremo_sx, estremo_dx):
+
+    """
+    Funzione che restituisce la griglia di lunghezze d'onda, equispaziate di circa 0.1 nm, usata per l'integrazione
+    """
+    num = int((estremo_dx-estremo_sx)/0.1)
+    return np.linspace(estremo_sx, estremo_dx, num)
+
+
+def calcola(T, estremo_sx, estremo_dx, con_cdf=False):
+
+    """
+    Funzione che calcola le costanti di normalizzazione senza usare la cache
+
+    Output:
+    Dizionario con k_norm, lam_max, max_value e, se con_cdf=True, la griglia x e la cumulativa cdf
+    """
+    from scipy import integrate
+    from scipy import optimize
+
+    x = griglia(estremo_sx, estremo_dx)
+    with telemetria.fase("normalizzazione.simpson", T=T):
+        k_norm = 1/integrate.simpson(f.D(x,T),x) #costante con cui normalizzare distribuzione
+    with telemetria.fase("normalizzazione.massimo", T=T):
+        x_max = optimize.minimize(f.D_norm_opposite,x0=(estremo_sx+estremo_dx)/2,args=(T,k_norm), tol=1e-9)
+    voce = {"k_norm": k_norm,
+            "lam_max": x_max.x[0],
+            "max_value": f.D_norm(x_max.x[0],T,k_norm)}
+    if con_cdf:
+        with telemetria.fase("normalizzazione.cdf", T=T):
+            cdf = integrate.cumulative_simpson(f.D_norm(x,T,k_norm), x=x, initial=0)
+        voce["x"] = x
+        voce["cdf"] = cdf/cdf[-1]
+    return voce
+
+
+class CacheNormalizzazione:
+
+    """
+    Cache LRU delle costanti di normalizzazione con chiave (T, estremo_sx, estremo_dx)
+
+    Input:
+    max_voci = numero massimo di voci tenute in memoria, oltre il quale si elimina la meno usata di recente
+    file = file in cui salvare le voci; se esiste viene letto alla creazione, se None non si salva su disco
+    """
+
+    def __init__(self, max_voci=128, file=None):
+        self.max_voci = max_voci
+        self.file = file
+        self.voci = OrderedDict()
+        self.calcoli = 0 #numero di voci effettivamente calcolate
+        if file is not None and os.path.exists(file):
+            self.carica(file)
+
+    def carica(self, file):
+        """
+        Metodo che aggiunge alla cache le voci salvate nel file
+        """
+        with open(file, "rb") as fin:
+            for chiave, voce in pickle.load(fin).items():
+                self._inserisci(chiave, voce)
+
+    def salva(self, file=None):
+        """
+        Metodo che scrive le voci della cache nel file (in modo atomico)
+        """
+        file = self.file if file is None else file
+        temp = "{:}.{:}.tmp".format(file, os.getpid())
+        with open(temp, "wb") as fout:
+            pickle.dump(dict(self.voci), fout)
+        os.replace(temp, file)
+
+    def svuota(self):
+        """
+        Metodo che elimina tutte le voci in memoria
+        """
+        self.voci.clear()
+
+    def _inserisci(self, chiave, voce):
+        self.voci[chiave] = voce
+        self.voci.move_to_end(chiave)
+        while len(self.voci) > self.max_voci:
+            self.voci.popitem(last=False)
+
+    def voce(self, T, estremo_sx, estremo_dx, con_cdf=False):
+        """
+        Metodo che restituisce la voce della cache per la terna (T, estremo_sx, estremo_dx),
+        calcolandola solo se non presente (o se manca la cumulativa richiesta)
+        """
+        chiave = (float(T), float(estremo_sx), float(estremo_dx))
+        voce = self.voci.get(chiave)
+        if voce is None or (con_cdf and "cdf" not in voce):
+            voce = calcola(T, estremo_sx, estremo_dx, con_cdf=con_cdf)
+            self.calcoli += 1
+            self._inserisci(chiave, voce)
+            if self.file is not None:
+                self.salva()
+        else:
+            self.voci.move_to_end(chiave)
+        return voce
+
+
+#Cache condivisa dal modulo starclass
+cache = CacheNormalizzazione(file=os.environ.get("MCF_CACHE_NORM"))
+
+
+def costanti(T, estremo_sx, estremo_dx):
+
+    """
+    Funzione che restituisce, usando la cache condivisa, le costanti della distribuzione di corpo nero
+
+    Output:
+    - costante di normalizzazione k_norm
+    - lunghezza d'onda del massimo di D_norm
+    - valore del massimo di D_norm
+    """
+    voce = cache.voce(T, estremo_sx, estremo_dx)
+    return voce["k_norm"], voce["lam_max"], voce["max_value"]
+
+
+def cdf(T, estremo_sx, estremo_dx):
+
+    """
+    Funzione che restituisce, usando la cache condivisa, la cumulativa di D_norm tabulata
+
+    Output:
+    - griglia di lunghezze d'onda
+    - valori della cumulativa (da 0 a 1) sulla griglia
+    """
+    voce = cache.voce(T, estremo_sx, estremo_dx, con_cdf=True)
+    return voce["x"], voce["cdf"]
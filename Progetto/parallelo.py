@@ -0,0 +1,188 @@
+"""
+Modulo per eseguire le simulazioni di più stelle in parallelo su un pool di processi
+____________________________________________________________________________________
+
+Ogni stella e ogni blocco di fotoni di una stella è un compito indipendente con il proprio
+generatore numpy.random.Generator, costruito da un albero di SeedSequence:
+
+    seme -> stella -> fase (emissione, confronto, flusso) -> blocco
+
+Il risultato dipende quindi solo dal seme e dalla dimensione dei blocchi, non dal numero di
+processi usati né dall'ordine in cui i compiti vengono eseguiti.
+"""
+
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import sys
+
+#Importo modulo con la classe
+sys.path.append(" ")
+import starclass
+
+
+#Numero di fotoni per blocco, fa parte della definizione del risultato
+CHUNK = 10000
+
+
+def blocchi(N, chunk=CHUNK):
+
+    """
+    Funzione che divide N fotoni in blocchi di al più chunk fotoni
+
+    Output:
+    Lista con il numero di fotoni di ogni blocco
+    """
+    return [min(chunk, N-i) for i in range(0, N, chunk)]
+
+
+def _emissione(stella, n, estremo_sx, estremo_dx, seme):
+
+    """
+    Compito: emissione di n fotoni e scattering allo Zenit e all'orizzonte degli stessi fotoni
+    """
+    rng = np.random.default_rng(seme)
+    fotoni, k_norm, eff = stella.no_absorption(n, estremo_sx, estremo_dx, rng=rng)
+    maschere = stella.R_scattering_multi(fotoni, [0, 90], maschere=True, rng=rng)
+    return fotoni, k_norm, eff, maschere
+
+
+def _flusso(stella, n, angles, estremo_sx, estremo_dx, seme):
+
+    """
+    Compito: emissione di n fotoni e conteggio dei fotoni osservati per ogni angolo
+    """
+    rng = np.random.default_rng(seme)
+    fotoni = stella.no_absorption(n, estremo_sx, estremo_dx, rng=rng)[0]
+    return stella.R_scattering_multi(fotoni, angles, rng=rng)
+
+
+def _unisci_emissione(parti):
+
+    """
+    Funzione che concatena, nell'ordine dei blocchi, i risultati dei compiti di emissione
+    """
+    fotoni = np.concatenate([p[0] for p in parti])
+    maschere = np.concatenate([p[3] for p in parti], axis=1)
+    #Efficienza complessiva: fotoni accettati su coppie estratte (circa n/eff per blocco)
+    estratte = sum(len(p[0])/p[2] for p in parti)
+    return fotoni, parti[0][1], len(fotoni)/estratte, fotoni[maschere[0]], fotoni[maschere[1]]
+
+
+def simula(stelle, N, N1, angles, estremo_sx, estremo_dx, workers=1, seed=None, chunk=CHUNK):
+
+    """
+    Funzione che esegue le simulazioni di Simulazione.py per ogni stella, dividendo i fotoni in blocchi
+    e distribuendo stelle e blocchi su un pool di processi
+
+    Input:
+    stelle = lista di oggetti starclass.star
+    N = numero di fotoni per la distribuzione senza assorbimento e per il confronto
+    N1 = numero di fotoni per lo studio del flusso integrato
+    angles = array di angoli per il flusso integrato
+    estremo_sx, estremo_dx = intervallo di lunghezze d'onda in nm
+    workers = numero di processi
+    seed = seme della simulazione; se None viene generato e restituito per poter ripetere la simulazione
+    chunk = numero di fotoni per blocco
+
+    Output:
+    - lista con un dizionario di risultati per ogni stella
+    - entropia della SeedSequence radice (il seme usato)
+    """
+
+    radice = np.random.SeedSequence(seed)
+    angles = np.asarray(angles, dtype=np.float64)
+
+    #Preparo i compiti: per ogni stella tre fasi, per ogni fase un seme per blocco
+    compiti = []
+    for i, (stella, ss_stella) in enumerate(zip(stelle, radice.spawn(len(stelle)))):
+        ss_emissione, ss_confronto, ss_flusso = ss_stella.spawn(3)
+        for fase, ss, n_tot in (("emissione", ss_emissione, N), ("confronto", ss_confronto, N)):
+            for n, seme in zip(blocchi(n_tot, chunk), ss.spawn(len(blocchi(n_tot, chunk)))):
+                compiti.append((i, fase, _emissione, (stella, n, estremo_sx, estremo_dx, seme)))
+        for n, seme in zip(blocchi(N1, chunk), ss_flusso.spawn(len(blocchi(N1, chunk)))):
+            compiti.append((i, "flusso", _flusso, (stella, n, angles, estremo_sx, estremo_dx, seme)))
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futuri = [pool.submit(funz, *argomenti) for _, _, funz, argomenti in compiti]
+            uscite = [fut.result() for fut in futuri]
+    else:
+        uscite = [funz(*argomenti) for _, _, funz, argomenti in compiti]
+
+    #Raccolgo i risultati nell'ordine dei compiti
+    parti = [{"emissione": [], "confronto": [], "flusso": []} for _ in stelle]
+    for (i, fase, _, _), uscita in zip(compiti, uscite):
+        parti[i][fase].append(uscita)
+
+    risultati = []
+    for stella, p in zip(stelle, parti):
+        fotoni, k_norm, eff, zenit, orizzonte = _unisci_emissione(p["emissione"])
+        confronto = _unisci_emissione(p["confronto"])
+        risultati.append({"stella": stella,
+                          "fotoni": fotoni,
+                          "k_norm": k_norm,
+                          "efficienza": eff,
+                          "zenit": zenit,
+                          "orizzonte": orizzonte,
+                          "confronto": (confronto[0], confronto[3], confronto[4]),
+                          "angoli": angles,
+                          "integrali": np.sum(p["flusso"], axis=0)})
+
+    return risultati, radice.entropy
+
+
+def seme_blocco(seme, j):
+
+    """
+    Funzione che restituisce il seme del blocco j-esimo, uguale al j-esimo figlio di seme.spawn(...), senza
+    creare i semi di tutti i blocchi: la memoria non dipende dal numero di blocchi
+    """
+    return np.random.SeedSequence(seme.entropy, spawn_key=seme.spawn_key+(seme.n_children_spawned+j,),
+                                  pool_size=seme.pool_size)
+
+
+def simula_istogrammi(stella, N, angles, estremo_sx, estremo_dx, seme, shard=0, n_shard=1,
+                      n_bins=100, chunk=CHUNK, pesato=False):
+
+    """
+    Funzione che simula una stella con star.pipeline dividendo gli N fotoni in blocchi, ognuno con il
+    proprio generatore ottenuto da seme (creato solo quando il blocco viene simulato) e accumulando tutti i blocchi
+    negli stessi istogrammi. Con n_shard > 1 si simulano solo i blocchi shard, shard+n_shard, ...
+    così che la simulazione possa essere divisa tra più macchine: unendo i risultati di tutti gli shard
+    si ottengono esattamente gli istogrammi della simulazione completa.
+
+    Input:
+    stella = oggetto starclass.star
+    N = numero di fotoni emessi della simulazione completa
+    angles = array di angoli a cui simulare lo scattering
+    estremo_sx, estremo_dx = intervallo di lunghezze d'onda
+    seme = SeedSequence (o intero) della stella
+    shard, n_shard = indice dello shard da simulare e numero totale di shard
+    n_bins = numero di bin degli istogrammi
+    chunk = numero di fotoni per blocco
+    pesato = se True lo scattering è pesato (vedi star.R_scattering_pesato)
+
+    Output:
+    - istogramma dei fotoni emessi
+    - istogramma a righe dei fotoni osservati, una riga per angolo
+    - costante di normalizzazione
+    - numero di fotoni emessi in questo shard
+    """
+
+    if not isinstance(seme, np.random.SeedSequence):
+        seme = np.random.SeedSequence(seme)
+    n_blocchi = -(-N//chunk)
+    if shard >= n_blocchi:
+        raise ValueError("Lo shard {:} di {:} non contiene blocchi di fotoni".format(shard, n_shard))
+
+    ist_emessi = ist_osservati = None
+    n_emessi = 0
+    for j in range(shard, n_blocchi, n_shard):
+        n = min(chunk, N-j*chunk)
+        rng = np.random.default_rng(seme_blocco(seme, j))
+        ist_emessi, ist_osservati, k_norm = stella.pipeline(n, estremo_sx, estremo_dx, angles, n_bins=n_bins, rng=rng,
+                                                            pesato=pesato, ist_emessi=ist_emessi,
+                                                            ist_osservati=ist_osservati)
+        n_emessi += n
+
+    return ist_emessi, ist_osservati, k_norm, n_emessi
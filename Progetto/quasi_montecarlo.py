@@ -0,0 +1,172 @@
+"""
+Modulo per simulare emissione e scattering con sequenze quasi-casuali (Quasi Monte Carlo)
+_________________________________________________________________________________________
+
+Al posto dei numeri pseudo-casuali si usano i punti di una sequenza di Sobol con scrambling di Owen
+(scipy.stats.qmc.Sobol). Ogni fotone è un punto di dimensione 1+A:
+- la prima coordinata genera la lunghezza d'onda invertendo la cumulativa tabulata di D_norm
+- la coordinata 1+j decide se il fotone è osservato all'angolo j-esimo
+
+Per avere un errore si ripete la simulazione con più scrambling indipendenti (repliche): la dispersione
+dei risultati tra le repliche stima l'errore statistico.
+"""
+
+import numpy as np
+import warnings
+import sys
+
+#Importo moduli con funzioni
+sys.path.append(" ")
+import func as f
+import normalizzazione
+import istogrammi
+
+
+#Punti di Sobol generati per blocco (potenza di 2, così i blocchi mantengono le proprietà della sequenza)
+CHUNK = 2**13
+
+
+def _sobol(d, seme):
+
+    """
+    Funzione che crea un generatore di Sobol di dimensione d con scrambling di Owen
+    """
+    from scipy.stats import qmc
+    return qmc.Sobol(d, scramble=True, seed=np.random.default_rng(seme))
+
+
+def _punti(sobol, n):
+
+    """
+    Funzione che restituisce i prossimi n punti della sequenza, anche se n non è una potenza di 2
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        return sobol.random(n)
+
+
+def pipeline(stella, N, estremo_sx, estremo_dx, angles, n_bins=100, seme=None, repliche=1):
+
+    """
+    Funzione analoga a star.pipeline ma con punti di Sobol al posto dei numeri pseudo-casuali
+
+    Input:
+    stella = oggetto starclass.star
+    N = numero totale di fotoni emessi (diviso tra le repliche)
+    estremo_sx, estremo_dx = intervallo di lunghezze d'onda
+    angles = array di angoli a cui simulare lo scattering
+    n_bins = numero di bin degli istogrammi
+    seme = seme (intero o SeedSequence) da cui ottenere gli scrambling delle repliche
+    repliche = numero di scrambling indipendenti
+
+    Output:
+    - istogramma dei fotoni emessi (somma delle repliche)
+    - istogramma a righe dei fotoni osservati (somma delle repliche)
+    - costante di normalizzazione
+    - errore sul numero totale di fotoni osservati per ogni angolo, stimato dalla dispersione delle repliche
+      (None se repliche=1)
+    """
+
+    if not isinstance(seme, np.random.SeedSequence):
+        seme = np.random.SeedSequence(seme)
+    angles = np.atleast_1d(np.asarray(angles, dtype=np.float64))
+    x, cdf = normalizzazione.cdf(stella.T, estremo_sx, estremo_dx)
+    k_norm = normalizzazione.costanti(stella.T, estremo_sx, estremo_dx)[0]
+
+    ist_emessi = istogrammi.Istogramma(estremo_sx, estremo_dx, n_bins)
+    ist_osservati = istogrammi.Istogramma(estremo_sx, estremo_dx, n_bins, righe=len(angles))
+    totali = np.zeros((repliche, len(angles)))
+    dimensioni = [N//repliche + (1 if r < N % repliche else 0) for r in range(repliche)]
+
+    for r, seme_r in enumerate(seme.spawn(repliche)):
+        sobol = _sobol(1+len(angles), seme_r)
+        for inizio in range(0, dimensioni[r], CHUNK):
+            u = _punti(sobol, min(CHUNK, dimensioni[r]-inizio))
+            fotoni = np.interp(u[:,0], cdf, x)
+            maschere = u[:,1:].T < f.prob_obs(fotoni[np.newaxis,:], angles[:,np.newaxis])
+            ist_emessi.aggiungi(fotoni)
+            ist_osservati.aggiungi(fotoni, maschere)
+            totali[r] += np.count_nonzero(maschere, axis=1)
+
+    #Totale = somma delle repliche, quindi varianza = repliche * varianza di una replica
+    errori = np.sqrt(repliche*totali.var(axis=0, ddof=1)) if repliche > 1 else None
+    return ist_emessi, ist_osservati, k_norm, errori
+
+
+def valori_esatti(T, estremo_sx, estremo_dx, angle):
+
+    """
+    Funzione che calcola i valori esatti, per la distribuzione campionata con la cumulativa tabulata,
+    della lunghezza d'onda media dei fotoni emessi e della frazione di fotoni osservati all'angolo angle
+    """
+    x, cdf = normalizzazione.cdf(T, estremo_sx, estremo_dx)
+    massa = np.diff(cdf)
+    medi = (x[:-1]+x[1:])/2
+    #Media della probabilità di osservazione in ogni cella della griglia (Simpson)
+    p_cella = (f.prob_obs(x[:-1],angle)+4*f.prob_obs(medi,angle)+f.prob_obs(x[1:],angle))/6
+    return np.sum(massa*medi), np.sum(massa*p_cella)
+
+
+def _stime(u_lam, u_scat, x, cdf, angle):
+
+    """
+    Funzione che, dati i numeri uniformi per lunghezza d'onda e scattering, stima lunghezza d'onda media
+    e frazione di fotoni osservati
+    """
+    fotoni = np.interp(u_lam, cdf, x)
+    return fotoni.mean(), np.mean(u_scat < f.prob_obs(fotoni, angle))
+
+
+def convergenza(stelle, lista_N, estremo_sx, estremo_dx, angle=90, repliche=16, seed=None):
+
+    """
+    Funzione che confronta la convergenza di Monte Carlo (MC) e Quasi Monte Carlo (QMC): per ogni stella
+    e ogni N si ripete la stima di lunghezza d'onda media e frazione di fotoni osservati all'angolo angle
+    e si calcola lo scarto quadratico medio rispetto ai valori esatti
+
+    Input:
+    stelle = lista di oggetti starclass.star
+    lista_N = numeri di fotoni da provare (meglio se potenze di 2)
+    estremo_sx, estremo_dx = intervallo di lunghezze d'onda
+    angle = angolo rispetto allo Zenit per la frazione di fotoni osservati
+    repliche = numero di ripetizioni (generatori o scrambling indipendenti) per ogni N
+    seed = seme
+
+    Output:
+    Lista di dizionari con stella, N, metodo ("MC" o "QMC") ed errori relativi su media e frazione
+    """
+
+    semi = np.random.SeedSequence(seed).spawn(len(stelle))
+    report = []
+    for stella, seme_stella in zip(stelle, semi):
+        x, cdf = normalizzazione.cdf(stella.T, estremo_sx, estremo_dx)
+        media_esatta, frazione_esatta = valori_esatti(stella.T, estremo_sx, estremo_dx, angle)
+        for N, seme_N in zip(lista_N, seme_stella.spawn(len(lista_N))):
+            seme_mc, seme_qmc = seme_N.spawn(2)
+            for metodo, semi_rep in (("MC", seme_mc.spawn(repliche)), ("QMC", seme_qmc.spawn(repliche))):
+                stime = []
+                for seme_r in semi_rep:
+                    if metodo == "MC":
+                        rng = np.random.default_rng(seme_r)
+                        u = rng.uniform(size=(N, 2))
+                    else:
+                        u = _punti(_sobol(2, seme_r), N)
+                    stime.append(_stime(u[:,0], u[:,1], x, cdf, angle))
+                stime = np.array(stime)
+                report.append({"stella": stella.name,
+                               "N": int(N),
+                               "metodo": metodo,
+                               "errore_media": float(np.sqrt(np.mean((stime[:,0]-media_esatta)**2))/media_esatta),
+                               "errore_frazione": float(np.sqrt(np.mean((stime[:,1]-frazione_esatta)**2))/frazione_esatta)})
+    return report
+
+
+def stampa_convergenza(report):
+
+    """
+    Funzione che stampa il report di convergenza come tabella
+    """
+    print("{:<12} {:>10} {:>5} {:>18} {:>18}".format("Stella", "N", "", "err. rel. media", "err. rel. frazione"))
+    for riga in report:
+        print("{:<12} {:>10} {:>5} {:>18.3e} {:>18.3e}".format(riga["stella"], riga["N"], riga["metodo"],
+                                                            riga["errore_media"], riga["errore_frazione"]))
@@ -0,0 +1,264 @@
+"""
+Modulo per salvare su disco i risultati delle simulazioni e disegnarne i grafici in un secondo momento
+_____________________________________________________________________________________________________
+
+Per ogni stella vengono scritti:
+- un file .npz con gli array dei fotoni (emessi, osservati allo Zenit e all'orizzonte, confronto) e il flusso integrato
+- un file .json con i parametri della simulazione e le grandezze scalari
+
+I grafici possono poi essere disegnati con il backend Agg (senza display) da un pool di processi.
+"""
+
+import numpy as np
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import sys
+
+#Importo modulo con la classe
+sys.path.append(" ")
+import starclass
+import istogrammi
+
+
+def _nome_file(stella):
+
+    """
+    Funzione che restituisce il nome base dei file di una stella (es. "Alfa Crucis" -> "alfa_crucis")
+    """
+    return stella.name.lower().replace(" ", "_")
+
+
+def salva(risultati, seme, cartella, parametri):
+
+    """
+    Funzione che salva su disco i risultati restituiti da parallelo.simula
+
+    Input:
+    risultati = lista di dizionari, uno per stella
+    seme = seme usato per la simulazione
+    cartella = cartella in cui scrivere i file (viene creata se non esiste)
+    parametri = dizionario con i parametri della simulazione (N, N1, estremi, ...)
+
+    Output:
+    Lista dei percorsi dei file .json scritti
+    """
+
+    os.makedirs(cartella, exist_ok=True)
+    scritti = []
+    for ris in risultati:
+        stella = ris["stella"]
+        base = os.path.join(cartella, _nome_file(stella))
+        np.savez(base+".npz",
+                 fotoni=ris["fotoni"],
+                 zenit=ris["zenit"],
+                 orizzonte=ris["orizzonte"],
+                 confronto_emessi=ris["confronto"][0],
+                 confronto_zenit=ris["confronto"][1],
+                 confronto_orizzonte=ris["confronto"][2],
+                 angoli=ris["angoli"],
+                 integrali=ris["integrali"])
+        riepilogo = {"stella": stella.name,
+                     "T": stella.T,
+                     "seme": seme,
+                     "k_norm": ris["k_norm"],
+                     "efficienza": ris["efficienza"],
+                     "n_zenit": len(ris["zenit"]),
+                     "n_orizzonte": len(ris["orizzonte"]),
+                     "dati": os.path.basename(base+".npz")}
+        riepilogo.update(parametri)
+        with open(base+".json", "w") as file:
+            json.dump(riepilogo, file, indent=2)
+        scritti.append(base+".json")
+
+    return scritti
+
+
+def disegna(percorso_json):
+
+    """
+    Funzione che disegna, con il backend Agg, i grafici di una stella a partire dai file salvati da salva.
+    Le figure sono scritte come .png accanto al file .json
+    """
+
+    import matplotlib
+    matplotlib.use("Agg")
+
+    with open(percorso_json) as file:
+        riepilogo = json.load(file)
+    cartella = os.path.dirname(percorso_json)
+    dati = np.load(os.path.join(cartella, riepilogo["dati"]))
+    stella = starclass.star(riepilogo["stella"], riepilogo["T"])
+    base = os.path.join(cartella, _nome_file(stella))
+
+    stella.no_abs_graph(dati["fotoni"], riepilogo["k_norm"], salva=base+"_emissione.png")
+    stella.R_scattering_graph(dati["fotoni"], dati["zenit"], 0, riepilogo["k_norm"], salva=base+"_zenit.png")
+    stella.R_scattering_graph(dati["fotoni"], dati["orizzonte"], 90, riepilogo["k_norm"], salva=base+"_orizzonte.png")
+    stella.compare_graph(dati["confronto_emessi"], dati["confronto_zenit"], dati["confronto_orizzonte"],
+                         salva=base+"_confronto.png")
+    stella.flusso_graph(dati["angoli"], dati["integrali"], salva=base+"_flusso.png")
+
+
+def disegna_tutti(percorsi_json, workers=1):
+
+    """
+    Funzione che disegna i grafici di più stelle distribuendole su un pool di processi
+    """
+
+    with ProcessPoolExecutor(max_workers=max(workers, 1)) as pool:
+        list(pool.map(disegna, percorsi_json))
+
+
+"""
+Formato compatto e unibile dei risultati a istogrammi
+_____________________________________________________
+
+Un file .npz contiene gli istogrammi dei fotoni emessi e di quelli osservati per ogni angolo,
+i bordi dei bin, gli angoli e, nella voce "meta" (stringa JSON), versione del formato, stella,
+temperatura, numero di fotoni, semi e intervallo di lunghezze d'onda. Se lo scattering è pesato
+i conteggi osservati sono somme di pesi e c'è anche la voce "osservati_pesi2" (somme dei pesi al quadrato).
+Per le simulazioni Quasi Monte Carlo la voce "errori_totali" contiene l'errore, stimato dalle repliche,
+sul numero totale di fotoni osservati per ogni angolo. Risultati della stessa stella
+con gli stessi bordi e angoli si uniscono sommando i conteggi.
+"""
+
+VERSIONE = 1
+
+
+def crea_istogrammi(stella, ist_emessi, ist_osservati, angoli, k_norm, N, seme, shard=(0, 1), errori_totali=None, chunk=None):
+
+    """
+    Funzione che costruisce il dizionario dei risultati a istogrammi di una stella
+
+    Input:
+    stella = oggetto starclass.star
+    ist_emessi, ist_osservati = istogrammi restituiti da star.pipeline (o parallelo.simula_istogrammi)
+    angoli = angoli delle righe di ist_osservati
+    k_norm = costante di normalizzazione
+    N = numero di fotoni emessi
+    seme = seme della simulazione
+    shard = coppia (indice dello shard, numero di shard)
+    errori_totali = errori sul numero totale di fotoni osservati per angolo (solo Quasi Monte Carlo)
+    chunk = numero di fotoni per blocco (parallelo.CHUNK), che insieme al seme definisce il risultato
+    """
+    return {"versione": VERSIONE,
+            "stella": stella.name,
+            "T": float(stella.T),
+            "N": int(N),
+            "semi": [[seme, shard[0], shard[1]]],
+            "chunk": None if chunk is None else int(chunk),
+            "estremo_sx": float(ist_emessi.bordi[0]),
+            "estremo_dx": float(ist_emessi.bordi[-1]),
+            "k_norm": float(k_norm),
+            "bordi": ist_emessi.bordi,
+            "angoli": np.asarray(angoli, dtype=np.float64),
+            "pesato": ist_osservati.pesato,
+            "errori_totali": None if errori_totali is None else [float(e) for e in errori_totali],
+            "emessi": ist_emessi.conteggi,
+            "osservati": ist_osservati.conteggi,
+            "osservati_pesi2": ist_osservati.pesi2}
+
+
+def salva_istogrammi(ris, file):
+
+    """
+    Funzione che scrive su file .npz un risultato a istogrammi
+    """
+    array = ("bordi", "angoli", "emessi", "osservati", "osservati_pesi2")
+    meta = {chiave: valore for chiave, valore in ris.items() if chiave not in array}
+    dati = {chiave: ris[chiave] for chiave in array if ris.get(chiave) is not None}
+    np.savez(file, meta=json.dumps(meta), **dati)
+
+
+def carica_istogrammi(file):
+
+    """
+    Funzione che legge un risultato a istogrammi scritto da salva_istogrammi
+    """
+    with np.load(file) as dati:
+        ris = json.loads(str(dati["meta"]))
+        if ris.get("versione") != VERSIONE:
+            raise ValueError("{:}: versione del formato {:} non supportata".format(file, ris.get("versione")))
+        for chiave in ("bordi", "angoli", "emessi", "osservati"):
+            ris[chiave] = dati[chiave]
+        ris["pesato"] = ris.get("pesato", False)
+        ris["osservati_pesi2"] = dati["osservati_pesi2"] if ris["pesato"] else None
+    return ris
+
+
+def unisci_istogrammi(lista):
+
+    """
+    Funzione che unisce più risultati a istogrammi della stessa stella sommandone i conteggi.
+    I risultati devono avere stessa stella, temperatura, bordi dei bin, angoli e fotoni per blocco; i risultati
+    con lo stesso seme devono essere shard diversi della stessa divisione (stesso numero di shard), altrimenti
+    conterrebbero gli stessi blocchi di fotoni.
+
+    Output:
+    Dizionario con il risultato unito
+    """
+    unito = dict(lista[0])
+    unito["semi"] = list(lista[0]["semi"])
+    unito["emessi"] = lista[0]["emessi"].copy()
+    unito["osservati"] = lista[0]["osservati"].copy()
+    if unito["pesato"]:
+        unito["osservati_pesi2"] = lista[0]["osservati_pesi2"].copy()
+    for ris in lista[1:]:
+        for chiave in ("versione", "stella", "T", "pesato", "chunk"):
+            if ris.get(chiave) != unito.get(chiave):
+                raise ValueError("Risultati non unibili: {:} diverso ({:} e {:})".format(chiave, unito[chiave], ris[chiave]))
+        for chiave in ("bordi", "angoli"):
+            if not np.array_equal(ris[chiave], unito[chiave]):
+                raise ValueError("Risultati non unibili: {:} diversi".format(chiave))
+        semi = [tuple(s) for s in unito["semi"]]
+        for s in ris["semi"]:
+            if tuple(s) in semi:
+                raise ValueError("Risultati non unibili: lo shard {:} compare più volte".format(s))
+            for altro in semi:
+                if altro[0] == s[0] and altro[2] != s[2]:
+                    raise ValueError("Risultati non unibili: gli shard {:} e {:} hanno lo stesso seme ma divisioni "
+                                     "diverse e contengono gli stessi fotoni".format(list(altro), s))
+        unito["semi"] += ris["semi"]
+        unito["N"] += ris["N"]
+        if unito.get("errori_totali") is not None and ris.get("errori_totali") is not None:
+            unito["errori_totali"] = list(np.hypot(unito["errori_totali"], ris["errori_totali"]))
+        else:
+            unito["errori_totali"] = None
+        unito["emessi"] += ris["emessi"]
+        unito["osservati"] += ris["osservati"]
+        if unito["pesato"]:
+            unito["osservati_pesi2"] += ris["osservati_pesi2"]
+    return unito
+
+
+def disegna_istogrammi(ris, cartella=None):
+
+    """
+    Funzione che rappresenta un risultato a istogrammi: distribuzione emessa, osservata allo Zenit e
+    all'orizzonte, confronto e flusso integrato. Zenit e orizzonte sono le righe con angolo 0 e 90,
+    il flusso integrato è disegnato per gli altri angoli.
+    Se cartella non è None i grafici sono salvati come .png nella cartella invece di essere mostrati
+    """
+    stella = starclass.star(ris["stella"], ris["T"])
+    N = ris["N"]
+    k_norm = ris["k_norm"]
+    bordi = ris["bordi"]
+    angoli = ris["angoli"]
+    emessi = istogrammi.da_conteggi(bordi, ris["emessi"])
+    osservati = istogrammi.da_conteggi(bordi, ris["osservati"], ris.get("osservati_pesi2"))
+    i_zenit = int(np.flatnonzero(angoli == 0)[0])
+    i_orizzonte = int(np.flatnonzero(angoli == 90)[0])
+    flusso = np.ones(len(angoli), dtype=bool)
+    flusso[[i_zenit, i_orizzonte]] = False
+
+    salva = lambda nome: None if cartella is None else os.path.join(cartella, "{:}_{:}.png".format(_nome_file(stella), nome))
+    stella.no_abs_graph_ist(emessi, k_norm, N, salva=salva("emissione"))
+    stella.R_scattering_graph_ist(osservati.riga(i_zenit), 0, k_norm, N, salva=salva("zenit"))
+    stella.R_scattering_graph_ist(osservati.riga(i_orizzonte), 90, k_norm, N, salva=salva("orizzonte"))
+    stella.compare_graph_ist(emessi, osservati.riga(i_zenit), osservati.riga(i_orizzonte), salva=salva("confronto"))
+    errori = None
+    if osservati.pesato:
+        errori = np.sqrt(osservati.pesi2[flusso].sum(axis=1))
+    elif ris.get("errori_totali") is not None:
+        errori = np.asarray(ris["errori_totali"])[flusso]
+    stella.flusso_graph(angoli[flusso], osservati.conteggi[flusso].sum(axis=1), salva=salva("flusso"), errori=errori)
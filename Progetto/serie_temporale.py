@@ -0,0 +1,166 @@
+"""
+Modulo per simulare il flusso osservato di una stella lungo la sua traiettoria nel cielo durante una notte
+__________________________________________________________________________________________________________
+
+Invece di ripetere emissione e scattering per ogni angolo (come flusso_integrato), si emette un solo insieme
+di N fotoni e per ogni fotone si estrae una sola uniforme u. Poiché p_obs = exp(-beta(lam)*S(angle)), il
+fotone è osservato all'angolo angle se u < p_obs, ossia se lo spessore d'aria S(angle) è minore del suo
+spessore critico S* = -ln(u)/beta(lam). Ordinati i fotoni per S*, i fotoni osservati ad ogni istante sono
+quelli con S* > S(angle) (una ricerca binaria) e lo spettro osservato si aggiorna sommando o togliendo solo
+i fotoni il cui S* è tra lo spessore dell'istante precedente e quello attuale.
+
+Il costo di ogni istante dipende quindi dai fotoni che cambiano stato e non da N; ad ogni istante il numero
+di fotoni osservati ha la stessa distribuzione (binomiale) di una simulazione indipendente, ma istanti
+vicini sono correlati perché i fotoni sono gli stessi.
+
+Gli angoli oltre 90 gradi (stella sotto l'orizzonte) hanno zero fotoni osservati.
+"""
+
+import numpy as np
+import os
+import sys
+
+#Importo moduli con funzioni
+sys.path.append(" ")
+import istogrammi
+import normalizzazione
+import trasmissione
+
+
+def traiettoria(latitudine, declinazione, ore=12, passi=1000):
+
+    """
+    Funzione che calcola l'angolo rispetto allo Zenit di una stella durante la notte
+
+    Input:
+    latitudine = latitudine dell'osservatore (gradi)
+    declinazione = declinazione della stella (gradi)
+    ore = durata dell'osservazione, centrata sul passaggio al meridiano (ore)
+    passi = numero di istanti
+
+    Output:
+    - tempi (ore rispetto al passaggio al meridiano)
+    - angoli rispetto allo Zenit (gradi)
+    """
+    tempi = np.linspace(-ore/2, ore/2, passi)
+    H = np.radians(15*tempi) #angolo orario
+    phi, delta = np.radians(latitudine), np.radians(declinazione)
+    coseno = np.sin(phi)*np.sin(delta)+np.cos(phi)*np.cos(delta)*np.cos(H)
+    return tempi, np.degrees(np.arccos(np.clip(coseno, -1, 1)))
+
+
+def leggi_traiettoria(file):
+
+    """
+    Funzione che legge la traiettoria da un file .csv con due colonne: tempo e angolo rispetto allo Zenit (gradi)
+    (ValueError se il file ha meno di due colonne, valori non numerici o tempi non crescenti)
+    """
+    import pandas as pd
+    dati = pd.read_csv(file)
+    if dati.shape[1] < 2 or len(dati) == 0:
+        raise ValueError("{:}: servono almeno una riga e due colonne (tempo e angolo)".format(file))
+    try:
+        tempi = dati.iloc[:,0].to_numpy(dtype=np.float64)
+        angoli = dati.iloc[:,1].to_numpy(dtype=np.float64)
+    except ValueError:
+        raise ValueError("{:}: tempi e angoli devono essere numeri".format(file)) from None
+    if not (np.all(np.isfinite(tempi)) and np.all(np.isfinite(angoli))):
+        raise ValueError("{:}: tempi e angoli devono essere numeri finiti".format(file))
+    if np.any(np.diff(tempi) <= 0):
+        raise ValueError("{:}: i tempi devono essere strettamente crescenti".format(file))
+    return tempi, angoli
+
+
+class SerieTemporale:
+
+    """
+    Fotoni emessi da una stella, ordinati per spessore critico, per calcolare il flusso osservato istante per istante
+
+    Input:
+    stella = oggetto starclass.star
+    N = numero di fotoni emessi
+    estremo_sx, estremo_dx = intervallo di lunghezze d'onda, usato anche come estremi degli spettri
+    n_bins = numero di bin degli spettri
+    rng = numpy.random.Generator (o seme); se None un generatore con seme casuale
+    chunk = fotoni emessi per blocco
+    """
+
+    def __init__(self, stella, N, estremo_sx=380, estremo_dx=790, n_bins=100, rng=None, chunk=10**6):
+        rng = np.random.default_rng(rng)
+        self.stella = stella
+        self.N = N
+        self.ist = istogrammi.Istogramma(estremo_sx, estremo_dx, n_bins)
+        self.k_norm = normalizzazione.costanti(stella.T, estremo_sx, estremo_dx)[0]
+
+        critici = np.empty(N, dtype=np.float64)
+        bins = np.empty(N, dtype=np.int32)
+        for inizio, fotoni in zip(range(0, N, chunk), stella.emissione(N, estremo_sx, estremo_dx, chunk=chunk, rng=rng)):
+            beta = trasmissione.C_BETA/(fotoni*1e-9)**4
+            #1-u è in (0, 1], così che il logaritmo sia finito
+            critici[inizio:inizio+len(fotoni)] = -np.log1p(-rng.uniform(size=len(fotoni)))/beta
+            bins[inizio:inizio+len(fotoni)] = np.clip(self.ist.indici(fotoni), 0, n_bins-1)
+            self.ist.aggiungi(fotoni)
+
+        ordine = np.argsort(critici)
+        self.critici = critici[ordine]
+        self.bins = bins[ordine]
+        #Fotoni osservati allo spessore corrente: quelli dalla posizione in poi
+        self.posizione = N
+        self.spettro = np.zeros(n_bins, dtype=np.int64)
+
+    def passo(self, angolo):
+        """
+        Metodo che porta la stella all'angolo dato aggiornando lo spettro osservato
+
+        Output:
+        - numero di fotoni osservati
+        - spettro osservato (array dei conteggi per bin, da non modificare)
+        """
+        if not angolo <= 90:
+            return 0, np.zeros_like(self.spettro)
+        S = trasmissione.spessore(np.cos(np.radians(angolo)))
+        nuova = np.searchsorted(self.critici, S, side="right")
+        if nuova < self.posizione:
+            self.spettro += np.bincount(self.bins[nuova:self.posizione], minlength=self.ist.n_bins)
+        elif nuova > self.posizione:
+            self.spettro -= np.bincount(self.bins[self.posizione:nuova], minlength=self.ist.n_bins)
+        self.posizione = nuova
+        return self.N-nuova, self.spettro
+
+    def osservati(self, angoli):
+        """
+        Metodo che restituisce solo i numeri di fotoni osservati per un array di angoli (senza spettri)
+        """
+        angoli = np.asarray(angoli, dtype=np.float64)
+        S = trasmissione.spessore(np.cos(np.radians(np.minimum(angoli, 90))))
+        return np.where(angoli <= 90, self.N-np.searchsorted(self.critici, S, side="right"), 0)
+
+    def esegui(self, tempi, angoli, file=None):
+        """
+        Metodo che percorre la traiettoria (tempi, angoli) e, se file non è None, scrive istante per istante
+        - FILE.csv: tempo, angolo, fotoni osservati, frazione osservata
+        - FILE_spettri.npy: matrice (istanti x bin) degli spettri osservati
+        I file sono scritti con nomi temporanei e rinominati alla fine
+
+        Output:
+        Array dei fotoni osservati ad ogni istante
+        """
+        conteggi = np.zeros(len(tempi), dtype=np.int64)
+        if file is None:
+            for i, angolo in enumerate(angoli):
+                conteggi[i] = self.passo(angolo)[0]
+            return conteggi
+
+        temp_csv = "{:}.{:}.tmp.csv".format(file, os.getpid())
+        temp_npy = "{:}_spettri.{:}.tmp.npy".format(file, os.getpid())
+        spettri = np.lib.format.open_memmap(temp_npy, mode="w+", dtype=np.int64, shape=(len(tempi), self.ist.n_bins))
+        with open(temp_csv, "w") as fout:
+            fout.write("tempo,angolo,osservati,frazione\n")
+            for i, (tempo, angolo) in enumerate(zip(tempi, angoli)):
+                conteggi[i], spettri[i] = self.passo(angolo)
+                fout.write("{:.10g},{:.10g},{:},{:.8g}\n".format(tempo, angolo, conteggi[i], conteggi[i]/self.N))
+        spettri.flush()
+        del spettri
+        os.replace(temp_csv, file+".csv")
+        os.replace(temp_npy, file+"_spettri.npy")
+        return conteggi
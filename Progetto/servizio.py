@@ -0,0 +1,316 @@
+"""
+Modulo con il servizio locale di simulazione (HTTP/JSON su asyncio)
+___________________________________________________________________
+
+Il servizio resta in esecuzione e risponde a richieste di simulazione senza pagare ad ogni chiamata
+l'avvio dell'interprete, l'import di numpy/scipy e il calcolo delle costanti di normalizzazione:
+- i processi del pool calcolano all'avvio le cumulative delle stelle di Simulazione.py e tengono
+  in memoria (cache di normalizzazione.py) quelle delle altre temperature richieste
+- il processo principale tiene in memoria la tabella della trasmissione (trasmissione.py)
+- le richieste per la stessa stella (stessa temperatura e intervallo) che arrivano entro una finestra
+  di pochi millisecondi sono unite in un solo lotto, simulato con una sola chiamata nel pool
+
+Percorsi:
+- POST /simula: una richiesta (o una lista di richieste) {"stella" o "T", "N", "angoli", "seed",
+  "estremo_sx", "estremo_dx", "n_bins"}; la risposta contiene i fotoni osservati per ogni angolo e,
+  se n_bins è indicato, gli istogrammi dei fotoni emessi e osservati
+- POST /trasmissione: {"lam", "angoli"} -> matrice (angoli x lam) della probabilità di osservazione
+- GET /stato: numero di richieste, lotti e fotoni simulati
+
+Il risultato di una richiesta dipende solo dai suoi parametri e dal seme (restituito nella risposta se
+non indicato), non dalle altre richieste unite nello stesso lotto: ogni richiesta usa il proprio generatore,
+i fotoni sono emessi invertendo la cumulativa tabulata (come campionatori.inverse_cdf) e per lo
+scattering le uniformi sono estratte fotone per fotone.
+"""
+
+import numpy as np
+import asyncio
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+#Importo moduli con funzioni
+sys.path.append(" ")
+import func as f
+import normalizzazione
+import istogrammi
+import trasmissione
+
+
+#Stelle di Simulazione.py, richiedibili per nome
+STELLE = {"Sole": 5.75*10**3, "Betelgeuse": 3*10**3, "Bellatrix": 22*10**3, "Alfa Crucis": 28*10**3}
+
+#Limiti di una singola richiesta
+N_MAX = 10**7
+ANGOLI_MAX = 1000
+BINS_MAX = 10000
+
+#Finestra (s) in cui le richieste per la stessa stella sono unite e fotoni oltre i quali il lotto parte subito
+FINESTRA = 0.005
+FOTONI_LOTTO = 4*10**6
+
+
+def valida(dati):
+
+    """
+    Funzione che controlla i parametri di una richiesta di simulazione e completa quelli mancanti
+
+    Output:
+    Dizionario con nome, T, N, angoli, seed, estremo_sx, estremo_dx, n_bins
+    (ValueError se i parametri non sono validi)
+    """
+    if not isinstance(dati, dict):
+        raise ValueError("La richiesta deve essere un oggetto JSON")
+    if "T" in dati:
+        T = float(dati["T"])
+        nome = str(dati.get("stella", "T{:g}".format(T)))
+    elif dati.get("stella") in STELLE:
+        nome = dati["stella"]
+        T = STELLE[nome]
+    else:
+        raise ValueError("Indicare T oppure una stella tra: {:}".format(", ".join(STELLE)))
+    N = int(dati.get("N", 50000))
+    angoli = [float(a) for a in np.atleast_1d(dati.get("angoli", [0]))]
+    sx = float(dati.get("estremo_sx", 380))
+    dx = float(dati.get("estremo_dx", 790))
+    n_bins = dati.get("n_bins")
+    seed = dati.get("seed")
+    if not (T > 0 and np.isfinite(T)):
+        raise ValueError("La temperatura deve essere positiva")
+    if not 0 < N <= N_MAX:
+        raise ValueError("N deve essere compreso tra 1 e {:}".format(N_MAX))
+    if not 0 < len(angoli) <= ANGOLI_MAX or not all(0 <= a <= 90 for a in angoli):
+        raise ValueError("Indicare da 1 a {:} angoli tra 0 e 90 gradi".format(ANGOLI_MAX))
+    if not 0 < sx < dx:
+        raise ValueError("L'intervallo di lunghezze d'onda deve avere 0 < estremo_sx < estremo_dx")
+    if n_bins is not None and not 0 < int(n_bins) <= BINS_MAX:
+        raise ValueError("n_bins deve essere compreso tra 1 e {:}".format(BINS_MAX))
+    if seed is not None and (isinstance(seed, bool) or not isinstance(seed, (int, float))
+                             or not float(seed).is_integer() or seed < 0):
+        raise ValueError("seed deve essere un intero non negativo")
+    #Senza seme se ne sceglie uno, restituito nella risposta per poter ripetere la simulazione
+    seed = int(np.random.SeedSequence().entropy % 2**63) if seed is None else int(seed)
+    return {"nome": nome, "T": T, "N": N, "angoli": angoli, "seed": seed,
+            "estremo_sx": sx, "estremo_dx": dx, "n_bins": None if n_bins is None else int(n_bins)}
+
+
+def _riscalda(temperature, estremo_sx, estremo_dx):
+
+    #Inizializzazione dei processi del pool: cumulative delle stelle più richieste già in cache
+    for T in temperature:
+        normalizzazione.cdf(T, estremo_sx, estremo_dx)
+
+
+def simula_lotto(T, estremo_sx, estremo_dx, richieste, chunk_size=2**22):
+
+    """
+    Funzione che simula insieme le richieste (già validate) per la stessa stella e lo stesso intervallo.
+    Le uniformi dell'emissione di tutte le richieste sono invertite con una sola interpolazione della
+    cumulativa e la probabilità di osservazione è calcolata una volta per l'unione degli angoli richiesti,
+    a blocchi di fotoni in modo che ogni blocco abbia al più chunk_size elementi
+
+    Output:
+    Lista delle risposte, nell'ordine delle richieste; al posto della risposta c'è l'eccezione per le
+    richieste il cui generatore non può essere creato, così che non facciano fallire le altre del lotto
+    """
+    risposte = [None]*len(richieste)
+    generatori, valide = [], []
+    for i, r in enumerate(richieste):
+        try:
+            generatori.append(np.random.default_rng(r["seed"]))
+            valide.append(i)
+        except (ValueError, TypeError) as errore:
+            risposte[i] = ValueError("seed {:}: {:}".format(r["seed"], errore))
+    if not valide:
+        return risposte
+    richieste = [richieste[i] for i in valide]
+
+    x, cdf = normalizzazione.cdf(T, estremo_sx, estremo_dx)
+    k_norm = normalizzazione.costanti(T, estremo_sx, estremo_dx)[0]
+
+    fotoni = np.interp(np.concatenate([g.uniform(size=r["N"]) for g, r in zip(generatori, richieste)]), cdf, x)
+    inizi = np.cumsum([0]+[r["N"] for r in richieste])
+    angoli = np.unique(np.concatenate([r["angoli"] for r in richieste]))
+    righe = [np.searchsorted(angoli, r["angoli"]) for r in richieste]
+
+    osservati = [np.zeros(len(r["angoli"]), dtype=np.int64) for r in richieste]
+    spettri = [None if r["n_bins"] is None else
+               (istogrammi.Istogramma(estremo_sx, estremo_dx, r["n_bins"]),
+                istogrammi.Istogramma(estremo_sx, estremo_dx, r["n_bins"], righe=len(r["angoli"])))
+               for r in richieste]
+
+    passo = max(1, chunk_size//len(angoli))
+    for inizio in range(0, len(fotoni), passo):
+        fine = min(inizio+passo, len(fotoni))
+        prob = f.prob_obs(fotoni[np.newaxis,inizio:fine], angoli[:,np.newaxis])
+        for i, r in enumerate(richieste):
+            a, b = max(inizio, inizi[i]), min(fine, inizi[i+1])
+            if a >= b:
+                continue
+            #Uniformi estratte fotone per fotone: il risultato non dipende dalla divisione in blocchi
+            u = generatori[i].uniform(size=(b-a, len(r["angoli"]))).T
+            maschere = u < prob[righe[i], a-inizio:b-inizio]
+            osservati[i] += np.count_nonzero(maschere, axis=1)
+            if spettri[i] is not None:
+                spettri[i][0].aggiungi(fotoni[a:b])
+                spettri[i][1].aggiungi(fotoni[a:b], maschere)
+
+    for i, r, oss, spettro in zip(valide, richieste, osservati, spettri):
+        risposta = dict(r, k_norm=k_norm, osservati=oss.tolist(), frazioni=(oss/r["N"]).tolist())
+        if spettro is not None:
+            risposta["bordi"] = spettro[0].bordi.tolist()
+            risposta["emessi"] = spettro[0].conteggi.tolist()
+            risposta["spettri"] = spettro[1].conteggi.tolist()
+        risposte[i] = risposta
+    return risposte
+
+
+class Servizio:
+
+    """
+    Servizio di simulazione
+
+    Input:
+    workers = numero di processi del pool che eseguono le simulazioni
+    finestra = tempo (s) in cui le richieste per la stessa stella sono unite in un lotto
+    fotoni_lotto = fotoni in attesa oltre i quali il lotto è inviato senza aspettare la fine della finestra
+    estremo_sx, estremo_dx = intervallo di default, per cui si preparano cumulative e tabella della trasmissione
+    """
+
+    def __init__(self, workers=1, finestra=FINESTRA, fotoni_lotto=FOTONI_LOTTO, estremo_sx=380, estremo_dx=790):
+        self.finestra = finestra
+        self.fotoni_lotto = fotoni_lotto
+        self.pool = ProcessPoolExecutor(workers, initializer=_riscalda,
+                                        initargs=(tuple(STELLE.values()), estremo_sx, estremo_dx))
+        self.tabella = trasmissione.tabella(estremo_sx, estremo_dx)
+        self.in_attesa = {} #chiave (T, estremo_sx, estremo_dx) -> richieste del lotto in preparazione
+        self.statistiche = {"richieste": 0, "lotti": 0, "fotoni": 0, "errori": 0}
+
+    async def simula(self, dati):
+        """
+        Metodo che aggiunge la richiesta al lotto della sua stella e ne attende la risposta
+        """
+        richiesta = valida(dati)
+        loop = asyncio.get_running_loop()
+        chiave = (richiesta["T"], richiesta["estremo_sx"], richiesta["estremo_dx"])
+        lotto = self.in_attesa.get(chiave)
+        if lotto is None:
+            lotto = {"voci": [], "fotoni": 0, "timer": loop.call_later(self.finestra, self._invia, chiave)}
+            self.in_attesa[chiave] = lotto
+        futuro = loop.create_future()
+        lotto["voci"].append((richiesta, futuro))
+        lotto["fotoni"] += richiesta["N"]
+        self.statistiche["richieste"] += 1
+        if lotto["fotoni"] >= self.fotoni_lotto:
+            self._invia(chiave)
+        return await futuro
+
+    def _invia(self, chiave):
+        lotto = self.in_attesa.pop(chiave, None)
+        if lotto is not None:
+            lotto["timer"].cancel()
+            asyncio.ensure_future(self._esegui(chiave, lotto["voci"]))
+
+    async def _esegui(self, chiave, voci, conta=True):
+        loop = asyncio.get_running_loop()
+        if conta:
+            self.statistiche["lotti"] += 1
+            self.statistiche["fotoni"] += sum(r["N"] for r, _ in voci)
+        try:
+            risposte = await loop.run_in_executor(self.pool, simula_lotto, *chiave, [r for r, _ in voci])
+        except Exception as errore:
+            if len(voci) == 1:
+                risposte = [errore]
+            else:
+                #Se il lotto fallisce si ripete ogni richiesta da sola, così che fallisca solo quella che
+                #causa l'errore (il risultato di ogni richiesta non dipende dalle altre del lotto)
+                for voce in voci:
+                    await self._esegui(chiave, [voce], conta=False)
+                return
+        for (_, futuro), risposta in zip(voci, risposte):
+            if isinstance(risposta, Exception):
+                self.statistiche["errori"] += 1
+                if not futuro.done():
+                    futuro.set_exception(risposta)
+            elif not futuro.done():
+                futuro.set_result(risposta)
+
+    def trasmissione(self, dati):
+        """
+        Metodo che restituisce la matrice (angoli x lam) della probabilità di osservazione
+        """
+        lam = np.atleast_1d(np.asarray(dati["lam"], dtype=np.float64))
+        angoli = np.atleast_1d(np.asarray(dati.get("angoli", [0]), dtype=np.float64))
+        if lam.ndim != 1 or angoli.ndim != 1 or lam.size*angoli.size > 10**7 or np.any(lam <= 0):
+            raise ValueError("lam (positive) e angoli devono essere liste di numeri (al più 10^7 valori in tutto)")
+        return {"p_obs": self.tabella(lam[np.newaxis,:], angoli[:,np.newaxis]).tolist()}
+
+    def stato(self):
+        """
+        Metodo che restituisce le statistiche del servizio e le richieste in attesa
+        """
+        return dict(self.statistiche, in_attesa=sum(len(l["voci"]) for l in self.in_attesa.values()))
+
+    async def rispondi(self, metodo, percorso, corpo):
+        """
+        Metodo che esegue la richiesta HTTP
+
+        Output:
+        - codice di stato HTTP
+        - oggetto da restituire come JSON
+        """
+        if metodo == "GET" and percorso == "/stato":
+            return 200, self.stato()
+        if metodo != "POST" or percorso not in ("/simula", "/trasmissione"):
+            return 404, {"errore": "Percorsi: GET /stato, POST /simula, POST /trasmissione"}
+        try:
+            dati = json.loads(corpo or b"{}")
+            if percorso == "/trasmissione":
+                return 200, self.trasmissione(dati)
+            if isinstance(dati, list):
+                return 200, list(await asyncio.gather(*[self.simula(d) for d in dati]))
+            return 200, await self.simula(dati)
+        except (ValueError, TypeError, KeyError) as errore:
+            return 400, {"errore": str(errore)}
+        except Exception as errore:
+            return 500, {"errore": "{:}: {:}".format(type(errore).__name__, errore)}
+
+    async def connessione(self, reader, writer):
+        """
+        Metodo che legge una richiesta HTTP/1.1, risponde e chiude la connessione
+        """
+        try:
+            metodo, percorso, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+            intestazioni = {}
+            while True:
+                riga = await reader.readline()
+                if riga in (b"\r\n", b"\n", b""):
+                    break
+                nome, _, valore = riga.decode("latin-1").partition(":")
+                intestazioni[nome.strip().lower()] = valore.strip()
+            corpo = await reader.readexactly(int(intestazioni.get("content-length", 0)))
+            codice, risposta = await self.rispondi(metodo, percorso.split("?")[0], corpo)
+        except (ValueError, asyncio.IncompleteReadError) as errore:
+            codice, risposta = 400, {"errore": "Richiesta HTTP non valida: {:}".format(errore)}
+        dati = json.dumps(risposta).encode()
+        testo = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}[codice]
+        writer.write("HTTP/1.1 {:} {:}\r\nContent-Type: application/json\r\nContent-Length: {:}\r\n"
+                     "Connection: close\r\n\r\n".format(codice, testo, len(dati)).encode("latin-1")+dati)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def avvia(self, host="127.0.0.1", porta=8765):
+        """
+        Metodo che avvia il server e risponde alle richieste finché non viene interrotto
+        """
+        server = await asyncio.start_server(self.connessione, host, porta)
+        print("Servizio in ascolto su http://{:}:{:}".format(host, porta))
+        async with server:
+            await server.serve_forever()
+
+    def chiudi(self):
+        self.pool.shutdown(cancel_futures=True)
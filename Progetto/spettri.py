@@ -0,0 +1,130 @@
+"""
+Modulo per leggere gli spettri osservati (file .csv con colonne "lambda (nm)" e "photons")
+__________________________________________________________________________________________
+
+Il file .csv viene letto a blocchi una sola volta e convertito in un file binario (float64, una riga
+(lambda, photons) per ogni riga del .csv) accompagnato da un file .json con dimensione e data di modifica
+del .csv, numero di righe e minimo e massimo delle lunghezze d'onda. Le letture successive, se il .csv
+non è cambiato, aprono direttamente il file binario con np.memmap, senza caricarlo in memoria.
+
+Gli istogrammi sono calcolati a blocchi con np.histogram, con gli stessi bin di plt.hist(lam, bins=n_bins,
+weights=photons), senza bisogno di matplotlib.
+"""
+
+import numpy as np
+import hashlib
+import json
+import os
+
+
+COLONNE = ("lambda (nm)", "photons")
+
+#Righe del .csv lette (o righe del file binario istogrammate) per blocco
+CHUNK = 10**6
+
+
+def _file_cache(file, cartella=None):
+
+    """
+    Funzione che restituisce i nomi del file binario e del file .json associati al .csv: accanto al .csv
+    oppure nella cartella indicata (con un codice del percorso, per distinguere .csv con lo stesso nome)
+    """
+    if cartella is None:
+        base = file
+    else:
+        codice = hashlib.sha1(os.path.abspath(file).encode()).hexdigest()[:10]
+        base = os.path.join(cartella, "{:}.{:}".format(os.path.basename(file), codice))
+    return base+".bin", base+".json"
+
+
+def _firma(file):
+
+    """
+    Funzione che restituisce dimensione e data di modifica del file, usate per capire se è cambiato
+    """
+    stat = os.stat(file)
+    return {"sorgente": os.path.abspath(file), "dimensione": stat.st_size, "modifica_ns": stat.st_mtime_ns}
+
+
+def converti(file, cartella=None, chunk=CHUNK):
+
+    """
+    Funzione che converte il .csv nel file binario, leggendolo a blocchi di chunk righe (in modo atomico)
+
+    Output:
+    Dizionario con le informazioni scritte nel file .json
+    """
+    import pandas as pd
+
+    binario, meta = _file_cache(file, cartella)
+    firma = _firma(file)
+    temp = "{:}.{:}.tmp".format(binario, os.getpid())
+    righe = 0
+    minimo, massimo = np.inf, -np.inf
+    with open(temp, "wb") as fout:
+        for blocco in pd.read_csv(file, sep=",", usecols=list(COLONNE), dtype=np.float64, chunksize=chunk):
+            dati = np.ascontiguousarray(blocco[list(COLONNE)].to_numpy(dtype=np.float64))
+            fout.write(dati.tobytes())
+            righe += len(dati)
+            if len(dati):
+                minimo = min(minimo, dati[:,0].min())
+                massimo = max(massimo, dati[:,0].max())
+    os.replace(temp, binario)
+
+    info = dict(firma, righe=righe, colonne=list(COLONNE), dtype="float64",
+                lam_min=float(minimo) if righe else None, lam_max=float(massimo) if righe else None)
+    temp = "{:}.{:}.tmp".format(meta, os.getpid())
+    with open(temp, "w") as fout:
+        json.dump(info, fout, indent=2)
+    os.replace(temp, meta)
+    return info
+
+
+def info(file, cartella=None, chunk=CHUNK):
+
+    """
+    Funzione che restituisce le informazioni sul file binario del .csv, convertendolo solo se il binario
+    non esiste o se il .csv è cambiato dall'ultima conversione
+    """
+    binario, meta = _file_cache(file, cartella)
+    if os.path.exists(binario) and os.path.exists(meta):
+        with open(meta) as fin:
+            salvate = json.load(fin)
+        firma = _firma(file)
+        if all(salvate.get(chiave) == valore for chiave, valore in firma.items()):
+            return salvate
+    return converti(file, cartella, chunk)
+
+
+def carica(file, cartella=None, chunk=CHUNK):
+
+    """
+    Funzione che restituisce i dati del .csv come array (righe x 2) in sola lettura mappato in memoria:
+    colonna 0 = lunghezze d'onda (nm), colonna 1 = numero di fotoni
+    """
+    dati = info(file, cartella, chunk)
+    if dati["righe"] == 0:
+        return np.empty((0, 2))
+    return np.memmap(_file_cache(file, cartella)[0], dtype=np.float64, mode="r", shape=(dati["righe"], 2))
+
+
+def istogramma(file, n_bins=99, cartella=None, chunk=CHUNK):
+
+    """
+    Funzione che costruisce a blocchi di chunk righe l'istogramma del .csv, pesando ogni lunghezza d'onda
+    con il suo numero di fotoni, con n_bins bin tra la lunghezza d'onda minima e massima (come plt.hist)
+
+    Output:
+    - numero di fotoni in ogni bin
+    - bordi dei bin
+    """
+    dati = info(file, cartella, chunk)
+    if dati["righe"] == 0:
+        raise ValueError("Il file {:} non contiene dati".format(file))
+    valori = carica(file, cartella, chunk)
+    intervallo = (dati["lam_min"], dati["lam_max"])
+    n = np.zeros(n_bins)
+    for inizio in range(0, len(valori), chunk):
+        blocco = valori[inizio:inizio+chunk]
+        n += np.histogram(blocco[:,0], bins=n_bins, range=intervallo, weights=blocco[:,1])[0]
+    return n, np.histogram_bin_edges([], bins=n_bins, range=intervallo)
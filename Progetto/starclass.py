@@ -1,14 +1,32 @@
 import numpy as np
 import math as mt
-import matplotlib.pyplot  as plt
-from scipy import integrate
-from scipy import optimize
-import matplotlib.colors
 import sys
 
 #Importo modulo con funzioni
 sys.path.append(" ")
 import func as f
+import normalizzazione
+import istogrammi
+import campionatori
+import telemetria
+
+
+"""
+matplotlib e scipy sono importati solo nei metodi che li usano, così che importare il modulo per
+ottenere solo dei numeri (ad esempio in modalità headless) sia veloce e non richieda un display
+"""
+
+def _mostra(salva):
+
+    """
+    Funzione che mostra la figura corrente oppure, se salva non è None, la salva nel file salva e la chiude
+    """
+    import matplotlib.pyplot as plt
+    if salva is None:
+        plt.show()
+    else:
+        plt.savefig(salva)
+        plt.close()
 
 
 """
@@ -17,69 +35,110 @@ ________________________________________________________________________________
 """
 
 
+def _uniformi(rng, forma, dtype):
+
+    #Uniformi in [0,1): in float32 (solo con numpy.random.Generator) metà memoria delle float64
+    if dtype == np.float32 and isinstance(rng, np.random.Generator):
+        return rng.random(size=forma, dtype=np.float32)
+    return rng.uniform(size=forma)
+
+
 class star:
 
-    def __init__(self, name, T):
+    """
+    Stella
+
+    Input:
+    name = nome della stella
+    T = temperatura della stella
+    dtype = tipo dei fotoni e delle probabilità di osservazione (np.float64 oppure np.float32, che dimezza
+            la memoria dei fotoni e delle matrici angoli x fotoni con l'errore indicato in func.BUDGET_FLOAT32)
+    """
+
+    def __init__(self, name, T, dtype=np.float64):
         self.name=name
         self.T=T
+        self.dtype=np.dtype(dtype)
     
 
-    def no_absorption(self, N,estremo_sx, estremo_dx):
+    def no_absorption(self, N,estremo_sx, estremo_dx, batch=10**6, rng=None, metodo="auto"):
         """
-        Metodo che simula la distribuzione dei fotoni emessi da un corpo nero e che noi vedremmo 
+        Metodo che simula la distribuzione dei fotoni emessi da un corpo nero e che noi vedremmo
         se non ci fosse lo scattering di Rayleigh.
-        
+
+        Si ottengono sempre esattamente N fotoni; con l'Hit or Miss le coppie (lambda, y) sono estratte
+        a blocchi finché non si raggiungono N fotoni accettati.
+
         Input:
-        N = numero di fotoni da usare per generare la distribuzione
+        N = numero di fotoni emessi che si vogliono generare
         estremo_sx = più piccola lunghezza d'onda che si vuole generare
         estremo_dx = più grande lunghezza d'onda che si vuole generare
+        batch = numero massimo di coppie estratte per blocco dall'Hit or Miss (limita la memoria usata)
+        rng = generatore numpy.random.Generator da usare; se None si usa lo stato globale di np.random
+        metodo = "hitmiss", "inverse_cdf", "alias" (vedi modulo campionatori) oppure "auto" per
+                 scegliere il più veloce per la temperatura della stella e l'intervallo
 
         Output:
-        - Array con i fotoni generati dalla distribuzione
-        - costate di normalizzazione 
-        """
-        num = int((estremo_dx-estremo_sx)/0.1) #faccio in modo che i punti siano equispaziati di circa 0.1 nm
-        x = np.linspace(estremo_sx,estremo_dx,num)
-        k_norm = 1/integrate.simpson(f.D(x,self.T),x) #costante con cui normalizzare distribuzione
-        x_max = optimize.minimize(f.D_norm_opposite,x0=(estremo_sx+estremo_dx)/2,args=(self.T,k_norm), tol=1e-9)
-        max_value_1 = f.D_norm(x_max.x[0],self.T,k_norm)    
-        
-        #Simulazione con il metodo dell' Hit or Miss
-        fotoni = []
-        lam = np.random.uniform(low=estremo_sx,high=estremo_dx,size=N)
-        y_value = np.random.uniform(low=0, high=max_value_1, size=N)
-        for i in range(N):
-
-             if (y_value[i] <= f.D_norm(lam[i],self.T,k_norm)):
-                fotoni.append(lam[i])
-        
-        return fotoni, k_norm
-
-
-    def no_abs_graph(self,fotoni,k_norm):
+        - Array (di tipo self.dtype) con gli N fotoni generati dalla distribuzione
+        - costate di normalizzazione
+        - efficienza, ossia frazione di estrazioni accettate (1 per inverse_cdf e alias)
+        """
+        if rng is None:
+            rng = np.random
+        if metodo == "auto":
+            metodo = campionatori.scegli(self.T,estremo_sx,estremo_dx)
+
+        #Costante di normalizzazione, calcolata una sola volta per (T, estremi)
+        k_norm = normalizzazione.costanti(self.T,estremo_sx,estremo_dx)[0]
+
+        with telemetria.fase("emissione", stella=self.name, metodo=metodo) as dati:
+            if metodo == "hitmiss":
+                fotoni, eff = campionatori.hitmiss(rng,N,self.T,estremo_sx,estremo_dx,batch=batch)
+            elif metodo == "inverse_cdf":
+                fotoni, eff = campionatori.inverse_cdf(rng,N,self.T,estremo_sx,estremo_dx), 1.0
+            elif metodo == "alias":
+                fotoni, eff = campionatori.alias(rng,N,self.T,estremo_sx,estremo_dx), 1.0
+            else:
+                raise ValueError("Metodo di campionamento sconosciuto: {:}".format(metodo))
+            #Estrazioni (coppie dell'Hit or Miss) e fotoni accettati
+            dati["fotoni_in"] = N/eff if eff > 0 else 0
+            dati["fotoni_out"] = N
+
+        return fotoni.astype(self.dtype, copy=False), k_norm, eff
+
+
+    def no_abs_graph(self,fotoni,k_norm, salva=None):
         """
         Metodo con cui si rappresenta graficamente la distribuzione del corpo nero e la si confronta 
         con valori attesi
         """
+        ist = istogrammi.dai_dati(fotoni,100)
+        self.no_abs_graph_ist(ist,k_norm,len(fotoni),salva=salva)
+
+    @telemetria.misurata("grafico.emissione")
+    def no_abs_graph_ist(self,ist,k_norm,n_emessi, salva=None):
+        """
+        Metodo come no_abs_graph, ma a partire da un istogramma già riempito (ad esempio da pipeline)
+
+        Input:
+        ist = istogramma dei fotoni emessi
+        k_norm = costante di normalizzazione
+        n_emessi = numero di fotoni emessi
+        """
+        import matplotlib.pyplot as plt
 
         plt.figure(figsize=(10,8))
 
-        n_bins = 100
-        n,bins,p = plt.hist(fotoni,bins=n_bins, color="limegreen", label="Valori simulati")
-        
+        n = ist.conteggi
+        plt.stairs(n,ist.bordi,fill=True, color="limegreen", label="Valori simulati")
+
         #Valori attesi
-        bincenters = (bins[:-1]+bins[1:])/2
-        binwidth =(bins[-1:]-bins[0])/n_bins
-        height = f.D_norm(bincenters,self.T,k_norm)
-        prob = height*binwidth
-        n_exp = len(fotoni)*prob
-       
+        bincenters = ist.centri
+        n_exp = istogrammi.attesi(ist,self.T,k_norm,n_emessi)
+
         #Chi quadro
         #Prendo solo bin con un numero di eventi maggiore o uguale a 4
-        mask = n >=4
-        chi2 =  np.sum( (n_exp[mask] - n[mask])**2 /n[mask] ) 
-        ndof = len(n[mask])-1
-        chi2_red = chi2/ndof
+        chi2_red = istogrammi.chi2_ridotto(n,n_exp,varianza=ist.varianza())
 
         plt.text(bincenters[1],max(n)*1/4, r'$\chi_r^2$  : {:.2f}'.format(chi2_red), fontsize=14, color='blue')
         plt.plot(bincenters,n_exp, color="blue", label="Valori attesi", marker=".", linewidth=1)
@@ -89,81 +148,177 @@ class star:
                     ,fontsize=9.5)
         plt.xlabel(r'$ \text{Lunghezza d\'onda (nm)} $')
         plt.legend(frameon=False)
-        plt.show()
+        _mostra(salva)
 
     
-    def R_scattering(self, fotoni, angle) :
+    def R_scattering(self, fotoni, angle, rng=None) :
 
         """
         Metodo che simula lo scattering di Ryleigh dei fotoni emessi dal corpo nero una volta
         arrivati in atmosfera
-        
+
         Input:
         fotoni = fotoni che sono emessi dal corpo nero e che arrivano nell'atmosfera
         angle = angolo della stella rispetto allo Zenit
+        rng = generatore numpy.random.Generator da usare; se None si usa lo stato globale di np.random
 
         Output:
         Array con i fotoni osservati, non diffusi
 
         """
 
-        prob = f.prob_obs(fotoni,angle)
-        n_obs = []
-        for i in range(len(fotoni)):
-            y_value = np.random.uniform()
-            if y_value < prob[i]: #lo scattering non è avvenuto, osservo fotone
-                n_obs.append(fotoni[i])
+        fotoni = np.asarray(fotoni, dtype=self.dtype)
+        mask = self.R_scattering_multi(fotoni, [angle], maschere=True, rng=rng)[0]
+        return fotoni[mask]
 
-        return n_obs
-    
-    def R_scattering_graph(self,fotoni,n_obs, angle, k_norm):
+    def R_scattering_multi(self, fotoni, angles, maschere=False, chunk_size=2**22, rng=None):
+
+        """
+        Metodo che simula lo scattering di Rayleigh degli stessi fotoni per più angoli in una sola chiamata.
+        La probabilità di osservazione è calcolata come una matrice (angoli x fotoni) per broadcasting,
+        elaborata a blocchi di fotoni in modo che ogni blocco abbia al più chunk_size elementi.
+        Per ogni angolo l'estrazione è indipendente da quella degli altri angoli.
+
+        Input:
+        fotoni = array dei fotoni emessi che arrivano nell'atmosfera
+        angles = array di angoli della stella rispetto allo Zenit
+        maschere = se True restituisce le maschere dei fotoni osservati, altrimenti solo i conteggi
+        chunk_size = numero massimo di elementi della matrice (angoli x fotoni) tenuti in memoria
+        rng = generatore numpy.random.Generator da usare; se None si usa lo stato globale di np.random
+
+        Output:
+        - se maschere=False: array con il numero di fotoni osservati per ogni angolo
+        - se maschere=True: matrice booleana (angoli x fotoni), True se il fotone è osservato
+        """
+
+        if rng is None:
+            rng = np.random
+        fotoni = np.asarray(fotoni, dtype=self.dtype)
+        angles = np.atleast_1d(np.asarray(angles, dtype=np.float64))
+        n_ang = len(angles)
+        passo = max(1, chunk_size//max(n_ang,1))
+
+        if maschere:
+            risultato = np.empty((n_ang, len(fotoni)), dtype=bool)
+        else:
+            risultato = np.zeros(n_ang, dtype=np.int64)
+
+        with telemetria.fase("scattering", stella=self.name, angoli=n_ang) as dati:
+            for inizio in range(0, len(fotoni), passo):
+                blocco = fotoni[inizio:inizio+passo]
+                prob = f.prob_obs(blocco[np.newaxis,:], angles[:,np.newaxis])
+                osservati = _uniformi(rng, prob.shape, self.dtype) < prob #lo scattering non è avvenuto, osservo fotone
+                if maschere:
+                    risultato[:, inizio:inizio+passo] = osservati
+                else:
+                    risultato += np.count_nonzero(osservati, axis=1)
+            #Coppie (fotone, angolo) simulate e fotoni osservati, per la frazione di sopravvissuti
+            if telemetria.abilitata:
+                dati["fotoni_in"] = len(fotoni)*n_ang
+                dati["fotoni_out"] = int(np.count_nonzero(risultato) if maschere else np.sum(risultato))
+
+        return risultato
+
+    def R_scattering_pesato(self, fotoni, angles, chunk_size=2**22):
+
+        """
+        Metodo che simula lo scattering di Rayleigh in modo pesato (valore atteso): nessun fotone viene
+        eliminato, ma ognuno contribuisce al numero di fotoni osservati con peso pari alla sua probabilità
+        di osservazione f.prob_obs(lambda, angle). Gli stessi fotoni servono per tutti gli angoli e il
+        risultato non ha il rumore binomiale dell'estrazione fotone per fotone.
+
+        Input:
+        fotoni = array dei fotoni emessi che arrivano nell'atmosfera
+        angles = array di angoli della stella rispetto allo Zenit
+        chunk_size = numero massimo di elementi della matrice (angoli x fotoni) tenuti in memoria
+
+        Output:
+        - array con il numero atteso di fotoni osservati per ogni angolo (somma dei pesi)
+        - array con la varianza stimata di ogni somma (somma dei pesi al quadrato)
+        """
+
+        fotoni = np.asarray(fotoni, dtype=self.dtype)
+        angles = np.atleast_1d(np.asarray(angles, dtype=np.float64))
+        passo = max(1, chunk_size//max(len(angles),1))
+
+        somme = np.zeros(len(angles))
+        somme2 = np.zeros(len(angles))
+        with telemetria.fase("scattering_pesato", stella=self.name, angoli=len(angles)) as dati:
+            for inizio in range(0, len(fotoni), passo):
+                pesi = f.prob_obs(fotoni[np.newaxis,inizio:inizio+passo], angles[:,np.newaxis])
+                somme += pesi.sum(axis=1, dtype=np.float64)
+                somme2 += (pesi**2).sum(axis=1, dtype=np.float64)
+            dati["fotoni_in"] = len(fotoni)*len(angles)
+            dati["fotoni_out"] = float(somme.sum())
+
+        return somme, somme2
+
+    def R_scattering_graph(self,fotoni,n_obs, angle, k_norm, salva=None):
 
         """
         Metodo con cui si rappresenta graficamente la distribuzione dei fotoni osservati a seguito 
         scattering di Rayleigh e la si confronta con valori attesi
 
         """
+        ist = istogrammi.dai_dati(n_obs,max(1,int(mt.sqrt(len(n_obs)))))
+        self.R_scattering_graph_ist(ist,angle,k_norm,len(fotoni),salva=salva)
+
+    @telemetria.misurata("grafico.scattering")
+    def R_scattering_graph_ist(self,ist, angle, k_norm, n_emessi, salva=None):
+
+        """
+        Metodo come R_scattering_graph, ma a partire da un istogramma già riempito (ad esempio da pipeline)
+
+        Input:
+        ist = istogramma dei fotoni osservati all'angolo angle
+        angle = angolo della stella rispetto allo Zenit
+        k_norm = costante di normalizzazione
+        n_emessi = numero di fotoni emessi prima dello scattering
+        """
+        import matplotlib.pyplot as plt
         
         plt.figure(figsize=(10,8))
-        n_bins =int(mt.sqrt(len(n_obs)))
 
-        n,bins,p = plt.hist(n_obs,bins=n_bins, color="limegreen", label="Valori simulati")
+        n = ist.conteggi
+        plt.stairs(n,ist.bordi,fill=True, color="limegreen", label="Valori simulati")
      
         #Valori attesi
-        bincenters = (bins[:-1]+bins[1:])/2 
-        binwidth = (bins[-1:]-bins[0])/n_bins
-        height = f.D_norm(bincenters,self.T,k_norm)
-        prob_0 = height*binwidth 
-        n_0_exp = len(fotoni)*prob_0 #numero di fotoni iniziali attesi
-        
-        n_exp = n_0_exp*f.prob_obs(bincenters,angle)
+        bincenters = ist.centri
+        n_exp = istogrammi.attesi(ist,self.T,k_norm,n_emessi,angle)
         
         #Prendo solo bin con un numero di eventi maggiore o uguale a 4
-        mask = n >=4
-        chi2 =  np.sum( (n_exp[mask] - n[mask])**2 /n[mask] ) 
-        ndof = len(n[mask])-1
-        chi2_red=chi2/ndof
+        chi2_red = istogrammi.chi2_ridotto(n,n_exp,varianza=ist.varianza())
     
         plt.plot(bincenters,n_exp, color="blue", label="Valori attesi", marker=".", linewidth=1)
-        plt.text(bincenters[1],max(n)*1/4, r'$\chi_r^2$  : {:.2f}'.format(chi2_red), fontsize=14, color='blue')
+        plt.text(bincenters[min(1,len(bincenters)-1)],max(n)*1/4, r'$\chi_r^2$  : {:.2f}'.format(chi2_red), fontsize=14, color='blue')
         plt.title("Stella: {:}, angolo: {:}°. \n Distribuzione simulata e attesa dei fotoni osservati considerando scattering di Ryleigh.".format(self.name,angle),
                    color="mediumblue",fontsize=13)
         plt.ylabel(r'$ \text{Numero di fotoni osservati per unità  di superficie e tempo} \  \left( \frac{1}{m^2 \cdot t }\right)  $',fontsize=9.5)
         plt.xlabel(r'$ \text{Lunghezza d\'onda (nm)} $')
         plt.legend(frameon=False)
-        plt.show()
+        _mostra(salva)
 
     
-    def compare_distribution(self,N):
+    def compare_distribution(self,N,rng=None):
         """
         Metodo che confronta nella zona del visibile la distribuzione dei fotoni emessi dalla stella
         con quelle dei fotoni osservati che considerano lo scattering di Rayleigh quando 
         la stella è allo Zenit e all'orizzonte
         """
 
-        fotoni_emessi = self.no_absorption(N,380,790)[0]
-        fotoni_zenit = self.R_scattering(fotoni_emessi,0)
-        fotoni_orizzonte = self.R_scattering(fotoni_emessi,90)
+        fotoni_emessi = self.no_absorption(N,380,790,rng=rng)[0]
+        fotoni_zenit = self.R_scattering(fotoni_emessi,0,rng=rng)
+        fotoni_orizzonte = self.R_scattering(fotoni_emessi,90,rng=rng)
+        self.compare_graph(fotoni_emessi,fotoni_zenit,fotoni_orizzonte)
+
+    @telemetria.misurata("grafico.confronto")
+    def compare_graph(self,fotoni_emessi,fotoni_zenit,fotoni_orizzonte, salva=None):
+        """
+        Metodo con cui si rappresentano insieme le distribuzioni dei fotoni emessi e di quelli osservati
+        con la stella allo Zenit e all'orizzonte
+        """
+        import matplotlib.pyplot as plt
+        import matplotlib.colors
 
         fig, axs = plt.subplots(2, 1, gridspec_kw={'height_ratios': [4 ,0.5]},sharex=True,figsize=(10,8))
         fig.subplots_adjust(hspace=0)
@@ -178,11 +333,11 @@ class star:
         cmap = matplotlib.colors.LinearSegmentedColormap.from_list("", ["purple","blue","limegreen","yellow","orange","red"])
         plt.colorbar(plt.cm.ScalarMappable( cmap=cmap, norm=norm),cax=axs[1], orientation='horizontal',label="something")
         axs[1].set_xlabel(r'$ \text{Lunghezza d\'onda (nm)} $',fontsize=10) 
-        plt.show()
+        _mostra(salva)
 
     
     
-    def flusso_integrato(self,N,angle):
+    def flusso_integrato(self,N,angle,rng=None,pesato=False):
 
         """
         Metodo che calcola il numero di fotoni totali osservato in funzione dell'angolo della stella 
@@ -191,30 +346,119 @@ class star:
         Input:
         - N numero di fotoni che si vogliono utilizzare per la simulazione
         - angle: array di angoli da studiare
+        - rng: generatore numpy.random.Generator da usare; se None si usa lo stato globale di np.random
+        - pesato: se True usa lo scattering pesato (R_scattering_pesato) e rappresenta anche gli errori
 
         Output:
         -Array degli integrali, ossia numero totale fotoni al variare dell'angolo
 
         """
 
-        integrali=[]
         #Emissione fotoni considerando solo quelli nel visibile
-        fotoni=self.no_absorption(N,380,790)[0]
+        fotoni=self.no_absorption(N,380,790,rng=rng)[0]
+
+        #Simulo scattering a tutti gli angoli insieme
+        if pesato:
+            integrali,varianze=self.R_scattering_pesato(fotoni,angle)
+            self.flusso_graph(angle,integrali,errori=np.sqrt(varianze))
+        else:
+            integrali=self.R_scattering_multi(fotoni,angle,rng=rng)
+            self.flusso_graph(angle,integrali)
+
+        return integrali
 
-        #Simulo scattering a vari angoli
-        for i in range (len(angle)):
+    @telemetria.misurata("grafico.flusso")
+    def flusso_graph(self,angle,integrali, salva=None, errori=None):
 
-            #Simulo per angolo i-esimo
-            n_obs=self.R_scattering(fotoni,angle[i])
-            n_obs_tot=len(n_obs) 
-            integrali.append(n_obs_tot)
+        """
+        Metodo con cui si rappresenta il numero di fotoni totali osservati in funzione dell'angolo
+        (con le barre di errore se errori non è None)
+        """
+        import matplotlib.pyplot as plt
 
         plt.figure(figsize=(10,8))
-        plt.plot(angle,integrali, marker=".", linewidth=0, color="mediumseagreen")
+        plt.errorbar(angle,integrali,yerr=errori, marker=".", linewidth=0, elinewidth=1, color="mediumseagreen")
         plt.title("Stella: {:}. \nAndamento del numero di fotoni totali osservati in funzione angolo rispetto allo Zenit.".format(self.name), fontsize=11)
         plt.ylabel(r'$ \text{Numero di fotoni totali per  unità  di superficie e tempo} \  \left( \frac{1}{m^2 \cdot t }\right)  $',fontsize=9.5)
         plt.xlabel("Angolo (°)")
-        plt.show()
+        _mostra(salva)
 
-        return integrali
+    def emissione(self, N, estremo_sx, estremo_dx, chunk=10**5, rng=None):
+
+        """
+        Generatore che emette N fotoni a blocchi di al più chunk fotoni, così che in memoria
+        ci sia un solo blocco alla volta
 
+        Output:
+        Ad ogni passo l'array dei fotoni del blocco
+        """
+
+        for inizio in range(0, N, chunk):
+            yield self.no_absorption(min(chunk, N-inizio), estremo_sx, estremo_dx, rng=rng)[0]
+
+    @telemetria.misurata("pipeline")
+    def pipeline(self, N, estremo_sx, estremo_dx, angles, n_bins=100, chunk=None, rng=None, pesato=False,
+                 ist_emessi=None, ist_osservati=None):
+
+        """
+        Metodo che simula emissione e scattering di Rayleigh a blocchi, accumulando i risultati in istogrammi.
+        La memoria usata dipende dalla dimensione dei blocchi e non da N.
+
+        Input:
+        N = numero di fotoni emessi
+        estremo_sx, estremo_dx = intervallo di lunghezze d'onda, usato anche come estremi degli istogrammi
+        angles = array di angoli rispetto allo Zenit a cui simulare lo scattering
+        n_bins = numero di bin degli istogrammi
+        chunk = fotoni per blocco; se None è scelto in modo che la matrice (angoli x fotoni) abbia circa 2^22 elementi
+        rng = generatore numpy.random.Generator da usare; se None si usa lo stato globale di np.random
+        pesato = se True lo scattering è pesato (vedi R_scattering_pesato) e l'istogramma dei fotoni
+                 osservati contiene somme di pesi e le relative varianze
+        ist_emessi, ist_osservati = se non None i fotoni sono aggiunti a questi istogrammi (ad esempio restituiti
+                                    da una chiamata precedente) invece che a istogrammi nuovi
+
+        Output:
+        - istogramma dei fotoni emessi
+        - istogramma a righe dei fotoni osservati, una riga per angolo (la somma di una riga è il flusso integrato)
+        - costante di normalizzazione
+        """
+
+        angles = np.atleast_1d(np.asarray(angles, dtype=np.float64))
+        if chunk is None:
+            chunk = max(1000, 2**22//len(angles))
+
+        if ist_emessi is None:
+            ist_emessi = istogrammi.Istogramma(estremo_sx, estremo_dx, n_bins)
+        if ist_osservati is None:
+            ist_osservati = istogrammi.Istogramma(estremo_sx, estremo_dx, n_bins, righe=len(angles), pesato=pesato)
+        for fotoni in self.emissione(N, estremo_sx, estremo_dx, chunk=chunk, rng=rng):
+            ist_emessi.aggiungi(fotoni)
+            if pesato:
+                ist_osservati.aggiungi(fotoni, pesi=f.prob_obs(fotoni[np.newaxis,:], angles[:,np.newaxis]))
+            else:
+                maschere = self.R_scattering_multi(fotoni, angles, maschere=True, rng=rng)
+                ist_osservati.aggiungi(fotoni, maschere)
+
+        k_norm = normalizzazione.costanti(self.T, estremo_sx, estremo_dx)[0]
+        return ist_emessi, ist_osservati, k_norm
+
+    @telemetria.misurata("grafico.confronto")
+    def compare_graph_ist(self,ist_emessi,ist_zenit,ist_orizzonte, salva=None):
+        """
+        Metodo come compare_graph, ma a partire da istogrammi già riempiti (ad esempio da pipeline)
+        """
+        import matplotlib.pyplot as plt
+        import matplotlib.colors
+
+        fig, axs = plt.subplots(2, 1, gridspec_kw={'height_ratios': [4 ,0.5]},sharex=True,figsize=(10,8))
+        fig.subplots_adjust(hspace=0)
+        axs[0].set_title("Stella: {:}. \n Confronto diverse distribuzioni simulate di fotoni osservati ".format(self.name), fontsize=12)
+        axs[0].stairs(ist_emessi.conteggi,ist_emessi.bordi,fill=True, color="blueviolet", label="Senza assorbimento")
+        axs[0].stairs(ist_zenit.conteggi,ist_zenit.bordi,fill=True, color="cyan", label="Con scattering e Sole allo Zenit ")
+        axs[0].stairs(ist_orizzonte.conteggi,ist_orizzonte.bordi,fill=True, color="greenyellow",label="Con scattering e Sole all'orizzonte")
+        axs[0].set_ylabel(r'$ \text{Numero di fotoni per  unità  di superficie e tempo} \  \left( \frac{1}{m^2 \cdot t }\right)  $',fontsize=9.5)
+        axs[0].legend(fontsize=8, frameon=False)
+        norm=plt.Normalize(380,790)
+        cmap = matplotlib.colors.LinearSegmentedColormap.from_list("", ["purple","blue","limegreen","yellow","orange","red"])
+        plt.colorbar(plt.cm.ScalarMappable( cmap=cmap, norm=norm),cax=axs[1], orientation='horizontal',label="something")
+        axs[1].set_xlabel(r'$ \text{Lunghezza d\'onda (nm)} $',fontsize=10) 
+        _mostra(salva)
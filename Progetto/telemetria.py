@@ -0,0 +1,219 @@
+"""
+Modulo per misurare il tempo (e la memoria) delle fasi della simulazione
+________________________________________________________________________
+
+Le fasi sono delimitate da blocchi "with telemetria.fase(nome, ...) as dati:" in starclass, normalizzazione
+e Simulazione, oppure sono interi metodi decorati con @telemetria.misurata(nome) (ad esempio i grafici).
+Nel dizionario dati la fase può registrare informazioni come fotoni in ingresso e in uscita,
+efficienza del campionamento o frazione di fotoni sopravvissuti allo scattering.
+
+Di default la telemetria è disabilitata: fase restituisce sempre lo stesso oggetto che non fa nulla e il
+costo è quello di una chiamata di funzione per fase. Con abilita() ogni fase registra tempo reale, tempo di
+CPU e, se memoria=True, il picco di memoria allocata (tracemalloc, che rallenta le allocazioni).
+
+Le fasi registrate possono essere salvate in un file .json nel formato Chrome trace (leggibile con
+chrome://tracing o https://ui.perfetto.dev), con il riassunto per fase in "otherData".
+La telemetria registra solo le fasi del processo in cui è abilitata (non quelle dei processi di un pool).
+"""
+
+import os
+import json
+import time
+import functools
+
+
+abilitata = False
+_memoria = False
+_eventi = []
+_pila = []
+_origine = 0.0
+
+
+class _Nulla:
+
+    #Fase e dizionario dati quando la telemetria è disabilitata
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *errore):
+        return False
+
+    def __setitem__(self, chiave, valore):
+        pass
+
+
+_NULLA = _Nulla()
+
+
+class _Fase:
+
+    def __init__(self, nome, info):
+        self.nome = nome
+        self.dati = dict(info)
+
+    def __enter__(self):
+        if _memoria:
+            import tracemalloc
+            attuale, picco = tracemalloc.get_traced_memory()
+            #Prima di azzerare il picco lo si conserva nella fase esterna, che potrebbe averlo raggiunto
+            #prima dell'inizio di questa fase
+            if _pila:
+                _pila[-1].picco_figli = max(_pila[-1].picco_figli, picco)
+            self.memoria_inizio = attuale
+            self.picco_figli = 0
+            tracemalloc.reset_peak()
+        _pila.append(self)
+        self.cpu = time.process_time()
+        self.inizio = time.perf_counter()
+        return self.dati
+
+    def __exit__(self, *errore):
+        durata = time.perf_counter()-self.inizio
+        cpu = time.process_time()-self.cpu
+        _pila.pop()
+        evento = {"nome": self.nome, "inizio": self.inizio-_origine, "durata": durata, "cpu": cpu,
+                  "pid": os.getpid(), "livello": len(_pila), "dati": self.dati}
+        if _memoria:
+            import tracemalloc
+            #Il picco della fase è il massimo tra quello dopo l'ultima fase interna e quelli conservati all'inizio
+            #e alla fine delle fasi interne
+            picco = max(tracemalloc.get_traced_memory()[1], self.picco_figli)
+            evento["memoria_picco_MB"] = (picco-self.memoria_inizio)/2**20
+            evento["memoria_finale_MB"] = (tracemalloc.get_traced_memory()[0]-self.memoria_inizio)/2**20
+            if _pila:
+                _pila[-1].picco_figli = max(_pila[-1].picco_figli, picco)
+            tracemalloc.reset_peak()
+        _eventi.append(evento)
+        return False
+
+
+def fase(nome, **info):
+
+    """
+    Funzione che restituisce il blocco (context manager) che misura la fase nome; info sono informazioni
+    iniziali della fase (ad esempio il nome della stella)
+    """
+    if not abilitata:
+        return _NULLA
+    return _Fase(nome, info)
+
+
+def misurata(nome):
+
+    """
+    Decoratore che misura ogni chiamata della funzione come fase nome; se il primo argomento ha un
+    attributo name (ad esempio un oggetto starclass.star) lo registra come stella
+    """
+    def decoratore(funzione):
+        @functools.wraps(funzione)
+        def avvolta(*args, **kwargs):
+            if not abilitata:
+                return funzione(*args, **kwargs)
+            info = {"stella": args[0].name} if args and hasattr(args[0], "name") else {}
+            with _Fase(nome, info):
+                return funzione(*args, **kwargs)
+        return avvolta
+    return decoratore
+
+
+def abilita(memoria=False):
+
+    """
+    Funzione che abilita la telemetria e cancella le fasi registrate; con memoria=True misura anche le allocazioni
+    """
+    global abilitata, _memoria, _origine
+    abilitata = True
+    _memoria = memoria
+    _eventi.clear()
+    _origine = time.perf_counter()
+    if memoria:
+        import tracemalloc
+        tracemalloc.start()
+
+
+def disabilita():
+
+    """
+    Funzione che disabilita la telemetria (le fasi registrate restano disponibili)
+    """
+    global abilitata, _memoria
+    if _memoria:
+        import tracemalloc
+        tracemalloc.stop()
+    abilitata = False
+    _memoria = False
+
+
+def eventi():
+
+    """
+    Funzione che restituisce la lista delle fasi registrate, nell'ordine in cui sono terminate
+    """
+    return list(_eventi)
+
+
+def riassunto():
+
+    """
+    Funzione che raggruppa le fasi registrate per nome
+
+    Output:
+    Dizionario nome -> numero di chiamate, tempo reale e di CPU totali, picco di memoria massimo
+    e somme dei dati numerici registrati (ad esempio fotoni in ingresso e in uscita)
+    """
+    tabella = {}
+    for e in _eventi:
+        voce = tabella.setdefault(e["nome"], {"chiamate": 0, "tempo": 0.0, "cpu": 0.0})
+        voce["chiamate"] += 1
+        voce["tempo"] += e["durata"]
+        voce["cpu"] += e["cpu"]
+        if "memoria_picco_MB" in e:
+            voce["memoria_picco_MB"] = max(voce.get("memoria_picco_MB", 0.0), e["memoria_picco_MB"])
+        for chiave, valore in e["dati"].items():
+            if chiave.startswith("fotoni") and isinstance(valore, (int, float)):
+                voce[chiave] = voce.get(chiave, 0)+valore
+    for voce in tabella.values():
+        if voce.get("fotoni_in"):
+            voce["frazione_uscita"] = voce.get("fotoni_out", 0)/voce["fotoni_in"]
+    return tabella
+
+
+def stampa_riassunto():
+
+    """
+    Funzione che stampa il riassunto delle fasi ordinate per tempo reale totale
+    """
+    tabella = riassunto()
+    print("{:<36} {:>8} {:>12} {:>12} {:>12} {:>10}".format("Fase", "chiamate", "tempo (s)", "CPU (s)", "memoria (MB)", "uscita/in"))
+    for nome, voce in sorted(tabella.items(), key=lambda x: -x[1]["tempo"]):
+        memoria = "{:.1f}".format(voce["memoria_picco_MB"]) if "memoria_picco_MB" in voce else "-"
+        frazione = "{:.3f}".format(voce["frazione_uscita"]) if "frazione_uscita" in voce else "-"
+        print("{:<36} {:>8} {:>12.4f} {:>12.4f} {:>12} {:>10}".format(nome, voce["chiamate"], voce["tempo"], voce["cpu"], memoria, frazione))
+
+
+def _serializzabile(valore):
+    if isinstance(valore, (str, int, float, bool)) or valore is None:
+        return valore
+    try:
+        return float(valore)
+    except (TypeError, ValueError):
+        return str(valore)
+
+
+def salva(file):
+
+    """
+    Funzione che salva le fasi registrate nel formato Chrome trace (eventi completi "X" con tempi in
+    microsecondi) e il riassunto per fase in "otherData"
+    """
+    traccia = []
+    for e in _eventi:
+        args = {chiave: _serializzabile(valore) for chiave, valore in e["dati"].items()}
+        args["cpu_s"] = e["cpu"]
+        if "memoria_picco_MB" in e:
+            args["memoria_picco_MB"] = e["memoria_picco_MB"]
+        traccia.append({"name": e["nome"], "ph": "X", "ts": e["inizio"]*1e6, "dur": e["durata"]*1e6,
+                        "pid": e["pid"], "tid": 0, "args": args})
+    with open(file, "w") as fout:
+        json.dump({"traceEvents": traccia, "displayTimeUnit": "ms", "otherData": {"riassunto": riassunto()}}, fout, indent=1)
@@ -0,0 +1,130 @@
+"""
+Modulo con la banca di template per il punto di partenza del fit degli spettri osservati
+________________________________________________________________________________________
+
+Un template è la forma di n_photons_fit (a meno del coefficiente k) per una coppia (T, angle) di una griglia,
+tabulata sui centri dei bin degli istogrammi osservati e normalizzata ad avere norma 1.
+Poiché il modello è lineare in k, per ogni template il k migliore (minimi quadrati con errori di Poisson)
+e il chi quadro corrispondente si ottengono in forma chiusa; il confronto con tutti i template si riduce
+quindi a due prodotti matrice-vettore.
+
+La banca dipende solo dalla griglia di lunghezze d'onda: può essere salvata su file (.npz) e riutilizzata
+per tutti gli spettri con gli stessi bin.
+"""
+
+import numpy as np
+import os
+import sys
+
+#Importo modulo con funzioni
+sys.path.append(" ")
+import func as f
+
+
+#Griglia di default: temperature equispaziate in scala logaritmica (passo circa 1.3%) e angoli con passo di 1 grado
+T_GRIGLIA = np.geomspace(1000, 100000, 361)
+ANGOLI = np.arange(0, 91, 1.0)
+
+
+class BancaTemplate:
+
+    """
+    Banca dei template di n_photons_fit sulla griglia (T, angle)
+
+    Input:
+    lam = centri dei bin (nm) su cui tabulare i template
+    T = griglia di temperature
+    angoli = griglia di angoli rispetto allo Zenit (gradi)
+    file = file .npz della banca; se esiste ed ha le stesse griglie viene letto, altrimenti la banca
+           viene calcolata e salvata nel file (se None non si salva su disco)
+    """
+
+    def __init__(self, lam, T=T_GRIGLIA, angoli=ANGOLI, file=None):
+        self.lam = np.asarray(lam, dtype=np.float64)
+        self.T = np.asarray(T, dtype=np.float64)
+        self.angoli = np.asarray(angoli, dtype=np.float64)
+        self.file = file
+        if file is None or not self.carica(file):
+            self._calcola()
+            if file is not None:
+                self.salva(file)
+        self.forme2 = self.forme**2
+
+    def _calcola(self):
+        #Template (T, angle, lam) con broadcasting di D e prob_obs
+        D = f.D(self.lam[np.newaxis,:], self.T[:,np.newaxis])
+        P = f.prob_obs(self.lam[np.newaxis,:], self.angoli[:,np.newaxis])
+        forme = (D[:,np.newaxis,:]*P[np.newaxis,:,:]).reshape(len(self.T)*len(self.angoli), len(self.lam))
+        self.norme = np.sqrt(np.sum(forme**2, axis=1))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.forme = np.where(self.norme[:,np.newaxis] > 0, forme/self.norme[:,np.newaxis], 0)
+
+    def carica(self, file):
+        """
+        Metodo che legge la banca dal file se esiste ed ha le stesse griglie
+
+        Output:
+        True se la banca è stata letta, False altrimenti
+        """
+        if not os.path.exists(file):
+            return False
+        with np.load(file) as dati:
+            for nome in ("lam", "T", "angoli"):
+                if dati[nome].shape != getattr(self, nome).shape or not np.array_equal(dati[nome], getattr(self, nome)):
+                    return False
+            self.forme = dati["forme"]
+            self.norme = dati["norme"]
+        return True
+
+    def salva(self, file=None):
+        """
+        Metodo che scrive la banca nel file .npz (in modo atomico)
+        """
+        file = self.file if file is None else file
+        temp = "{:}.{:}.tmp.npz".format(file, os.getpid())
+        np.savez(temp, lam=self.lam, T=self.T, angoli=self.angoli, forme=self.forme, norme=self.norme)
+        os.replace(temp, file)
+
+    def chi2(self, n):
+        """
+        Metodo che, dato l'istogramma osservato n (sui bin della banca), restituisce per ogni template
+        il k migliore (nella normalizzazione del template) e il chi quadro, usando solo i bin non vuoti
+
+        chi2 = sum(n) - (sum t)^2/(sum t^2/n)      con k = (sum t)/(sum t^2/n)
+        """
+        n = np.asarray(n, dtype=np.float64)
+        pieni = (n > 0).astype(np.float64)
+        inversi = np.divide(1, n, out=np.zeros_like(n), where=n > 0)
+        somme = self.forme@pieni
+        somme2 = self.forme2@inversi
+        with np.errstate(invalid="ignore", divide="ignore"):
+            k = somme/somme2
+            chi2 = np.where(somme2 > 0, np.sum(n)-somme*k, np.inf)
+        return k, chi2
+
+    def punto_iniziale(self, n):
+        """
+        Metodo che restituisce il punto di partenza [angle, k, T] per il fit di n_photons_fit: i parametri
+        del template con chi quadro minimo, con k riportato alla normalizzazione di n_photons_fit
+        """
+        k, chi2 = self.chi2(n)
+        migliore = int(np.argmin(chi2))
+        i_T, i_angle = divmod(migliore, len(self.angoli))
+        return [self.angoli[i_angle], k[migliore]/self.norme[migliore], self.T[i_T]]
+
+
+#Banche già costruite in questo processo, con chiave griglia di lunghezze d'onda e file
+_banche = {}
+
+
+def banca(lam, file=None):
+
+    """
+    Funzione che restituisce la banca di template con griglie di default per i centri dei bin lam,
+    costruendola (o leggendola da file) solo la prima volta in ogni processo
+    """
+    lam = np.asarray(lam, dtype=np.float64)
+    chiave = (lam.tobytes(), file)
+    if chiave not in _banche:
+        _banche[chiave] = BancaTemplate(lam, file=file)
+    return _banche[chiave]
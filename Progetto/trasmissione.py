@@ -0,0 +1,141 @@
+"""
+Modulo con la tabella della trasmissione dell'atmosfera (probabilità di osservazione f.prob_obs)
+_______________________________________________________________________________________________
+
+La tabella contiene ln(p_obs) = -beta(lam)*S(angle) su una griglia nelle variabili
+- u = lam^-4, in cui beta è lineare
+- v = cos(angle), in cui lo spessore d'aria S è una funzione regolare anche vicino all'orizzonte
+e restituisce p_obs per array qualsiasi di lunghezze d'onda e angoli (combinati con il broadcasting)
+interpolando ln(p_obs) in modo bilineare.
+
+Errore: poiché ln(p_obs) è lineare in u, l'interpolazione lungo u è esatta e resta solo l'errore lungo v,
+limitato da h_v^2/8 * max|d^2 ln(p_obs)/dv^2| = h_v^2/8 * beta_max * max|S''(v)|, con S''(v) massima
+all'orizzonte (v=0). L'errore relativo su p_obs è quindi al più expm1 di questa quantità, calcolata alla
+creazione della tabella (attributo errore). Con la griglia di default nel visibile è circa 3e-6.
+
+Per le matrici (angoli x fotoni) della simulazione la formula chiusa di f.prob_obs, che con il broadcasting
+calcola beta una volta per fotone e S una volta per angolo, resta più veloce dell'interpolazione
+(circa 10 volte con 100 angoli e 10^5 fotoni): starclass continua quindi ad usare f.prob_obs.
+
+Per lunghezze d'onda fuori dall'intervallo della tabella o angoli fuori da [0, 90] gradi si usa f.prob_obs.
+
+La tabella dipende solo dall'intervallo e dalle dimensioni della griglia: può essere salvata su file (.npz)
+e riutilizzata nelle esecuzioni successive.
+"""
+
+import numpy as np
+import math as mt
+import os
+import sys
+
+#Importo modulo con funzioni
+sys.path.append(" ")
+import func as f
+
+
+#Coefficiente di beta: beta(lam) = C_BETA/lam^4 con lam in metri
+C_BETA = 8*mt.pi**3*(f.n_refr**2-1)**2/(3*f.density)
+
+
+def spessore(v):
+
+    """
+    Funzione che restituisce lo spessore d'aria S attraversato in funzione di v = cos(angle)
+    """
+    return np.sqrt((f.R_T*v)**2+2*f.R_T*f.S_z+f.S_z**2)-f.R_T*v
+
+
+class TabellaTrasmissione:
+
+    """
+    Tabella di ln(p_obs) sulla griglia (u = lam^-4, v = cos(angle))
+
+    Input:
+    lam_min, lam_max = intervallo di lunghezze d'onda (nm) della tabella
+    n_u, n_v = numero di punti della griglia in u e in v
+    file = file .npz della tabella; se esiste ed ha la stessa griglia viene letto, altrimenti la tabella
+           viene calcolata e salvata nel file (se None non si salva su disco)
+    """
+
+    def __init__(self, lam_min=380, lam_max=790, n_u=33, n_v=16385, file=None):
+        self.lam_min = float(lam_min)
+        self.lam_max = float(lam_max)
+        self.u = np.linspace(self.lam_max**-4, self.lam_min**-4, n_u)
+        self.v = np.linspace(0, 1, n_v)
+        self.file = file
+        if file is None or not self.carica(file):
+            self.tabella = -C_BETA*(self.u[:,np.newaxis]*1e36)*spessore(self.v)[np.newaxis,:]
+            if file is not None:
+                self.salva(file)
+        #Limite dell'errore relativo su p_obs (vedi descrizione del modulo)
+        h_v = self.v[1]-self.v[0]
+        S2_max = f.R_T**2*(2*f.R_T*f.S_z+f.S_z**2)/(2*f.R_T*f.S_z+f.S_z**2)**1.5
+        self.errore = mt.expm1(h_v**2/8*C_BETA*(self.lam_min*1e-9)**-4*S2_max)
+
+    def carica(self, file):
+        """
+        Metodo che legge la tabella dal file se esiste ed ha la stessa griglia
+
+        Output:
+        True se la tabella è stata letta, False altrimenti
+        """
+        if not os.path.exists(file):
+            return False
+        with np.load(file) as dati:
+            if dati["u"].shape != self.u.shape or dati["v"].shape != self.v.shape or \
+               not (np.array_equal(dati["u"], self.u) and np.array_equal(dati["v"], self.v)):
+                return False
+            self.tabella = dati["tabella"]
+        return True
+
+    def salva(self, file=None):
+        """
+        Metodo che scrive la tabella nel file .npz (in modo atomico)
+        """
+        file = self.file if file is None else file
+        temp = "{:}.{:}.tmp.npz".format(file, os.getpid())
+        np.savez(temp, u=self.u, v=self.v, tabella=self.tabella)
+        os.replace(temp, file)
+
+    def __call__(self, lam, angle):
+        """
+        Metodo che restituisce p_obs(lam, angle) come f.prob_obs: lam (nm) e angle (gradi) sono array
+        (o numeri) combinati con le regole di broadcasting di numpy
+        """
+        lam = np.asarray(lam, dtype=np.float64)
+        angle = np.asarray(angle, dtype=np.float64)
+        u = lam**-4
+        v = np.cos(angle*mt.pi/180)
+
+        #Indici e pesi separati per u e v: con lam (1 x N) e angle (A x 1) si calcolano una volta sola
+        pos_u = (u-self.u[0])/(self.u[1]-self.u[0])
+        i = np.clip(pos_u.astype(np.int64), 0, len(self.u)-2)
+        w_u = pos_u-i
+        pos_v = v/(self.v[1]-self.v[0])
+        j = np.clip(pos_v.astype(np.int64), 0, len(self.v)-2)
+        w_v = pos_v-j
+
+        t = self.tabella
+        ln_p = (1-w_u)*((1-w_v)*t[i,j]+w_v*t[i,j+1]) + w_u*((1-w_v)*t[i+1,j]+w_v*t[i+1,j+1])
+        p = np.exp(ln_p)
+
+        fuori = (lam < self.lam_min) | (lam > self.lam_max) | (angle < 0) | (angle > 90)
+        if np.any(fuori):
+            p = np.where(fuori, f.prob_obs(lam, angle), p)
+        return p
+
+
+#Tabelle già costruite in questo processo, con chiave intervallo e file
+_tabelle = {}
+
+
+def tabella(lam_min=380, lam_max=790, file=None):
+
+    """
+    Funzione che restituisce la tabella con griglia di default per l'intervallo dato,
+    costruendola (o leggendola da file) solo la prima volta in ogni processo
+    """
+    chiave = (float(lam_min), float(lam_max), file)
+    if chiave not in _tabelle:
+        _tabelle[chiave] = TabellaTrasmissione(lam_min, lam_max, file=file)
+    return _tabelle[chiave]